@@ -3,7 +3,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from app.core.concurrency import run_db
 from app.core.database import get_db
+from app.core.write_queue import bypass_db
 from app.services.auth_service import AuthService
 from app.schemas.schemas import UserCreate, UserLogin, User, UserWithToken, DataResponse
 from app.utils.auth import verify_token
@@ -16,8 +18,9 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """用户注册"""
     try:
         auth_service = AuthService(db)
-        user = auth_service.register_user(user_data)
-        token = auth_service.create_user_token(user)
+        # 密码哈希耗时较长，不放入写入队列
+        user = await bypass_db(auth_service.register_user, user_data)
+        token = await run_db(auth_service.create_user_token, user)
         
         return DataResponse(
             success=True,
@@ -38,7 +41,7 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
     """用户登录"""
     try:
         auth_service = AuthService(db)
-        user = auth_service.authenticate_user(login_data)
+        user = await run_db(auth_service.authenticate_user, login_data)
         
         if not user:
             raise HTTPException(
@@ -46,7 +49,7 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
                 detail="用户名或密码错误"
             )
         
-        token = auth_service.create_user_token(user)
+        token = await run_db(auth_service.create_user_token, user)
         
         return DataResponse(
             success=True,
@@ -85,7 +88,7 @@ async def verify_token_endpoint(
             )
         
         auth_service = AuthService(db)
-        user = auth_service.get_user_by_id(user_id)
+        user = await run_db(auth_service.get_user_by_id, user_id)
         
         if not user:
             raise HTTPException(
@@ -130,7 +133,7 @@ async def get_current_user(
             )
         
         auth_service = AuthService(db)
-        user = auth_service.get_user_by_id(user_id)
+        user = await run_db(auth_service.get_user_by_id, user_id)
         
         if not user:
             raise HTTPException(
@@ -1,41 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import uuid
 
+from app.core.concurrency import run_db
+from app.core.write_queue import write_db
 from app.core.database import get_db
 from app.api.routers.auth import get_current_user
-from app.schemas.schemas import EdgeCreate, EdgeUpdate, DataResponse, User
+from app.schemas.schemas import EdgeCreate, EdgeBatchCreate, EdgeBatchDelete, EdgeUpdate, DataResponse, User
 from app.services.graph_service import GraphService
+from app.utils.etag import graph_etag, request_variant, etag_matches, etag_headers, not_modified
+from app.utils.wire_formats import MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE, negotiate, msgpack_response, arrow_edges_response
 
 router = APIRouter()
 
 @router.get("/{graph_id}/edges", response_model=DataResponse)
 async def get_edges(
     graph_id: uuid.UUID,
+    request: Request,
+    response: Response,
+    type: Optional[str] = Query(None),
+    label: Optional[str] = Query(None),
+    search: Optional[str] = Query(None),
+    node_id: Optional[str] = Query(None, description="与该节点相连的边"),
+    source: Optional[str] = Query(None),
+    target: Optional[str] = Query(None),
+    prop: Optional[List[str]] = Query(None, description="属性过滤，如 weight>=0.5，可重复"),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，如 id,x,y,color"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取图谱中的所有边"""
+    """获取图谱中的边
+    
+    指定 `limit` 时按游标分页，返回 `{"items": [...], "next_cursor": ...}`；
+    否则返回全部符合条件的边列表。支持按Accept头返回MessagePack或Arrow IPC格式；
+    响应带有ETag，图谱未变更时返回304。
+    """
     try:
         graph_service = GraphService(db)
         
         # 验证图谱是否存在且属于当前用户
-        graph = graph_service.get_graph_by_id(str(graph_id), current_user)
+        graph = await run_db(graph_service.get_graph_by_id, str(graph_id), current_user)
         if not graph:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="图谱不存在"
             )
         
-        # 获取图谱数据（包含边）
-        graph_data = graph_service.get_graph_with_data(str(graph_id), current_user)
-        edges = graph_data.get("edges", [])
+        wire_format = negotiate(request)
+        etag = graph_etag(graph, "edges", request_variant(request))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        edges, next_cursor = await run_db(
+            graph_service.list_edges,
+            graph,
+            type=type,
+            label=label,
+            search=search,
+            node_id=node_id,
+            source=source,
+            target=target,
+            property_filters=prop,
+            cursor=cursor,
+            limit=limit,
+            fields=fields
+        )
+        
+        message = f"成功获取 {len(edges)} 条边"
+        data = {"items": edges, "next_cursor": next_cursor} if limit else edges
+        
+        if wire_format == MSGPACK_MEDIA_TYPE:
+            return msgpack_response(True, message, data, etag_headers(etag))
+        if wire_format == ARROW_MEDIA_TYPE:
+            return arrow_edges_response(edges, {"next_cursor": next_cursor}, etag_headers(etag))
+        
+        response.headers.update(etag_headers(etag))
         
         return DataResponse(
             success=True,
-            message=f"成功获取 {len(edges)} 条边",
-            data=edges
+            message=message,
+            data=data
         )
         
     except HTTPException:
@@ -85,7 +132,7 @@ async def create_edge(
         }
         
         # 使用新的服务方法直接添加边
-        new_edge = graph_service.add_edge(str(graph_id), edge_dict, current_user)
+        new_edge = await write_db(graph_service.add_edge, str(graph_id), edge_dict, current_user)
         
         return DataResponse(
             success=True,
@@ -101,6 +148,46 @@ async def create_edge(
             detail=f"创建边失败: {str(e)}"
         )
 
+@router.post("/{graph_id}/edges/batch", response_model=DataResponse)
+async def create_edges_batch(
+    graph_id: uuid.UUID,
+    batch: EdgeBatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量创建边（单个事务），所有端点节点必须已存在"""
+    try:
+        graph_service = GraphService(db)
+        
+        edges = [
+            {
+                "id": edge.id or edge.edge_id,
+                "source": edge.effective_source,
+                "target": edge.effective_target,
+                "label": edge.label,
+                "type": edge.type,
+                "weight": edge.weight,
+                "color": edge.color,
+                "properties": edge.properties
+            }
+            for edge in batch.edges
+        ]
+        edge_ids = await write_db(graph_service.add_edges, str(graph_id), edges, current_user)
+        
+        return DataResponse(
+            success=True,
+            message=f"成功创建 {len(edge_ids)} 条边",
+            data={"count": len(edge_ids), "ids": edge_ids}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量创建边失败: {str(e)}"
+        )
+
 @router.put("/{graph_id}/edges/{edge_id}", response_model=DataResponse)
 async def update_edge(
     graph_id: uuid.UUID,
@@ -135,7 +222,7 @@ async def update_edge(
             update_dict["properties"] = edge_data.properties
         
         # 使用新的服务方法直接更新边
-        updated_edge = graph_service.update_edge(str(graph_id), edge_id, update_dict, current_user)
+        updated_edge = await write_db(graph_service.update_edge, str(graph_id), edge_id, update_dict, current_user)
         
         return DataResponse(
             success=True,
@@ -163,7 +250,7 @@ async def delete_edge(
         graph_service = GraphService(db)
         
         # 使用新的服务方法直接删除边
-        result = graph_service.delete_edge(str(graph_id), edge_id, current_user)
+        result = await write_db(graph_service.delete_edge, str(graph_id), edge_id, current_user)
         
         return DataResponse(
             success=True,
@@ -177,4 +264,31 @@ async def delete_edge(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除边失败: {str(e)}"
+        )
+
+@router.post("/{graph_id}/edges/batch-delete", response_model=DataResponse)
+async def delete_edges_batch(
+    graph_id: uuid.UUID,
+    batch: EdgeBatchDelete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量删除边（单个事务），不存在的ID被忽略"""
+    try:
+        graph_service = GraphService(db)
+        
+        result = await write_db(graph_service.delete_edges, str(graph_id), batch.ids, current_user)
+        
+        return DataResponse(
+            success=True,
+            message=result["message"],
+            data=result
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量删除边失败: {str(e)}"
         )
\ No newline at end of file
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any, List
+from urllib.parse import quote
 import uuid
 import io
 
+from app.core.concurrency import run_db
 from app.core.database import get_db
 from app.api.routers.auth import get_current_user
 from app.schemas.schemas import DataResponse, User
 from app.services.file_service import FileService
+from app.utils.etag import graph_etag, etag_matches, etag_headers, not_modified
 
 router = APIRouter()
 
@@ -33,20 +36,34 @@ async def import_graph(
 @router.get("/{graph_id}/export")
 async def export_graph(
     graph_id: uuid.UUID,
+    request: Request,
     format: str = Query("json", pattern="^(json|csv|gexf|graphml)$"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """导出图数据"""
+    """导出图数据，图谱未变更时按 If-None-Match 返回304"""
     try:
         file_service = FileService(db)
-        content, filename, media_type = file_service.export_graph(str(graph_id), format)
+        headers = {}
+        
+        graph = await run_db(file_service.get_graph, str(graph_id))
+        if graph:
+            etag = graph_etag(graph, "export", format)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            headers.update(etag_headers(etag))
+        
+        content, filename, media_type = await run_db(file_service.export_graph, str(graph_id), format)
+        # 文件名包含图谱标题，可能有非ASCII字符：HTTP头只能以latin-1编码，直接写入会使导出失败。
+        # 按RFC 6266同时给出ASCII文件名（不支持 filename* 的客户端使用）和RFC 5987编码的完整文件名
+        fallback = "".join(c if c.isascii() and c.isprintable() and c not in '"\\' else "_" for c in filename)
+        headers["Content-Disposition"] = f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
         
         # 返回文件流
         return StreamingResponse(
             io.BytesIO(content),
             media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers=headers
         )
     except HTTPException:
         raise
@@ -85,7 +102,7 @@ async def export_graph_file(
     """导出图谱文件（返回下载链接）"""
     try:
         file_service = FileService(db)
-        content, filename, media_type = file_service.export_graph(str(graph_id), format)
+        content, filename, media_type = await run_db(file_service.export_graph, str(graph_id), format)
         
         # 这里可以保存文件到临时目录并返回下载链接
         # 为了简化，直接返回成功消息
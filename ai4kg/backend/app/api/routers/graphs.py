@@ -1,36 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from app.core.concurrency import iterate_db, run_db
+from app.core.write_queue import write_db
 from app.core.database import get_db
 from app.api.routers.auth import get_current_user
 from app.services.graph_service import GraphService
+from app.services.property_index_service import PropertyIndexService
+from app.services.summary_service import SummaryService, rebuild_summary
+from app.utils.etag import graph_etag, request_variant, etag_matches, etag_headers, not_modified
+from app.utils.wire_formats import (
+    MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE, negotiate, msgpack_response, arrow_graph_response
+)
 from app.schemas.schemas import (
     GraphCreate, GraphUpdate, GraphWithData, GraphList, 
-    DataResponse, PaginationParams, User
+    DataResponse, PaginationParams, PropertyIndexCreate, User
 )
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 @router.get("", response_model=DataResponse)
 async def get_graphs(
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，指定时忽略 page"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取图谱列表"""
+    """获取图谱列表（按更新时间倒序）"""
     try:
         graph_service = GraphService(db)
-        params = PaginationParams(page=page, size=size, search=search)
-        graphs, total = graph_service.get_user_graphs(current_user, params)
+        params = PaginationParams(page=page, size=size, search=search, cursor=cursor)
+        graphs, total, next_cursor = await run_db(graph_service.get_user_graphs, current_user, params)
         
         return DataResponse(
             success=True,
             message="获取图谱列表成功",
-            data=GraphList(graphs=graphs, total=total)
+            data=GraphList(graphs=graphs, total=total, next_cursor=next_cursor)
         )
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -40,13 +54,48 @@ async def get_graphs(
 @router.get("/{graph_id}", response_model=DataResponse)
 async def get_graph(
     graph_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，如 id,x,y,color"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取单个图谱（包含节点和边数据）"""
+    """获取单个图谱（包含节点和边数据）
+    
+    请求头 `Accept: application/x-ndjson` 时以NDJSON流式返回，每行一条记录；
+    `application/msgpack` 和 `application/vnd.apache.arrow.stream` 返回二进制格式。
+    `fields` 指定只返回的字段（如 `id,x,y,color`），只查询对应的列。
+    响应带有ETag，`If-None-Match` 命中时返回304，不读取节点和边。
+    """
     try:
         graph_service = GraphService(db)
-        graph_data = graph_service.get_graph_with_data(graph_id, current_user)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        etag = graph_etag(graph, "graph", request_variant(request))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+            return StreamingResponse(
+                iterate_db(graph_service.stream_graph_ndjson(graph, fields=fields)),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers=etag_headers(etag)
+            )
+        
+        wire_format = negotiate(request)
+        graph_data = await run_db(graph_service.get_graph_with_data, graph_id, current_user, fields=fields)
+        
+        if wire_format == MSGPACK_MEDIA_TYPE:
+            return msgpack_response(True, "获取图谱成功", graph_data, etag_headers(etag))
+        if wire_format == ARROW_MEDIA_TYPE:
+            return arrow_graph_response(graph_data, etag_headers(etag))
+        
+        response.headers.update(etag_headers(etag))
         
         return DataResponse(
             success=True,
@@ -61,6 +110,231 @@ async def get_graph(
             detail=f"获取图谱失败: {str(e)}"
         )
 
+@router.get("/{graph_id}/viewport", response_model=DataResponse)
+async def get_graph_viewport(
+    graph_id: str,
+    min_x: float = Query(...),
+    min_y: float = Query(...),
+    max_x: float = Query(...),
+    max_y: float = Query(...),
+    limit: int = Query(5000, ge=1, le=50000),
+    include_edges: bool = Query(True),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取矩形视口内的节点及其相连的边"""
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="视口范围无效：最小值不能大于最大值"
+        )
+    
+    try:
+        graph_service = GraphService(db)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        viewport = await run_db(
+            graph_service.get_viewport,
+            graph, min_x, min_y, max_x, max_y, limit, include_edges
+        )
+        
+        return DataResponse(
+            success=True,
+            message=f"视口内共 {len(viewport['nodes'])} 个节点",
+            data=viewport
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取视口数据失败: {str(e)}"
+        )
+
+@router.get("/{graph_id}/summary", response_model=DataResponse)
+async def get_graph_summary(
+    graph_id: str,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    level: int = Query(0, ge=0, description="缩放级别，0为最粗"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取图谱的多分辨率概要，用于缩小视图时的渲染
+    
+    概要落后于图谱数据时先返回旧版本（stale 为 true），响应后在后台重新生成；
+    尚未生成过概要时返回202和空概要，客户端稍后重试。
+    """
+    try:
+        graph_service = GraphService(db)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        summary, needs_rebuild = await run_db(SummaryService(db).get_summary, graph, level)
+        if needs_rebuild:
+            background_tasks.add_task(rebuild_summary, db, graph.id)
+        
+        if summary["version"] is None:
+            response.status_code = status.HTTP_202_ACCEPTED
+            message = f"第 {summary['level']} 级概要正在生成"
+        else:
+            message = f"获取第 {summary['level']} 级概要成功"
+        
+        return DataResponse(
+            success=True,
+            message=message,
+            data=summary
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取图谱概要失败: {str(e)}"
+        )
+
+@router.get("/{graph_id}/changes", response_model=DataResponse)
+async def get_graph_changes(
+    graph_id: str,
+    since: int = Query(0, ge=0, description="客户端已同步到的版本"),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取指定版本之后的节点/边变更，用于增量同步"""
+    try:
+        graph_service = GraphService(db)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        changes = await run_db(graph_service.get_changes, graph, since, limit)
+        
+        return DataResponse(
+            success=True,
+            message=f"获取到 {len(changes['changes'])} 条变更",
+            data=changes
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取图谱变更失败: {str(e)}"
+        )
+
+@router.get("/{graph_id}/property-indexes", response_model=DataResponse)
+async def get_property_indexes(
+    graph_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取图谱声明的属性索引"""
+    try:
+        graph_service = GraphService(db)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        indexes = await run_db(PropertyIndexService(db).list_indexes, graph)
+        
+        return DataResponse(
+            success=True,
+            message="获取属性索引成功",
+            data=indexes
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取属性索引失败: {str(e)}"
+        )
+
+@router.post("/{graph_id}/property-indexes", response_model=DataResponse)
+async def create_property_index(
+    graph_id: str,
+    index_data: PropertyIndexCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """声明属性索引，该属性上同类型值的等值和范围过滤使用索引"""
+    try:
+        graph_service = GraphService(db)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        index = await write_db(
+            PropertyIndexService(db).create_index,
+            graph,
+            index_data.entity,
+            index_data.key,
+            index_data.type
+        )
+        
+        return DataResponse(
+            success=True,
+            message="属性索引创建成功",
+            data=index
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建属性索引失败: {str(e)}"
+        )
+
+@router.delete("/{graph_id}/property-indexes/{index_id}", response_model=DataResponse)
+async def delete_property_index(
+    graph_id: str,
+    index_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """删除属性索引"""
+    try:
+        graph_service = GraphService(db)
+        graph = await run_db(graph_service.get_graph_by_id, graph_id, current_user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        await write_db(PropertyIndexService(db).delete_index, graph, index_id)
+        
+        return DataResponse(
+            success=True,
+            message="属性索引删除成功"
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"删除属性索引失败: {str(e)}"
+        )
+
 @router.post("", response_model=DataResponse)
 async def create_graph(
     graph_data: GraphCreate,
@@ -70,7 +344,7 @@ async def create_graph(
     """创建图谱"""
     try:
         graph_service = GraphService(db)
-        graph = graph_service.create_graph(graph_data, current_user)
+        graph = await write_db(graph_service.create_graph, graph_data, current_user)
         
         return DataResponse(
             success=True,
@@ -95,7 +369,7 @@ async def update_graph(
     """更新图谱"""
     try:
         graph_service = GraphService(db)
-        graph = graph_service.update_graph(graph_id, graph_data, current_user)
+        graph = await write_db(graph_service.update_graph, graph_id, graph_data, current_user)
         
         return DataResponse(
             success=True,
@@ -119,7 +393,7 @@ async def delete_graph(
     """删除图谱"""
     try:
         graph_service = GraphService(db)
-        success = graph_service.delete_graph(graph_id, current_user)
+        success = await write_db(graph_service.delete_graph, graph_id, current_user)
         
         if success:
             return DataResponse(
@@ -1,57 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import Optional, List
 import uuid
 
+from app.core.concurrency import run_db
+from app.core.write_queue import write_db
 from app.core.database import get_db
 from app.api.routers.auth import get_current_user
-from app.schemas.schemas import NodeCreate, NodeUpdate, DataResponse, User
+from app.schemas.schemas import NodeCreate, NodeBatchCreate, NodeBatchDelete, NodeUpdate, NodePositionsUpdate, DataResponse, User
 from app.services.graph_service import GraphService
+from app.utils.etag import graph_etag, request_variant, etag_matches, etag_headers, not_modified
+from app.utils.wire_formats import MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE, negotiate, msgpack_response, arrow_nodes_response
 
 router = APIRouter()
 
 @router.get("/{graph_id}/nodes", response_model=DataResponse)
 async def get_nodes(
     graph_id: uuid.UUID,
+    request: Request,
+    response: Response,
     type: Optional[str] = Query(None),
+    label: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    prop: Optional[List[str]] = Query(None, description="属性过滤，如 age>=18、city=北京，可重复"),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，如 id,x,y,color"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取图谱中的所有节点"""
+    """获取图谱中的节点
+    
+    指定 `limit` 时按游标分页，返回 `{"items": [...], "next_cursor": ...}`；
+    否则返回全部符合条件的节点列表。支持按Accept头返回MessagePack或Arrow IPC格式；
+    响应带有ETag，图谱未变更时返回304。
+    """
     try:
         graph_service = GraphService(db)
         
         # 验证图谱是否存在且属于当前用户
-        graph = graph_service.get_graph_by_id(str(graph_id), current_user)
+        graph = await run_db(graph_service.get_graph_by_id, str(graph_id), current_user)
         if not graph:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="图谱不存在"
             )
         
-        # 获取当前图谱数据
-        current_graph_data = graph_service.get_graph_with_data(str(graph_id), current_user)
-        nodes = current_graph_data.get("nodes", [])
-        
-        # 根据类型过滤
-        if type:
-            nodes = [n for n in nodes if n.get("type", "").lower() == type.lower()]
-        
-        # 根据搜索关键词过滤
-        if search:
-            search_lower = search.lower()
-            nodes = [
-                n for n in nodes 
-                if search_lower in n.get("label", "").lower() 
-                or search_lower in n.get("type", "").lower()
-                or any(search_lower in str(v).lower() for v in n.get("properties", {}).values())
-            ]
+        wire_format = negotiate(request)
+        etag = graph_etag(graph, "nodes", request_variant(request))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        
+        nodes, next_cursor = await run_db(
+            graph_service.list_nodes,
+            graph,
+            type=type,
+            label=label,
+            search=search,
+            property_filters=prop,
+            cursor=cursor,
+            limit=limit,
+            fields=fields
+        )
+        
+        message = f"获取到 {len(nodes)} 个节点"
+        data = {"items": nodes, "next_cursor": next_cursor} if limit else nodes
+        
+        if wire_format == MSGPACK_MEDIA_TYPE:
+            return msgpack_response(True, message, data, etag_headers(etag))
+        if wire_format == ARROW_MEDIA_TYPE:
+            return arrow_nodes_response(nodes, {"next_cursor": next_cursor}, etag_headers(etag))
+        
+        response.headers.update(etag_headers(etag))
         
         return DataResponse(
             success=True,
-            message=f"获取到 {len(nodes)} 个节点",
-            data=nodes
+            message=message,
+            data=data
         )
         
     except HTTPException:
@@ -88,7 +113,7 @@ async def create_node(
             node_dict["id"] = node_data.id
         
         # 使用新的服务方法直接添加节点
-        new_node = graph_service.add_node(str(graph_id), node_dict, current_user)
+        new_node = await write_db(graph_service.add_node, str(graph_id), node_dict, current_user)
         
         return DataResponse(
             success=True,
@@ -104,6 +129,67 @@ async def create_node(
             detail=f"创建节点失败: {str(e)}"
         )
 
+@router.post("/{graph_id}/nodes/batch", response_model=DataResponse)
+async def create_nodes_batch(
+    graph_id: uuid.UUID,
+    batch: NodeBatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量创建节点（单个事务）"""
+    try:
+        graph_service = GraphService(db)
+        
+        nodes = [
+            {**node.model_dump(exclude={"node_id"}), "id": node.id or node.node_id}
+            for node in batch.nodes
+        ]
+        node_ids = await write_db(graph_service.add_nodes, str(graph_id), nodes, current_user)
+        
+        return DataResponse(
+            success=True,
+            message=f"成功创建 {len(node_ids)} 个节点",
+            data={"count": len(node_ids), "ids": node_ids}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量创建节点失败: {str(e)}"
+        )
+
+@router.put("/{graph_id}/nodes/positions", response_model=DataResponse)
+async def update_node_positions(
+    graph_id: uuid.UUID,
+    update: NodePositionsUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量保存节点位置
+    
+    请求体 `{"positions": [[node_id, x, y], [node_id, x, y, size, color], ...]}`，
+    在一个事务中批量更新。
+    """
+    try:
+        graph_service = GraphService(db)
+        updated = await write_db(graph_service.update_node_positions, str(graph_id), update.positions, current_user)
+        
+        return DataResponse(
+            success=True,
+            message=f"已更新 {updated} 个节点位置",
+            data={"updated": updated, "requested": len(update.positions)}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量更新节点位置失败: {str(e)}"
+        )
+
 @router.put("/{graph_id}/nodes/{node_id}", response_model=DataResponse)
 async def update_node(
     graph_id: uuid.UUID,
@@ -134,7 +220,7 @@ async def update_node(
             update_dict["properties"] = node_data.properties
         
         # 使用新的服务方法直接更新节点
-        updated_node = graph_service.update_node(str(graph_id), node_id, update_dict, current_user)
+        updated_node = await write_db(graph_service.update_node, str(graph_id), node_id, update_dict, current_user)
         
         return DataResponse(
             success=True,
@@ -162,7 +248,7 @@ async def get_node_delete_impact(
         graph_service = GraphService(db)
         
         # 验证图谱是否存在且属于当前用户
-        graph = graph_service.get_graph_by_id(str(graph_id), current_user)
+        graph = await run_db(graph_service.get_graph_by_id, str(graph_id), current_user)
         if not graph:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -170,7 +256,7 @@ async def get_node_delete_impact(
             )
         
         # 获取当前图谱数据
-        current_graph_data = graph_service.get_graph_with_data(str(graph_id), current_user)
+        current_graph_data = await run_db(graph_service.get_graph_with_data, str(graph_id), current_user)
         
         # 检查节点是否存在
         target_node = next((n for n in current_graph_data.get("nodes", []) if n["id"] == node_id), None)
@@ -233,7 +319,7 @@ async def delete_node(
         graph_service = GraphService(db)
         
         # 使用新的服务方法直接删除节点
-        result = graph_service.delete_node(str(graph_id), node_id, current_user)
+        result = await write_db(graph_service.delete_node, str(graph_id), node_id, current_user)
         
         return DataResponse(
             success=True,
@@ -249,6 +335,33 @@ async def delete_node(
             detail=f"删除节点失败: {str(e)}"
         )
 
+@router.post("/{graph_id}/nodes/batch-delete", response_model=DataResponse)
+async def delete_nodes_batch(
+    graph_id: uuid.UUID,
+    batch: NodeBatchDelete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量删除节点及其相关边（单个事务），不存在的ID被忽略"""
+    try:
+        graph_service = GraphService(db)
+        
+        result = await write_db(graph_service.delete_nodes, str(graph_id), batch.ids, current_user)
+        
+        return DataResponse(
+            success=True,
+            message=result["message"],
+            data=result
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量删除节点失败: {str(e)}"
+        )
+
 @router.post("/{graph_id}/nodes/merge", response_model=DataResponse)
 async def merge_nodes(
     graph_id: uuid.UUID,
@@ -262,7 +375,7 @@ async def merge_nodes(
         graph_service = GraphService(db)
         
         # 使用新的服务方法合并节点
-        merged_node = graph_service.merge_nodes(str(graph_id), node_ids, merged_node_data, current_user)
+        merged_node = await write_db(graph_service.merge_nodes, str(graph_id), node_ids, merged_node_data, current_user)
         
         return DataResponse(
             success=True,
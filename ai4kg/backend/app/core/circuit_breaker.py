@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """可选依赖的熔断器
+
+    - closed: 正常放行，连续失败 failure_threshold 次后打开
+    - open: 直接拒绝，reset_timeout 秒后转为 half_open
+    - half_open: 只放行一次试探（请求或后台探测），成功则关闭，失败则重新打开
+
+    状态以 `<name>.circuit_state`（0=closed, 1=half_open, 2=open）输出到 /metrics，
+    打开和拒绝次数分别累加到 `<name>.circuit_opened`、`<name>.circuit_rejected`。
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 10.0,
+        probe: Optional[Callable[[], None]] = None
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        metrics.set_gauge(f"{name}.circuit_state", 0)
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        self._state = state
+        metrics.set_gauge(f"{self.name}.circuit_state", self._STATE_VALUES[state])
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+            metrics.incr(f"{self.name}.circuit_opened")
+            logger.warning(f"{self.name} 不可用，熔断 {self.reset_timeout} 秒")
+        elif state == self.CLOSED:
+            logger.info(f"{self.name} 已恢复")
+
+    def allow_request(self) -> bool:
+        """是否允许访问依赖；熔断超时后的第一个调用方获得试探机会"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+                return True
+        metrics.incr(f"{self.name}.circuit_rejected")
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._set_state(self.OPEN)
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        """恢复为关闭状态（用于测试）"""
+        with self._lock:
+            self._failures = 0
+            self._set_state(self.CLOSED)
+
+    def probe_now(self) -> bool:
+        """熔断打开时执行一次探测，返回依赖是否可用"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return self._state == self.CLOSED
+            self._set_state(self.HALF_OPEN)
+        try:
+            self.probe()
+        except Exception as e:
+            logger.debug(f"{self.name} 探测失败: {e}")
+            self.record_failure()
+            return False
+        self.record_success()
+        return True
+
+    def start(self):
+        """在当前事件循环中启动后台探测，熔断打开期间每 reset_timeout 秒探测一次"""
+        if self._task is None and self.probe is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reset_timeout)
+            if self._state == self.OPEN:
+                await asyncio.to_thread(self.probe_now)
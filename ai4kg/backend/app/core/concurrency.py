@@ -0,0 +1,54 @@
+import asyncio
+import weakref
+from functools import partial
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+# 每个事件循环一个限流器（测试中每个 TestClient 使用独立的事件循环）
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, anyio.CapacityLimiter]" = weakref.WeakKeyDictionary()
+
+def db_limiter() -> anyio.CapacityLimiter:
+    """数据库线程池的并发上限，同一时刻最多 DB_THREAD_POOL_SIZE 个线程执行同步数据库代码"""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = anyio.CapacityLimiter(settings.DB_THREAD_POOL_SIZE)
+    return limiter
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """在有界线程池中执行同步的数据库/Neo4j代码，事件循环在等待期间继续处理其他请求
+
+    线程全部占用时调用方在事件循环中排队等待，不会占用额外线程。
+    """
+    limiter = db_limiter()
+    metrics.incr("db_threads.calls")
+    try:
+        limiter.acquire_nowait()
+    except anyio.WouldBlock:
+        metrics.incr("db_threads.queued")
+        await limiter.acquire()
+    try:
+        metrics.set_gauge("db_threads.busy", limiter.borrowed_tokens)
+        return await anyio.to_thread.run_sync(partial(func, *args, **kwargs))
+    finally:
+        limiter.release()
+        metrics.set_gauge("db_threads.busy", limiter.borrowed_tokens)
+
+async def iterate_db(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """在数据库线程池中逐块迭代同步生成器（流式响应）"""
+    iterator = iter(iterable)
+    done = object()
+    while True:
+        item = await run_db(next, iterator, done)
+        if item is done:
+            return
+        yield item
@@ -1,30 +1,151 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, make_url, MetaData, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.util import find_tables
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
 import redis
+import io
+import json
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List
 
+from app.core.circuit_breaker import CircuitBreaker
 from app.core.config import get_settings
 
 settings = get_settings()
 
-# 确保数据目录存在
-os.makedirs(os.path.dirname(settings.SQLITE_DB_PATH), exist_ok=True)
+def engine_options(url: str) -> dict:
+    """按数据库类型生成 create_engine 的参数"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {"connect_args": {"check_same_thread": False}}  # SQLite 需要这个参数
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
 
-# SQLite 数据库配置
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False}  # SQLite 需要这个参数
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+database_url = make_url(settings.database_url)
+
+# 确保SQLite数据目录存在
+if database_url.get_backend_name() == "sqlite" and database_url.database not in (None, "", ":memory:"):
+    os.makedirs(os.path.dirname(database_url.database) or ".", exist_ok=True)
+
+# 关系数据库配置（默认SQLite，DATABASE_URL 可指向PostgreSQL）
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
+
+def sqlite_pragmas(profile: str) -> List[tuple]:
+    """存储配置对应的 (PRAGMA, 值) 列表，default 配置不设置任何 PRAGMA"""
+    if profile == "default":
+        return []
+    if profile != "tuned":
+        raise ValueError(f"未知的SQLite存储配置: {profile}")
+    return [
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("cache_size", settings.SQLITE_CACHE_SIZE),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE),
+        ("temp_store", settings.SQLITE_TEMP_STORE),
+    ]
+
+def apply_sqlite_pragmas(target_engine, pragmas: List[tuple]):
+    """在引擎的每个新连接上执行 PRAGMA（cache_size 等设置只对当前连接有效）"""
+    if not pragmas or target_engine.dialect.name != "sqlite":
+        return
+    
+    @event.listens_for(target_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+apply_sqlite_pragmas(engine, sqlite_pragmas(settings.SQLITE_STORAGE_PROFILE))
+
+def _copy_value(value) -> str:
+    """转换为 COPY 文本格式的字段值"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def copy_rows(connection, table, rows: List[dict]):
+    """以 COPY FROM STDIN 批量写入行（PostgreSQL），在连接的当前事务中执行
+    
+    各行的键须相同；未给出的列使用服务端默认值（Python端默认值不会生效）。
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[name]) for name in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+# 分片存储模式下存放在每个图谱独立SQLite文件中的表
+SHARDED_TABLES = frozenset({"nodes", "edges"})
+
+def _uses_sharded_tables(mapper, clause) -> bool:
+    if mapper is not None:
+        return inspect(mapper).local_table.name in SHARDED_TABLES
+    if clause is not None:
+        return any(table.name in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+class GraphSession(Session):
+    """节点和边的语句发往 info["shard_engine"]（当前图谱的分片库），其他表使用主库
+    
+    未选择分片时与普通会话相同。同时修改主库和分片库的事务按连接依次提交，
+    不保证跨文件的原子性。
+    """
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard_engine = self.info.get("shard_engine")
+        if shard_engine is not None and _uses_sharded_tables(mapper, clause):
+            return shard_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+SessionLocal = sessionmaker(class_=GraphSession, autocommit=False, autoflush=False, bind=engine)
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 # Neo4j 数据库配置
 neo4j_driver = None
 
+# 视为Neo4j不可用的连接类错误
+NEO4J_CONNECTION_ERRORS = (ServiceUnavailable, SessionExpired)
+
+class Neo4jUnavailable(ServiceUnavailable):
+    """Neo4j处于熔断状态，未尝试连接"""
+
+def _probe_neo4j():
+    neo4j_driver.verify_connectivity()
+
+neo4j_breaker = CircuitBreaker(
+    "neo4j",
+    failure_threshold=settings.NEO4J_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.NEO4J_CIRCUIT_RESET_TIMEOUT,
+    probe=_probe_neo4j
+)
+
 # Redis 配置
 redis_client = None
 
@@ -36,7 +157,8 @@ async def init_databases():
     try:
         neo4j_driver = GraphDatabase.driver(
             settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+            connection_timeout=settings.NEO4J_CONNECTION_TIMEOUT
         )
         # 测试连接
         with neo4j_driver.session() as session:
@@ -46,6 +168,12 @@ async def init_databases():
         print(f"⚠️ Neo4j连接失败，将跳过图数据存储: {e}")
         neo4j_driver = None
     
+    if neo4j_driver:
+        try:
+            _ensure_neo4j_schema()
+        except Exception as e:
+            print(f"⚠️ 创建Neo4j索引失败: {e}")
+    
     # 初始化 Redis（可选）
     try:
         redis_client = redis.from_url(settings.REDIS_URL)
@@ -55,9 +183,127 @@ async def init_databases():
         print(f"⚠️ Redis连接失败，将跳过缓存功能: {e}")
         redis_client = None
     
-    # 创建 SQLite 表
+    # 创建关系数据库表
     Base.metadata.create_all(bind=engine)
-    print("✅ SQLite数据库初始化完成")
+    _ensure_columns()
+    _migrate_business_keys()
+    _ensure_indexes()
+    _ensure_sqlite_indexes()
+    print(f"✅ {engine.dialect.name} 数据库初始化完成")
+
+def _ensure_columns():
+    """为已存在的表补加模型中新增的列（create_all 不会修改已有表）"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None and isinstance(column.server_default.arg, str):
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+                connection.execute(text(ddl))
+                # 需要根据已有数据计算初始值的列
+                if column.info.get("backfill"):
+                    connection.execute(text(column.info["backfill"]))
+                print(f"✅ 已为 {table.name} 表补加列 {column.name}")
+
+# 旧版本的单列索引和非唯一的 (graph_id, node_id) 索引，已由复合索引取代
+OBSOLETE_INDEXES = {
+    "nodes": ["ix_nodes_graph_id", "ix_nodes_node_id", "ix_nodes_graph_id_node_id"],
+    "edges": ["ix_edges_graph_id", "ix_edges_edge_id", "ix_edges_source_node_id", "ix_edges_target_node_id"],
+}
+
+def _migrate_business_keys():
+    """将节点和边迁移为图内业务ID唯一的索引布局（已迁移时跳过）
+    
+    旧版本允许整图保存时写入重复ID，迁移时每组重复只保留最早写入的一行
+    （读取和按ID修改一直命中的那一行），受影响的图谱重新计算节点/边计数，
+    并在变更日志中记录一次整体替换。随后删除旧索引，由 _ensure_indexes
+    创建新的唯一索引和端点复合索引。
+    
+    旧版本只支持SQLite，迁移语句依赖SQLite的隐式 rowid；其他数据库的表由
+    create_all 直接以新的索引布局创建，无需迁移。
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    inspector = inspect(engine)
+    if not inspector.has_table("nodes"):
+        return
+    if any(index["name"] == "ix_nodes_graph_id_node_id" and index["unique"] for index in inspector.get_indexes("nodes")):
+        return
+    
+    with engine.begin() as connection:
+        affected = []
+        for table, key in (("nodes", "node_id"), ("edges", "edge_id")):
+            affected.extend(connection.execute(text(
+                f"DELETE FROM {table} WHERE rowid NOT IN "
+                f"(SELECT min(rowid) FROM {table} GROUP BY graph_id, {key}) "
+                "RETURNING graph_id"
+            )).scalars())
+        for graph_id in set(affected):
+            params = {"graph_id": graph_id}
+            connection.execute(text(
+                "UPDATE graphs SET "
+                "node_count = (SELECT count(*) FROM nodes WHERE nodes.graph_id = graphs.id), "
+                "edge_count = (SELECT count(*) FROM edges WHERE edges.graph_id = graphs.id), "
+                "data_version = data_version + 1 "
+                "WHERE id = :graph_id"
+            ), params)
+            connection.execute(text(
+                "INSERT INTO graph_changes (graph_id, version, entity, op, entity_id) "
+                "SELECT id, data_version, 'graph', 'reset', id FROM graphs WHERE id = :graph_id"
+            ), params)
+        if affected:
+            print(f"⚠️ 已删除 {len(affected)} 个重复ID的节点/边")
+        
+        for names in OBSOLETE_INDEXES.values():
+            for name in names:
+                connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    print("✅ 节点/边索引已迁移为图内唯一的复合索引")
+
+def _ensure_indexes():
+    """为已存在的表补建模型中新增的索引（create_all 不会修改已有表）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def _ensure_sqlite_indexes():
+    """为已存在的数据库补建SQLite专用索引（节点空间索引、图谱标题全文索引）"""
+    from app.models.models import create_node_spatial_index, create_graph_title_index
+    
+    with engine.begin() as connection:
+        create_node_spatial_index(connection)
+        create_graph_title_index(connection)
+
+# 节点按 (graph_id, id) 唯一，UNWIND 写入边时的 MATCH 和按ID删除都依赖这些索引
+NEO4J_NODE_CONSTRAINT = (
+    "CREATE CONSTRAINT node_graph_id_id IF NOT EXISTS "
+    "FOR (n:Node) REQUIRE (n.graph_id, n.id) IS UNIQUE"
+)
+NEO4J_NODE_INDEX = "CREATE INDEX node_graph_id_id_index IF NOT EXISTS FOR (n:Node) ON (n.graph_id, n.id)"
+NEO4J_INDEXES = [
+    "CREATE INDEX node_graph_id IF NOT EXISTS FOR (n:Node) ON (n.graph_id)",
+    "CREATE INDEX edge_graph_id_id IF NOT EXISTS FOR ()-[r:EDGE]-() ON (r.graph_id, r.id)",
+]
+
+def _ensure_neo4j_schema():
+    """创建Neo4j约束和索引
+    
+    已有数据存在重复节点ID时无法创建唯一约束，退化为普通复合索引。
+    """
+    with neo4j_driver.session() as session:
+        try:
+            session.run(NEO4J_NODE_CONSTRAINT).consume()
+        except Exception as e:
+            print(f"⚠️ 创建Neo4j节点唯一约束失败，改用普通索引: {e}")
+            session.run(NEO4J_NODE_INDEX).consume()
+        for statement in NEO4J_INDEXES:
+            session.run(statement).consume()
+    print("✅ Neo4j索引检查完成")
 
 async def close_databases():
     """关闭数据库连接"""
@@ -67,21 +313,52 @@ async def close_databases():
         neo4j_driver.close()
     
     if redis_client:
-        await redis_client.close()
+        redis_client.close()
 
 def get_db():
-    """获取SQLite数据库会话"""
+    """获取关系数据库会话"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+def neo4j_enabled() -> bool:
+    """Neo4j是否已连接；未连接时写操作不进入同步发件箱"""
+    return neo4j_driver is not None
+
+def neo4j_available() -> bool:
+    """Neo4j已连接且未熔断；熔断期间请求直接跳过Neo4j，不等待连接超时"""
+    return neo4j_driver is not None and neo4j_breaker.state != CircuitBreaker.OPEN
+
+class _BreakerSession:
+    """Neo4j会话的包装，退出时把连接是否成功反馈给熔断器"""
+    
+    def __init__(self, session):
+        self._session = session
+    
+    def __enter__(self):
+        return self._session.__enter__()
+    
+    def __exit__(self, exc_type, exc, tb):
+        result = self._session.__exit__(exc_type, exc, tb)
+        if isinstance(exc, NEO4J_CONNECTION_ERRORS):
+            neo4j_breaker.record_failure()
+        else:
+            # 语句错误等说明服务端可达
+            neo4j_breaker.record_success()
+        return result
+
 def get_neo4j_session():
-    """获取Neo4j会话"""
+    """获取Neo4j会话，须在 with 语句中使用
+    
+    熔断打开时立即抛出 Neo4jUnavailable。
+    """
     if neo4j_driver is None:
         raise Exception("Neo4j驱动未初始化")
-    return neo4j_driver.session()
+    if not neo4j_breaker.allow_request():
+        raise Neo4jUnavailable("Neo4j暂不可用（熔断中）")
+    return _BreakerSession(neo4j_driver.session())
 
 def get_redis():
     """获取Redis客户端"""
@@ -0,0 +1,48 @@
+import threading
+import time
+from typing import Dict, Union
+
+Number = Union[int, float]
+
+class Metrics:
+    """进程内的简单指标注册表（计数器和瞬时值），通过 /metrics 接口输出"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Number] = {}
+        self._gauges: Dict[str, Number] = {}
+        self._started_at = time.time()
+    
+    def incr(self, name: str, value: Number = 1):
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+    
+    def set_gauge(self, name: str, value: Number):
+        """设置瞬时值"""
+        with self._lock:
+            self._gauges[name] = value
+    
+    def get(self, name: str, default: Number = 0) -> Number:
+        """读取计数器或瞬时值"""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+    
+    def snapshot(self) -> dict:
+        """返回所有指标的快照"""
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.time() - self._started_at, 3),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges)
+            }
+    
+    def reset(self):
+        """清空所有指标（用于测试）"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+metrics = Metrics()
@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import Base, engine, apply_sqlite_pragmas, engine_options, sqlite_pragmas
+from app.core.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class ShardManager:
+    """图谱分片文件管理
+
+    分片模式下每个新建图谱的节点和边存放在 SQLITE_SHARD_DIR 下的独立SQLite文件中，
+    主库的 graphs.shard 记录文件名（目录）。不同图谱的写入不再竞争同一个写锁，
+    删除图谱直接删除文件。打开的分片引擎按最近使用保留 cache_size 个，
+    打开和淘汰次数分别累加到 `shards.opened`、`shards.evicted`。
+    """
+
+    def __init__(self, directory: str, cache_size: int):
+        self.directory = directory
+        self.cache_size = max(1, cache_size)
+        self._engines: "OrderedDict[str, Engine]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.SQLITE_SHARD_MODE == "graph" and engine.dialect.name == "sqlite"
+
+    def new_shard(self, graph_id: str) -> Optional[str]:
+        """新建图谱的分片文件名，未启用分片时返回None（数据存储在主库）"""
+        return f"{graph_id}.db" if self.enabled() else None
+
+    def path(self, shard: str) -> str:
+        return os.path.join(self.directory, shard)
+
+    def engine(self, shard: str) -> Engine:
+        """获取分片的引擎，首次打开时创建文件和节点/边表"""
+        with self._lock:
+            shard_engine = self._engines.get(shard)
+            if shard_engine is not None:
+                self._engines.move_to_end(shard)
+                return shard_engine
+
+            shard_engine = self._open(shard)
+            self._engines[shard] = shard_engine
+            metrics.incr("shards.opened")
+            while len(self._engines) > self.cache_size:
+                _, evicted = self._engines.popitem(last=False)
+                # 正在使用的连接归还后才会关闭
+                evicted.dispose()
+                metrics.incr("shards.evicted")
+            metrics.set_gauge("shards.open", len(self._engines))
+            return shard_engine
+
+    def _open(self, shard: str) -> Engine:
+        from app.models.models import Node, Edge
+
+        os.makedirs(self.directory, exist_ok=True)
+        url = f"sqlite:///{self.path(shard)}"
+        shard_engine = create_engine(url, **engine_options(url))
+        apply_sqlite_pragmas(shard_engine, sqlite_pragmas(settings.SQLITE_STORAGE_PROFILE))
+        Base.metadata.create_all(bind=shard_engine, tables=[Node.__table__, Edge.__table__])
+        return shard_engine
+
+    def drop(self, shard: str):
+        """关闭并删除分片文件（含WAL和共享内存文件）"""
+        with self._lock:
+            shard_engine = self._engines.pop(shard, None)
+            metrics.set_gauge("shards.open", len(self._engines))
+        if shard_engine is not None:
+            shard_engine.dispose()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            try:
+                os.remove(self.path(shard) + suffix)
+            except FileNotFoundError:
+                pass
+
+    def dispose(self):
+        """关闭所有打开的分片"""
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+            metrics.set_gauge("shards.open", 0)
+        for shard_engine in engines:
+            shard_engine.dispose()
+
+shard_manager = ShardManager(settings.SQLITE_SHARD_DIR, settings.SQLITE_SHARD_CACHE_SIZE)
+
+class ShardedWriteRefused(Exception):
+    """写入队列的命令访问了分片图谱
+
+    分片上的修改在命令中直接提交到分片文件，无法随主库的批次一起回滚，
+    这类写操作改为在请求的会话中执行（见 write_db）。
+    """
+
+def route_graph(db: Session, graph) -> None:
+    """让会话中后续的节点/边语句发往图谱所在的分片库（graph 为空或未分片时使用主库）
+
+    写入队列的会话（info["write_queue"]）不能访问分片，抛出 ShardedWriteRefused。
+    """
+    shard = getattr(graph, "shard", None)
+    if shard and db.info.get("write_queue"):
+        # 服务方法可能捕获异常后改抛HTTP错误，标记在会话上由写入队列识别
+        db.info["sharded_write"] = True
+        raise ShardedWriteRefused(shard)
+    db.info["shard_engine"] = shard_manager.engine(shard) if shard else None
@@ -0,0 +1,263 @@
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import InstanceState
+
+from app.core.concurrency import run_db
+from app.core.config import get_settings
+from app.core.database import SessionLocal, engine
+from app.core.metrics import metrics
+from app.core.shards import ShardedWriteRefused
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class _Command:
+    __slots__ = ("func", "args", "kwargs", "loop", "future", "queued_at", "outcome")
+
+    def __init__(self, func, args, kwargs, loop, future):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.loop = loop
+        self.future = future
+        self.queued_at = time.perf_counter()
+        self.outcome = None  # (是否成功, 返回值或异常)
+        # loop 为 None 时 future 是 concurrent.futures.Future，由非事件循环线程同步等待
+
+class WriteQueue:
+    """SQLite主库的单写者队列
+
+    写操作以命令 func(session, *args) 的形式进入队列，由一个写入线程依次取出，
+    每次把队列中已有的命令（最多 max_batch 个）合并到一个事务中执行（组提交）：
+
+    - 写入线程持有一个专用连接，不与等待结果的请求争用连接池
+    - 事务以 BEGIN IMMEDIATE 开始，写锁只由写入线程获取，请求线程之间不再竞争
+    - 每个命令在独立的保存点中执行，命令中的 commit()/rollback() 作用于自己的保存点，
+      失败的命令只回滚自己的修改，不影响同批的其他命令
+    - 整批提交后才把结果交给等待的调用方；提交失败时同批命令都收到该异常
+    - 命令不能访问分片图谱：分片文件无法随批次回滚，route_graph 在写入会话中抛出
+      ShardedWriteRefused，命令的修改被回滚，write_db 改为在请求的会话中执行
+
+    队列长度、最近一批的命令数、批次数和命令数分别输出到 /metrics 的
+    `write_queue.depth`、`write_queue.batch_size`、`write_queue.batches`、`write_queue.commands`。
+
+    队列运行时仍在写入线程之外提交主库的写操作（经 bypass_db 执行，计入 `write_queue.bypassed`）：
+
+    - 分片图谱的写操作：分片文件无法随批次回滚，在请求的会话中执行（另计入 `write_queue.sharded_fallbacks`）
+    - 用户注册：密码哈希耗时较长，放入写入线程会拖慢同批的所有命令
+
+    Neo4j同步任务在自己的线程中访问Neo4j，发件箱的删除和失败次数经 call() 交给写入线程提交。
+    """
+
+    _STOP = object()
+
+    def __init__(self, bind: Engine, max_batch: int):
+        self.bind = bind
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # 停止后不再接受命令，避免命令排在停止标记之后无人执行
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.SQLITE_WRITE_QUEUE and engine.dialect.name == "sqlite"
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """启动写入线程"""
+        if self._thread is None:
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+            self._thread.start()
+            logger.info("SQLite写入队列已启动")
+
+    async def stop(self):
+        """处理完已进入队列的命令后停止写入线程"""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._closed = True
+            self._queue.put(self._STOP)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def submit(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """提交写命令 func(session, *args, **kwargs) 并等待所在批次提交，返回命令的返回值"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._put(_Command(func, args, kwargs, loop, future))
+        return await future
+
+    def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在事件循环之外的线程中提交写命令并阻塞等待所在批次提交，返回命令的返回值"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._put(_Command(func, args, kwargs, None, future))
+        return future.result()
+
+    def _put(self, command: _Command):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("写入队列已停止")
+            self._queue.put(command)
+        metrics.set_gauge("write_queue.depth", self._queue.qsize())
+
+    def _run(self):
+        with self.bind.connect() as connection:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                metrics.set_gauge("write_queue.depth", self._queue.qsize())
+
+                stop = self._STOP in batch
+                commands = [command for command in batch if command is not self._STOP]
+                if commands:
+                    self._execute(connection, commands)
+                if stop:
+                    return
+
+    def _execute(self, connection, commands: List[_Command]):
+        metrics.incr("write_queue.batches")
+        metrics.incr("write_queue.commands", len(commands))
+        metrics.set_gauge("write_queue.batch_size", len(commands))
+        started = time.perf_counter()
+        metrics.set_gauge("write_queue.wait_ms", round((started - commands[0].queued_at) * 1000, 3))
+
+        try:
+            with connection.begin():
+                # pysqlite 不会为保存点开启事务，这里显式开启，同时立即获取写锁
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                for command in commands:
+                    command.outcome = self._apply(connection, command)
+        except Exception as e:
+            metrics.incr("write_queue.failed_batches")
+            logger.error(f"写入队列提交失败（{len(commands)} 个命令）: {e}")
+            for command in commands:
+                command.outcome = (False, e)
+
+        metrics.set_gauge("write_queue.commit_ms", round((time.perf_counter() - started) * 1000, 3))
+        for command in commands:
+            self._resolve(command)
+
+    @staticmethod
+    def _apply(connection, command: _Command) -> tuple:
+        session = SessionLocal(
+            bind=connection, join_transaction_mode="create_savepoint", info={"write_queue": True}
+        )
+        try:
+            result = command.func(session, *command.args, **command.kwargs)
+            if session.info.get("sharded_write"):
+                raise ShardedWriteRefused()
+            return True, result
+        except Exception as e:
+            session.rollback()
+            if session.info.get("sharded_write"):
+                # 服务方法可能已把 ShardedWriteRefused 转成其他异常
+                e = ShardedWriteRefused()
+            return False, e
+        finally:
+            session.close()
+
+    @staticmethod
+    def _resolve(command: _Command):
+        if command.loop is None:
+            success, value = command.outcome
+            if success:
+                command.future.set_result(value)
+            else:
+                command.future.set_exception(value)
+            return
+
+        def deliver():
+            # 调用方已取消（如客户端断开）时丢弃结果，修改仍然有效
+            if command.future.cancelled():
+                return
+            success, value = command.outcome
+            if success:
+                command.future.set_result(value)
+            else:
+                command.future.set_exception(value)
+
+        try:
+            command.loop.call_soon_threadsafe(deliver)
+        except RuntimeError:
+            # 调用方的事件循环已关闭
+            pass
+
+write_queue = WriteQueue(engine, settings.SQLITE_WRITE_BATCH_SIZE)
+
+class _Instance:
+    """写命令参数中的ORM对象，以主键传入写入线程，在写入会话中重新加载"""
+
+    __slots__ = ("model", "identity")
+
+    def __init__(self, model, identity):
+        self.model = model
+        self.identity = identity
+
+def _reference(value):
+    state = inspect(value, raiseerr=False)
+    if isinstance(state, InstanceState) and state.identity is not None:
+        return _Instance(state.class_, state.identity)
+    return value
+
+def _load(session, value):
+    if not isinstance(value, _Instance):
+        return value
+    instance = session.get(value.model, value.identity)
+    if instance is None:
+        raise LookupError(f"{value.model.__name__} {value.identity} 已不存在")
+    return instance
+
+async def bypass_db(method: Callable[..., T], *args, **kwargs) -> T:
+    """在写入队列之外用请求的会话执行写方法（与 run_db 相同），队列运行时计入 `write_queue.bypassed`"""
+    if write_queue.running:
+        metrics.incr("write_queue.bypassed")
+    return await run_db(method, *args, **kwargs)
+
+async def write_db(method: Callable[..., T], *args, **kwargs) -> T:
+    """执行服务对象（以会话构造，如 GraphService(db)）上的写方法
+
+    写入队列运行时在写入线程中用写入会话重新构造服务对象执行，与其他请求的写操作
+    合并提交；参数中的ORM对象（如当前用户）属于请求的会话，不能在写入线程中使用，
+    按主键在写入会话中重新加载。写入队列未运行时，或命令访问了分片图谱
+    （ShardedWriteRefused，修改已回滚）时，与 run_db 相同，使用请求的会话在数据库线程池中执行。
+    """
+    if not write_queue.running:
+        return await run_db(method, *args, **kwargs)
+
+    service_class = type(method.__self__)
+    func = method.__func__
+    queued_args = [_reference(value) for value in args]
+    queued_kwargs = {name: _reference(value) for name, value in kwargs.items()}
+
+    def command(session):
+        return func(
+            service_class(session),
+            *[_load(session, value) for value in queued_args],
+            **{name: _load(session, value) for name, value in queued_kwargs.items()}
+        )
+
+    try:
+        return await write_queue.submit(command)
+    except ShardedWriteRefused:
+        metrics.incr("write_queue.sharded_fallbacks")
+        return await bypass_db(method, *args, **kwargs)
@@ -1,10 +1,25 @@
-from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, Float, JSON
+from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, Float, JSON, Index, event, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
+import logging
 
 from app.core.database import Base
 
+logger = logging.getLogger(__name__)
+
+# 节点/边自定义属性的列类型：PostgreSQL 使用 JSONB（可建 GIN 索引），其他数据库使用 JSON
+PropertiesType = JSON().with_variant(JSONB(), "postgresql")
+
+def properties_gin_index(name: str) -> Index:
+    """自定义属性的 GIN 索引（仅PostgreSQL），加速属性等值过滤的 @> 包含查询"""
+    return Index(
+        name, "properties",
+        postgresql_using="gin",
+        postgresql_ops={"properties": "jsonb_path_ops"}
+    ).ddl_if(dialect="postgresql")
+
 class User(Base):
     __tablename__ = "users"
     
@@ -12,6 +27,11 @@ class User(Base):
     username = Column(String(50), unique=True, nullable=False, index=True)
     email = Column(String(100), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
+    # 图谱数量，创建/删除图谱时维护，避免列表分页时重新计数
+    graph_count = Column(
+        Integer, nullable=False, default=0, server_default="0",
+        info={"backfill": "UPDATE users SET graph_count = (SELECT COUNT(*) FROM graphs WHERE graphs.user_id = users.id)"}
+    )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # 关系
@@ -25,8 +45,10 @@ class Graph(Base):
     description = Column(Text)
     user_id = Column(String(36), ForeignKey("users.id"))
     neo4j_graph_id = Column(String(100))  # Neo4j中的图ID
+    shard = Column(String(100), nullable=True)  # 节点和边所在的分片文件名，为空时存储在主库
     node_count = Column(Integer, default=0)
     edge_count = Column(Integer, default=0)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")  # 节点/边数据版本，每次变更递增
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -34,16 +56,109 @@ class Graph(Base):
     user = relationship("User", back_populates="graphs")
     nodes = relationship("Node", back_populates="graph", cascade="all, delete-orphan")
     edges = relationship("Edge", back_populates="graph", cascade="all, delete-orphan")
+    summaries = relationship("GraphSummary", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_graphs_user_id_updated_at_id", "user_id", "updated_at", "id"),  # 列表键集分页
+    )
+
+def _sqlite_table_exists(connection, name: str) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": name}
+    ).first() is not None
+
+# 图谱标题的全文索引（SQLite FTS5 trigram），支持任意子串匹配，通过触发器与 graphs 表保持同步
+#
+# graphs 的主键是字符串，隐式 rowid 在 VACUUM、导出导入后可能重新编号，因此不使用外部内容表：
+# 全文索引自己保存标题和 graph_id（UNINDEXED），rowid 取自 graph_title_keys.key
+# （INTEGER PRIMARY KEY，值不会被改变），用于修改和删除时定位索引行。
+GRAPH_TITLE_FTS_TABLE = "graph_title_fts"
+GRAPH_TITLE_KEYS_TABLE = "graph_title_keys"
+
+GRAPH_TITLE_FTS_DDL = [
+    f"CREATE TABLE IF NOT EXISTS {GRAPH_TITLE_KEYS_TABLE} (key INTEGER PRIMARY KEY, graph_id TEXT NOT NULL UNIQUE)",
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {GRAPH_TITLE_FTS_TABLE}
+    USING fts5(title, graph_id UNINDEXED, tokenize='trigram')
+    """,
+    # 旧版本的触发器以 graphs.rowid 为键，先删除再重建
+    "DROP TRIGGER IF EXISTS graphs_title_fts_insert",
+    f"""
+    CREATE TRIGGER graphs_title_fts_insert AFTER INSERT ON graphs
+    BEGIN
+        INSERT INTO {GRAPH_TITLE_KEYS_TABLE}(graph_id) VALUES (NEW.id);
+        INSERT INTO {GRAPH_TITLE_FTS_TABLE}(rowid, title, graph_id)
+            SELECT key, NEW.title, NEW.id FROM {GRAPH_TITLE_KEYS_TABLE} WHERE graph_id = NEW.id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS graphs_title_fts_update",
+    f"""
+    CREATE TRIGGER graphs_title_fts_update AFTER UPDATE OF title ON graphs
+    BEGIN
+        UPDATE {GRAPH_TITLE_FTS_TABLE} SET title = NEW.title
+        WHERE rowid = (SELECT key FROM {GRAPH_TITLE_KEYS_TABLE} WHERE graph_id = OLD.id);
+    END
+    """,
+    "DROP TRIGGER IF EXISTS graphs_title_fts_delete",
+    f"""
+    CREATE TRIGGER graphs_title_fts_delete AFTER DELETE ON graphs
+    BEGIN
+        DELETE FROM {GRAPH_TITLE_FTS_TABLE} WHERE rowid = (SELECT key FROM {GRAPH_TITLE_KEYS_TABLE} WHERE graph_id = OLD.id);
+        DELETE FROM {GRAPH_TITLE_KEYS_TABLE} WHERE graph_id = OLD.id;
+    END
+    """,
+]
+
+def create_graph_title_index(connection) -> bool:
+    """创建图谱标题全文索引及同步触发器，新建时从 graphs 表重建
+    
+    旧版本以 graphs.rowid 关联的外部内容索引被删除后重建。
+    SQLite不支持FTS5 trigram时返回False，标题搜索会退化为LIKE扫描。
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    
+    try:
+        existed = _sqlite_table_exists(connection, GRAPH_TITLE_FTS_TABLE)
+        if existed and not _sqlite_table_exists(connection, GRAPH_TITLE_KEYS_TABLE):
+            connection.execute(text(f"DROP TABLE {GRAPH_TITLE_FTS_TABLE}"))
+            existed = False
+        
+        for ddl in GRAPH_TITLE_FTS_DDL:
+            connection.execute(text(ddl))
+        
+        if not existed:
+            connection.execute(text(f"DELETE FROM {GRAPH_TITLE_KEYS_TABLE}"))
+            connection.execute(text(f"INSERT INTO {GRAPH_TITLE_KEYS_TABLE}(graph_id) SELECT id FROM graphs"))
+            connection.execute(text(
+                f"INSERT INTO {GRAPH_TITLE_FTS_TABLE}(rowid, title, graph_id) "
+                f"SELECT k.key, g.title, g.id FROM {GRAPH_TITLE_KEYS_TABLE} k JOIN graphs g ON g.id = k.graph_id"
+            ))
+        return True
+    except Exception as e:
+        logger.warning(f"创建图谱标题全文索引失败，标题搜索将使用LIKE扫描: {e}")
+        return False
+
+@event.listens_for(Graph.__table__, "after_create")
+def _create_graph_title_index(target, connection, **kw):
+    create_graph_title_index(connection)
+
+@event.listens_for(Graph.__table__, "before_drop")
+def _drop_graph_title_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {GRAPH_TITLE_FTS_TABLE}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {GRAPH_TITLE_KEYS_TABLE}"))
 
 class Node(Base):
     __tablename__ = "nodes"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    graph_id = Column(String(36), ForeignKey("graphs.id"), nullable=False, index=True)
-    node_id = Column(String(255), nullable=False, index=True)  # 节点在图中的业务ID
+    graph_id = Column(String(36), ForeignKey("graphs.id"), nullable=False)
+    node_id = Column(String(255), nullable=False)  # 节点在图中的业务ID，图内唯一
     label = Column(String(500), nullable=False)
     type = Column(String(100), nullable=False, default="entity")
-    properties = Column(JSON, default=dict)  # 自定义属性
+    properties = Column(PropertiesType, default=dict)  # 自定义属性
     x = Column(Float, nullable=True)  # X坐标
     y = Column(Float, nullable=True)  # Y坐标
     size = Column(Float, nullable=True)  # 节点大小
@@ -56,20 +171,134 @@ class Node(Base):
     
     # 复合索引
     __table_args__ = (
+        Index("ix_nodes_graph_id_id", "graph_id", "id"),  # 键集分页
+        Index("ix_nodes_graph_id_node_id", "graph_id", "node_id", unique=True),  # 按业务ID定位节点
+        properties_gin_index("ix_nodes_properties_gin"),
         {'sqlite_autoincrement': True}
     )
 
+# 节点坐标的空间索引（SQLite R*Tree），通过触发器与 nodes 表保持同步
+#
+# nodes 的主键是字符串，隐式 rowid 在 VACUUM、导出导入后可能重新编号，不能作为R*Tree的 id。
+# R*Tree的 id 取自 node_rtree_keys.key（INTEGER PRIMARY KEY，值不会被改变），
+# 辅助列 node_pk 保存 nodes.id，视口查询直接按节点主键回表。
+#
+# 所有图谱的节点在同一个R*Tree中，第三个维度 (min_g, max_g) 是图谱的整数键
+# （node_rtree_graphs.key），视口查询同时限定图谱，只访问该图谱的索引项，
+# 代价不随其他图谱在同一区域内的节点数增长。
+NODE_RTREE_TABLE = "node_rtree"
+NODE_RTREE_KEYS_TABLE = "node_rtree_keys"
+NODE_RTREE_GRAPHS_TABLE = "node_rtree_graphs"
+
+_NODE_RTREE_ENTRY = (
+    f"SELECT k.key, NEW.x, NEW.x, NEW.y, NEW.y, g.key, g.key, NEW.id "
+    f"FROM {NODE_RTREE_KEYS_TABLE} k, {NODE_RTREE_GRAPHS_TABLE} g "
+    f"WHERE k.node_pk = NEW.id AND g.graph_id = NEW.graph_id"
+)
+
+NODE_RTREE_DDL = [
+    f"CREATE TABLE IF NOT EXISTS {NODE_RTREE_GRAPHS_TABLE} (key INTEGER PRIMARY KEY, graph_id TEXT NOT NULL UNIQUE)",
+    f"CREATE TABLE IF NOT EXISTS {NODE_RTREE_KEYS_TABLE} (key INTEGER PRIMARY KEY, node_pk TEXT NOT NULL UNIQUE)",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {NODE_RTREE_TABLE} USING rtree(id, min_x, max_x, min_y, max_y, min_g, max_g, +node_pk)",
+    # 旧版本的触发器以 nodes.rowid 为键，先删除再重建
+    "DROP TRIGGER IF EXISTS nodes_rtree_insert",
+    f"""
+    CREATE TRIGGER nodes_rtree_insert AFTER INSERT ON nodes
+    WHEN NEW.x IS NOT NULL AND NEW.y IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO {NODE_RTREE_GRAPHS_TABLE}(graph_id) VALUES (NEW.graph_id);
+        INSERT INTO {NODE_RTREE_KEYS_TABLE}(node_pk) VALUES (NEW.id);
+        INSERT INTO {NODE_RTREE_TABLE} {_NODE_RTREE_ENTRY};
+    END
+    """,
+    # 坐标未变化时不触碰R*Tree；坐标被清空时同时删除键
+    "DROP TRIGGER IF EXISTS nodes_rtree_update",
+    f"""
+    CREATE TRIGGER nodes_rtree_update AFTER UPDATE OF x, y ON nodes
+    WHEN OLD.x IS NOT NEW.x OR OLD.y IS NOT NEW.y
+    BEGIN
+        DELETE FROM {NODE_RTREE_TABLE} WHERE id = (SELECT key FROM {NODE_RTREE_KEYS_TABLE} WHERE node_pk = OLD.id);
+        DELETE FROM {NODE_RTREE_KEYS_TABLE} WHERE node_pk = OLD.id AND (NEW.x IS NULL OR NEW.y IS NULL);
+        INSERT OR IGNORE INTO {NODE_RTREE_GRAPHS_TABLE}(graph_id)
+            SELECT NEW.graph_id WHERE NEW.x IS NOT NULL AND NEW.y IS NOT NULL;
+        INSERT OR IGNORE INTO {NODE_RTREE_KEYS_TABLE}(node_pk)
+            SELECT NEW.id WHERE NEW.x IS NOT NULL AND NEW.y IS NOT NULL;
+        INSERT INTO {NODE_RTREE_TABLE} {_NODE_RTREE_ENTRY};
+    END
+    """,
+    "DROP TRIGGER IF EXISTS nodes_rtree_delete",
+    f"""
+    CREATE TRIGGER nodes_rtree_delete AFTER DELETE ON nodes
+    BEGIN
+        DELETE FROM {NODE_RTREE_TABLE} WHERE id = (SELECT key FROM {NODE_RTREE_KEYS_TABLE} WHERE node_pk = OLD.id);
+        DELETE FROM {NODE_RTREE_KEYS_TABLE} WHERE node_pk = OLD.id;
+    END
+    """,
+]
+
+def create_node_spatial_index(connection) -> bool:
+    """创建节点空间索引及同步触发器，新建时回填已有节点坐标
+    
+    旧版本的索引（以 nodes.rowid 为键，或没有图谱维度）被删除后按新的结构重建。
+    SQLite未编译R*Tree模块时返回False，视口查询会退化为坐标范围扫描。
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    
+    try:
+        existed = _sqlite_table_exists(connection, NODE_RTREE_TABLE)
+        if existed and not (
+            _sqlite_table_exists(connection, NODE_RTREE_KEYS_TABLE)
+            and _sqlite_table_exists(connection, NODE_RTREE_GRAPHS_TABLE)
+        ):
+            connection.execute(text(f"DROP TABLE {NODE_RTREE_TABLE}"))
+            existed = False
+        
+        for ddl in NODE_RTREE_DDL:
+            connection.execute(text(ddl))
+        
+        if not existed:
+            connection.execute(text(f"DELETE FROM {NODE_RTREE_KEYS_TABLE}"))
+            connection.execute(text(
+                f"INSERT OR IGNORE INTO {NODE_RTREE_GRAPHS_TABLE}(graph_id) "
+                "SELECT DISTINCT graph_id FROM nodes WHERE x IS NOT NULL AND y IS NOT NULL"
+            ))
+            connection.execute(text(
+                f"INSERT INTO {NODE_RTREE_KEYS_TABLE}(node_pk) "
+                "SELECT id FROM nodes WHERE x IS NOT NULL AND y IS NOT NULL"
+            ))
+            connection.execute(text(
+                f"INSERT INTO {NODE_RTREE_TABLE} "
+                f"SELECT k.key, n.x, n.x, n.y, n.y, g.key, g.key, n.id FROM {NODE_RTREE_KEYS_TABLE} k "
+                f"JOIN nodes n ON n.id = k.node_pk JOIN {NODE_RTREE_GRAPHS_TABLE} g ON g.graph_id = n.graph_id"
+            ))
+        return True
+    except Exception as e:
+        logger.warning(f"创建节点空间索引失败，视口查询将使用范围扫描: {e}")
+        return False
+
+@event.listens_for(Node.__table__, "after_create")
+def _create_node_spatial_index(target, connection, **kw):
+    create_node_spatial_index(connection)
+
+@event.listens_for(Node.__table__, "before_drop")
+def _drop_node_spatial_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {NODE_RTREE_TABLE}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {NODE_RTREE_KEYS_TABLE}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {NODE_RTREE_GRAPHS_TABLE}"))
+
 class Edge(Base):
     __tablename__ = "edges"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    graph_id = Column(String(36), ForeignKey("graphs.id"), nullable=False, index=True)
-    edge_id = Column(String(255), nullable=False, index=True)  # 边在图中的业务ID
-    source_node_id = Column(String(255), nullable=False, index=True)  # 源节点业务ID
-    target_node_id = Column(String(255), nullable=False, index=True)  # 目标节点业务ID
+    graph_id = Column(String(36), ForeignKey("graphs.id"), nullable=False)
+    edge_id = Column(String(255), nullable=False)  # 边在图中的业务ID，图内唯一
+    source_node_id = Column(String(255), nullable=False)  # 源节点业务ID
+    target_node_id = Column(String(255), nullable=False)  # 目标节点业务ID
     label = Column(String(500), nullable=True)
     type = Column(String(100), nullable=False, default="relationship")
-    properties = Column(JSON, default=dict)  # 自定义属性
+    properties = Column(PropertiesType, default=dict)  # 自定义属性
     weight = Column(Float, nullable=True)  # 权重
     color = Column(String(50), nullable=True)  # 边颜色
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -80,5 +309,79 @@ class Edge(Base):
     
     # 复合索引
     __table_args__ = (
+        Index("ix_edges_graph_id_id", "graph_id", "id"),  # 键集分页
+        Index("ix_edges_graph_id_edge_id", "graph_id", "edge_id", unique=True),  # 按业务ID定位边
+        # 按端点查询相邻边，包含另一端点，邻居查询只读索引
+        Index("ix_edges_graph_id_source_node_id", "graph_id", "source_node_id", "target_node_id"),
+        Index("ix_edges_graph_id_target_node_id", "graph_id", "target_node_id", "source_node_id"),
+        properties_gin_index("ix_edges_properties_gin"),
         {'sqlite_autoincrement': True}
-    )
\ No newline at end of file
+    )
+
+class GraphSummary(Base):
+    """图谱的多分辨率概要（LOD），每个缩放级别一行"""
+    __tablename__ = "graph_summaries"
+    
+    graph_id = Column(String(36), ForeignKey("graphs.id"), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)  # 生成时图谱的 data_version
+    bounds = Column(JSON)  # 坐标范围 {min_x, min_y, max_x, max_y}
+    clusters = Column(JSON, default=list)
+    edges = Column(JSON, default=list)
+    unpositioned = Column(Integer, default=0)  # 没有坐标的节点数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class GraphChange(Base):
+    """图谱变更日志（只追加），用于客户端增量同步"""
+    __tablename__ = "graph_changes"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    graph_id = Column(String(36), ForeignKey("graphs.id"), nullable=False)
+    version = Column(Integer, nullable=False)  # 变更后的图谱 data_version
+    entity = Column(String(20), nullable=False)  # node / edge / graph
+    op = Column(String(20), nullable=False)  # insert / update / delete / move / reset
+    entity_id = Column(String(255))  # 节点或边的业务ID
+    data = Column(JSON)  # insert/update 时为变更后的完整数据
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_graph_changes_graph_id_version", "graph_id", "version", unique=True),
+    )
+
+class PropertyIndex(Base):
+    """图谱声明的属性索引：节点/边 properties 中常用于过滤的键及其值类型
+    
+    每条声明对应节点或边表上的 (graph_id, 属性值表达式) 表达式索引，见 PropertyIndexService。
+    """
+    __tablename__ = "property_indexes"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    graph_id = Column(String(36), ForeignKey("graphs.id"), nullable=False)
+    entity = Column(String(10), nullable=False)  # node / edge
+    key = Column(String(100), nullable=False)  # 属性键
+    value_type = Column(String(20), nullable=False)  # string / number / boolean
+    index_name = Column(String(100), nullable=False)  # 数据库中的索引名
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_property_indexes_graph_id_entity_key", "graph_id", "entity", "key", unique=True),
+    )
+
+class Neo4jOutbox(Base):
+    """待同步到Neo4j的写操作（事务性发件箱）
+    
+    与SQLite中的数据修改在同一事务中写入，由后台同步任务按 id 顺序批量写入Neo4j。
+    """
+    __tablename__ = "neo4j_outbox"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)  # 同步顺序
+    graph_id = Column(String(36), nullable=False)  # Neo4j中的图ID（graphs.neo4j_graph_id）
+    op = Column(String(30), nullable=False)  # upsert_nodes / update_nodes / delete_nodes / upsert_edges / delete_edges / sync_graph / delete_graph
+    payload = Column(JSON)  # 行操作为 {"rows": [...]}，sync_graph 为 {"graph_id": SQLite图谱ID}
+    attempts = Column(Integer, nullable=False, default=0)  # 因写入错误失败的次数（连接失败不计）
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        {'sqlite_autoincrement': True},
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
 from datetime import datetime
 
 # 基础响应模型
@@ -96,6 +96,28 @@ class EdgeCreate(BaseModel):
         """获取有效的目标节点ID"""
         return self.target or self.target_node_id
 
+class NodeBatchCreate(BaseModel):
+    nodes: List[NodeCreate] = Field(..., min_length=1)
+
+class EdgeBatchCreate(BaseModel):
+    edges: List[EdgeCreate] = Field(..., min_length=1)
+
+class NodeBatchDelete(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+
+class EdgeBatchDelete(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+
+# 节点位置: [node_id, x, y] 或 [node_id, x, y, size] 或 [node_id, x, y, size, color]
+NodePosition = Union[
+    Tuple[str, float, float],
+    Tuple[str, float, float, Optional[float]],
+    Tuple[str, float, float, Optional[float], Optional[str]]
+]
+
+class NodePositionsUpdate(BaseModel):
+    positions: List[NodePosition] = Field(..., min_length=1)
+
 class EdgeUpdate(BaseModel):
     source: Optional[str] = None
     target: Optional[str] = None
@@ -137,6 +159,14 @@ class GraphUpdate(BaseModel):
     description: Optional[str] = None
     nodes: Optional[List[dict]] = None
     edges: Optional[List[dict]] = None
+    # replace: 清空后重新写入；diff: 按节点/边ID与已有数据比较，只写入变化的行
+    mode: str = Field("replace", pattern="^(replace|diff)$")
+
+class PropertyIndexCreate(BaseModel):
+    entity: str = Field("node", pattern="^(node|edge)$", description="索引节点或边的属性")
+    key: str = Field(..., min_length=1, max_length=100, pattern=r'^[^"\'\\]+$', description="属性键")
+    # 过滤值为该类型时使用索引，按类型比较（数字不匹配字符串形式的数字）
+    type: str = Field("string", pattern="^(string|number|boolean)$", description="属性值类型")
 
 class GraphMetadata(BaseModel):
     created_at: datetime
@@ -159,6 +189,7 @@ class GraphWithData(Graph):
 class GraphList(BaseModel):
     graphs: List[Graph]
     total: int
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多数据时为None
 
 # 图统计模型
 class GraphStats(BaseModel):
@@ -185,4 +216,5 @@ class CypherQuery(BaseModel):
 class PaginationParams(BaseModel):
     page: int = 1
     size: int = 10
-    search: Optional[str] = None
\ No newline at end of file
+    search: Optional[str] = None
+    cursor: Optional[str] = None  # 指定时按游标分页，忽略 page
\ No newline at end of file
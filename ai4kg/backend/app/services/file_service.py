@@ -11,8 +11,12 @@ import xml.etree.ElementTree as ET
 from xml.dom import minidom
 import logging
 
+from app.core.concurrency import run_db
+from app.core.shards import route_graph
+from app.core.write_queue import write_db
 from app.models.models import Graph, Node, Edge, User
 from app.schemas.schemas import GraphCreate, NodeCreate, EdgeCreate
+from app.services.graph_reader import iter_graph_rows
 
 logger = logging.getLogger(__name__)
 
@@ -21,51 +25,59 @@ class FileService:
         self.db = db
     
     async def import_graph_file(self, file: UploadFile, user: User, title: Optional[str] = None, description: Optional[str] = None) -> dict:
-        """导入图谱文件"""
+        """导入图谱文件，解析在数据库线程池中执行，创建图谱通过写入队列提交"""
+        # 读取文件内容
+        content = await file.read()
+        graph_create = await run_db(self._parse_content, content, file.filename, title, description)
+        try:
+            from app.services.graph_service import GraphService
+            return await write_db(GraphService(self.db).create_graph, graph_create, user)
+        except Exception as e:
+            logger.error(f"文件导入失败: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"文件导入失败: {str(e)}")
+    
+    def _parse_content(self, content: bytes, filename: str, title: Optional[str], description: Optional[str]) -> GraphCreate:
         try:
-            # 读取文件内容
-            content = await file.read()
-            
             # 根据文件类型解析数据
-            if file.filename.endswith('.json'):
+            if filename.endswith('.json'):
                 graph_data = self._parse_json(content)
-            elif file.filename.endswith('.csv'):
+            elif filename.endswith('.csv'):
                 graph_data = self._parse_csv(content)
-            elif file.filename.endswith('.gexf'):
+            elif filename.endswith('.gexf'):
                 graph_data = self._parse_gexf(content)
-            elif file.filename.endswith('.graphml'):
+            elif filename.endswith('.graphml'):
                 graph_data = self._parse_graphml(content)
             else:
                 raise HTTPException(status_code=400, detail="不支持的文件格式")
             
-            # 创建图谱
-            from app.services.graph_service import GraphService
-            graph_service = GraphService(self.db)
-            
-            graph_create = GraphCreate(
-                title=title or file.filename.replace('.', '_'),
-                description=description or f"从文件 {file.filename} 导入",
+            return GraphCreate(
+                title=title or filename.replace('.', '_'),
+                description=description or f"从文件 {filename} 导入",
                 nodes=graph_data.get('nodes', []),
                 edges=graph_data.get('edges', [])
             )
             
-            result = graph_service.create_graph(graph_create, user)
-            return result
-            
         except Exception as e:
             logger.error(f"文件导入失败: {str(e)}")
             raise HTTPException(status_code=400, detail=f"文件导入失败: {str(e)}")
     
+    def get_graph(self, graph_id: str) -> Optional[Graph]:
+        """获取图谱记录（不加载节点和边），用于导出前的缓存校验"""
+        graph = self.db.query(Graph).filter(Graph.id == graph_id).first()
+        route_graph(self.db, graph)
+        return graph
+    
     def export_graph(self, graph_id: str, format: str) -> Tuple[bytes, str, str]:
         """导出图谱数据"""
         try:
             # 获取图谱数据
-            graph = self.db.query(Graph).filter(Graph.id == graph_id).first()
+            graph = self.get_graph(graph_id)
             if not graph:
                 raise HTTPException(status_code=404, detail="图谱不存在")
             
-            nodes = self.db.query(Node).filter(Node.graph_id == graph_id).all()
-            edges = self.db.query(Edge).filter(Edge.graph_id == graph_id).all()
+            # 直接读取表行，不实例化ORM对象
+            nodes = list(iter_graph_rows(self.db, Node, graph_id))
+            edges = list(iter_graph_rows(self.db, Edge, graph_id))
             
             # 根据格式导出
             if format == 'json':
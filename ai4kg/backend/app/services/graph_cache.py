@@ -0,0 +1,102 @@
+from fastapi.encoders import jsonable_encoder
+from typing import Optional
+import json
+import logging
+
+from app.core.config import get_settings
+from app.core.database import get_redis
+from app.core.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class GraphCache:
+    """基于Redis的图谱快照缓存
+
+    缓存 get_graph_with_data 的序列化结果，键由图谱ID和数据版本组成。图谱的
+    任何变更都会递增 data_version，旧版本的键自然不再命中，因此无需在读取
+    路径上做失效判断。Redis不可用时所有操作直接跳过。
+
+    超过 GRAPH_CACHE_MAX_BYTES 的版本写入一个小的标记键，读取时与缓存键一起取回，
+    之后该版本的读取不再为了判断大小而序列化整个图谱。
+    """
+
+    KEY_PREFIX = "ai4kg:graph"
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_redis()
+        # 本实例读取时发现已标记为超限的 (图谱ID, 版本)
+        self._oversize = set()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.GRAPH_CACHE_ENABLED and self.client is not None
+
+    def _key(self, graph_id: str, version: int) -> str:
+        return f"{self.KEY_PREFIX}:{graph_id}:v{version}"
+
+    def _oversize_key(self, graph_id: str, version: int) -> str:
+        return f"{self._key(graph_id, version)}:oversize"
+
+    def get(self, graph_id: str, version: int) -> Optional[dict]:
+        """读取缓存的图谱数据，未命中时返回None"""
+        if not self.enabled:
+            return None
+
+        try:
+            payload, oversize = self.client.mget([
+                self._key(graph_id, version), self._oversize_key(graph_id, version)
+            ])
+        except Exception as e:
+            logger.warning(f"读取图谱缓存失败: {e}")
+            metrics.incr("graph_cache.errors")
+            return None
+
+        if payload is None:
+            metrics.incr("graph_cache.misses")
+            if oversize is not None:
+                self._oversize.add((graph_id, version))
+            return None
+
+        metrics.incr("graph_cache.hits")
+        return json.loads(payload)
+
+    def set(self, graph_id: str, version: int, data: dict) -> bool:
+        """写入图谱数据，超过大小上限的图谱不缓存，并标记该版本超限"""
+        if not self.enabled:
+            return False
+        if (graph_id, version) in self._oversize:
+            metrics.incr("graph_cache.oversize_skips")
+            return False
+
+        payload = json.dumps(jsonable_encoder(data), ensure_ascii=False).encode("utf-8")
+        if len(payload) > settings.GRAPH_CACHE_MAX_BYTES:
+            metrics.incr("graph_cache.oversize")
+            try:
+                self.client.set(self._oversize_key(graph_id, version), b"1", ex=settings.GRAPH_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"写入图谱缓存失败: {e}")
+                metrics.incr("graph_cache.errors")
+            return False
+
+        try:
+            self.client.set(self._key(graph_id, version), payload, ex=settings.GRAPH_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"写入图谱缓存失败: {e}")
+            metrics.incr("graph_cache.errors")
+            return False
+
+        metrics.incr("graph_cache.stores")
+        metrics.incr("graph_cache.stored_bytes", len(payload))
+        return True
+
+    def invalidate(self, graph_id: str, version: int):
+        """删除指定版本的缓存，释放Redis内存"""
+        if not self.enabled:
+            return
+
+        try:
+            self.client.delete(self._key(graph_id, version), self._oversize_key(graph_id, version))
+        except Exception as e:
+            logger.warning(f"删除图谱缓存失败: {e}")
+            metrics.incr("graph_cache.errors")
@@ -0,0 +1,106 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Callable, Iterator, List, Optional
+
+from app.core.config import get_settings
+from app.models.models import Node, Edge
+
+settings = get_settings()
+
+nodes_table = Node.__table__
+edges_table = Edge.__table__
+
+# 可投影的字段（前端字段名 -> 列），与 GraphService._node_to_dict / _edge_to_dict 的输出一致
+NODE_FIELD_COLUMNS = {
+    "id": nodes_table.c.node_id,
+    "label": nodes_table.c.label,
+    "type": nodes_table.c.type,
+    "properties": nodes_table.c.properties,
+    "x": nodes_table.c.x,
+    "y": nodes_table.c.y,
+    "size": nodes_table.c.size,
+    "color": nodes_table.c.color,
+}
+EDGE_FIELD_COLUMNS = {
+    "id": edges_table.c.edge_id,
+    "source": edges_table.c.source_node_id,
+    "target": edges_table.c.target_node_id,
+    "label": edges_table.c.label,
+    "type": edges_table.c.type,
+    "properties": edges_table.c.properties,
+    "weight": edges_table.c.weight,
+    "color": edges_table.c.color,
+}
+EDGE_REQUIRED_FIELDS = ("id", "source", "target")
+
+# 为空字符串时同样省略的字段
+_OMIT_EMPTY = {
+    Node: ("color",),
+    Edge: ("label", "color"),
+}
+
+def field_columns(model) -> dict:
+    return NODE_FIELD_COLUMNS if model is Node else EDGE_FIELD_COLUMNS
+
+def select_columns(model, fields: Optional[List[str]] = None) -> list:
+    """按字段名选择带标签的列，未指定时选择全部字段"""
+    columns = field_columns(model)
+    return [columns[field].label(field) for field in fields or columns]
+
+def row_converter(model, fields: Optional[List[str]] = None) -> Callable:
+    """返回将查询行转换为前端字典的函数
+
+    值为空的可选字段不出现在结果中，properties 为空时返回 {}。
+    """
+    fields = list(fields or field_columns(model))
+    omit_empty = _OMIT_EMPTY[model]
+
+    def to_dict(row) -> dict:
+        item = {}
+        for field, value in zip(fields, row):
+            if field == "properties":
+                item[field] = value or {}
+            elif value is None or (value == "" and field in omit_empty):
+                continue
+            else:
+                item[field] = value
+        return item
+
+    return to_dict
+
+def iter_graph_dicts(
+    db: Session,
+    model,
+    graph_id: str,
+    fields: Optional[List[str]] = None,
+    chunk_size: Optional[int] = None
+) -> Iterator[dict]:
+    """以Core select按批读取图谱的节点或边，直接构造字典
+
+    不创建ORM实例、不进入identity map，整图读取和导出都走这条路径。
+    """
+    table = model.__table__
+    statement = select(*select_columns(model, fields)).where(
+        table.c.graph_id == graph_id
+    ).execution_options(yield_per=chunk_size or settings.GRAPH_STREAM_CHUNK_SIZE)
+
+    to_dict = row_converter(model, fields)
+    for row in db.execute(statement):
+        yield to_dict(row)
+
+def iter_graph_rows(
+    db: Session,
+    model,
+    graph_id: str,
+    chunk_size: Optional[int] = None
+) -> Iterator:
+    """以Core select按批读取图谱的节点或边的完整行
+
+    返回的行可按列名访问属性（如 row.node_id），用于导出等需要原始列的场景。
+    """
+    table = model.__table__
+    statement = select(table).where(
+        table.c.graph_id == graph_id
+    ).execution_options(yield_per=chunk_size or settings.GRAPH_STREAM_CHUNK_SIZE)
+
+    yield from db.execute(statement)
@@ -1,51 +1,85 @@
+from sqlalchemy import String, and_, bindparam, column, delete, func, insert, or_, select, table, text, type_coerce, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException, status
-from typing import List, Optional
+from typing import Callable, Iterator, List, Optional
+from collections import Counter
+from datetime import datetime
 import uuid
+import json
 import logging
 
-from app.models.models import Graph, User, Node, Edge
+from app.models.models import (
+    Graph, GraphChange, User, Node, Edge, NODE_RTREE_TABLE, NODE_RTREE_GRAPHS_TABLE, GRAPH_TITLE_FTS_TABLE
+)
 from app.schemas.schemas import GraphCreate, GraphUpdate, PaginationParams
-from app.core.database import get_neo4j_session
+from app.core.config import get_settings
+from app.core.database import copy_rows, get_neo4j_session, neo4j_available
+from app.core.shards import route_graph, shard_manager
+from app.services.graph_cache import GraphCache
+from app.services.property_index_service import PropertyIndexService
+from app.services.neo4j_sync import (
+    DELETE_EDGES, DELETE_GRAPH, DELETE_NODES, SYNC_GRAPH, UPDATE_NODES, UPSERT_EDGES, UPSERT_NODES, enqueue
+)
+from app.services.graph_reader import (
+    NODE_FIELD_COLUMNS, EDGE_FIELD_COLUMNS, EDGE_REQUIRED_FIELDS,
+    field_columns, iter_graph_dicts, row_converter, select_columns
+)
+from app.services.query_filters import (
+    decode_cursor, encode_cursor, graph_scope_condition, parse_fields, property_conditions, text_search_condition
+)
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# 视口查询中按节点ID查询相连边时每批的ID数量
+VIEWPORT_EDGE_BATCH = 500
+
+# 按ID集合查询时每条 IN 语句的ID数量（低于SQLite的参数个数上限）
+ID_QUERY_BATCH = 500
+
+# trigram 全文索引只能加速至少3个字符的子串匹配
+TITLE_SEARCH_MIN_LENGTH = 3
+
 class GraphService:
     def __init__(self, db: Session):
         self.db = db
+        self.cache = GraphCache()
     
     def create_graph(self, graph_data: GraphCreate, user: User) -> dict:
         """创建新图谱"""
+        nodes = self._unique_by_id(graph_data.nodes)
+        edges = self._unique_by_id(graph_data.edges)
         try:
             # 生成Neo4j图ID
             neo4j_graph_id = str(uuid.uuid4())
+            graph_id = str(uuid.uuid4())
             
-            # 在SQLite中创建图谱记录
+            # 在SQLite中创建图谱记录，分片模式下节点和边写入图谱自己的分片文件
             db_graph = Graph(
+                id=graph_id,
+                shard=shard_manager.new_shard(graph_id),
                 title=graph_data.title,
                 description=graph_data.description,
                 user_id=user.id,
                 neo4j_graph_id=neo4j_graph_id,
-                node_count=len(graph_data.nodes) if graph_data.nodes else 0,
-                edge_count=len(graph_data.edges) if graph_data.edges else 0
+                node_count=len(nodes),
+                edge_count=len(edges)
             )
             
             self.db.add(db_graph)
+            self._adjust_graph_count(user, 1)
+            self.db.flush()
+            route_graph(self.db, db_graph)
+            
+            # 节点和边与图谱记录、发件箱记录在同一事务中提交，其他请求不会读到（并缓存）没有数据的新图谱。
+            # Neo4j由同步任务按SQLite中的数据写入
+            if nodes or edges:
+                enqueue(self.db, neo4j_graph_id, SYNC_GRAPH, {"graph_id": db_graph.id})
+                self._save_graph_data_to_sqlite(db_graph.id, nodes, edges)
             self.db.commit()
             self.db.refresh(db_graph)
             
-            # 保存节点和边数据
-            if graph_data.nodes or graph_data.edges:
-                # 先保存到SQLite
-                self._save_graph_data_to_sqlite(db_graph.id, graph_data.nodes, graph_data.edges)
-                
-                # 然后尝试保存到Neo4j（如果可用）
-                try:
-                    self._save_graph_data_to_neo4j(neo4j_graph_id, graph_data.nodes, graph_data.edges)
-                    logger.info("数据已同时保存到SQLite和Neo4j")
-                except Exception as e:
-                    logger.warning(f"Neo4j不可用，数据仅保存到SQLite: {e}")
-            
             # 返回格式化的数据
             return {
                 "id": db_graph.id,
@@ -67,24 +101,48 @@ class GraphService:
                 detail=f"创建图谱失败: {str(e)}"
             )
     
-    def get_user_graphs(self, user: User, params: PaginationParams) -> tuple[List[dict], int]:
-        """获取用户的图谱列表"""
-        query = self.db.query(Graph).filter(Graph.user_id == user.id)
+    def get_user_graphs(self, user: User, params: PaginationParams) -> tuple[List[dict], int, Optional[str]]:
+        """获取用户的图谱列表
+        
+        按 (updated_at, id) 倒序排列。指定游标时使用键集分页，深分页的代价与
+        页码无关；总数取自用户的 graph_count，不再逐次计数。返回
+        (图谱列表, 总数, 下一页游标)。
+        """
+        sqlite = self.db.get_bind(Graph).dialect.name == "sqlite"
+        # SQLite 以文本存储时间并按文本排序，不同方式写入的文本格式不同（如是否带微秒），
+        # 转换为时间后不能与原值精确比较，因此按原始文本比较；其他数据库按时间类型比较
+        updated_key = type_coerce(Graph.updated_at, String) if sqlite else Graph.updated_at
+        query = self.db.query(Graph, updated_key.label("updated_key")).filter(Graph.user_id == user.id)
         
         # 搜索过滤
         if params.search:
-            query = query.filter(Graph.title.ilike(f"%{params.search}%"))
+            query = query.filter(self._title_search_condition(params.search))
+            total = query.count()
+        else:
+            total = self.db.query(User.graph_count).filter(User.id == user.id).scalar() or 0
         
-        # 获取总数
-        total = query.count()
+        query = query.order_by(Graph.updated_at.desc(), Graph.id.desc())
+        if params.cursor:
+            updated_at, graph_id = self._decode_list_cursor(params.cursor, parse_time=not sqlite)
+            query = query.filter(or_(
+                updated_key < updated_at,
+                and_(updated_key == updated_at, Graph.id < graph_id)
+            ))
+        else:
+            query = query.offset((params.page - 1) * params.size)
         
-        # 分页
-        offset = (params.page - 1) * params.size
-        db_graphs = query.offset(offset).limit(params.size).all()
+        # 多取一行用于判断是否还有下一页
+        rows = query.limit(params.size + 1).all()
+        next_cursor = None
+        if len(rows) > params.size:
+            last_graph, last_key = rows[params.size - 1]
+            if isinstance(last_key, datetime):
+                last_key = last_key.isoformat()
+            next_cursor = encode_cursor(json.dumps([last_key, last_graph.id]))
         
         # 转换为正确格式
         graphs = []
-        for db_graph in db_graphs:
+        for db_graph, _ in rows[:params.size]:
             graphs.append({
                 "id": db_graph.id,
                 "title": db_graph.title,
@@ -98,17 +156,67 @@ class GraphService:
                 }
             })
         
-        return graphs, total
+        return graphs, total, next_cursor
+    
+    @staticmethod
+    def _decode_list_cursor(cursor: str, parse_time: bool) -> tuple:
+        """解析图谱列表游标 [updated_at, id]
+        
+        updated_at 为 SQLite 中的原始文本，或其他数据库中时间的 ISO 8601 格式（parse_time 时解析为时间）。
+        """
+        try:
+            updated_at, graph_id = json.loads(decode_cursor(cursor))
+            if not isinstance(updated_at, str):
+                raise TypeError(updated_at)
+            if parse_time:
+                updated_at = datetime.fromisoformat(updated_at)
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的分页游标"
+            )
+        return updated_at, str(graph_id)
+    
+    def _title_search_condition(self, search: str):
+        """标题子串匹配条件，SQLite下优先使用 trigram 全文索引"""
+        if len(search) >= TITLE_SEARCH_MIN_LENGTH and self._has_title_index():
+            # 以短语形式 MATCH（带 ESCAPE 的 LIKE 不会使用FTS索引）
+            fts = table(GRAPH_TITLE_FTS_TABLE, column("graph_id"), column("title"))
+            phrase = '"' + search.replace('"', '""') + '"'
+            return Graph.id.in_(
+                select(fts.c.graph_id).where(fts.c.title.op("MATCH")(phrase))
+            )
+        return Graph.title.ilike(f"%{search}%")
+    
+    def _has_title_index(self) -> bool:
+        """检查图谱标题全文索引是否可用"""
+        if self.db.get_bind().dialect.name != "sqlite":
+            return False
+        return self.db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": GRAPH_TITLE_FTS_TABLE}
+        ).first() is not None
+    
+    def _adjust_graph_count(self, user: User, delta: int):
+        """在当前事务中调整用户的图谱数量"""
+        self.db.execute(
+            update(User).where(User.id == user.id).values(graph_count=User.graph_count + delta)
+        )
     
     def get_graph_by_id(self, graph_id: str, user: User) -> Optional[Graph]:
-        """根据ID获取图谱"""
-        return self.db.query(Graph).filter(
+        """根据ID获取图谱，会话中后续的节点/边语句发往该图谱所在的存储"""
+        graph = self.db.query(Graph).filter(
             Graph.id == graph_id,
             Graph.user_id == user.id
         ).first()
+        route_graph(self.db, graph)
+        return graph
     
-    def get_graph_with_data(self, graph_id: str, user: User) -> dict:
-        """获取包含节点和边数据的图谱"""
+    def get_graph_with_data(self, graph_id: str, user: User, fields: Optional[str] = None) -> dict:
+        """获取包含节点和边数据的图谱
+        
+        指定 `fields`（逗号分隔）时只查询并返回这些字段，节点和边各取适用的部分。
+        """
         graph = self.get_graph_by_id(graph_id, user)
         if not graph:
             raise HTTPException(
@@ -116,13 +224,25 @@ class GraphService:
                 detail="图谱不存在"
             )
         
+        node_fields, edge_fields = self._graph_fields(fields)
+        projected = node_fields is not None
+        
+        # 数据版本未变化时直接使用缓存（只缓存完整数据）
+        if not projected:
+            cached = self.cache.get(graph.id, graph.data_version)
+            if cached is not None:
+                return cached
+        
         # 优先从SQLite获取节点和边数据
-        nodes, edges = self._get_graph_data_from_sqlite(graph.id)
+        nodes, edges = self._get_graph_data_from_sqlite(graph.id, node_fields, edge_fields)
         
         # 如果SQLite中没有数据，尝试从Neo4j获取
         if not nodes and not edges:
             try:
                 nodes, edges = self._get_graph_data_from_neo4j(graph.neo4j_graph_id)
+                if projected:
+                    nodes = [{k: v for k, v in node.items() if k in node_fields} for node in nodes]
+                    edges = [{k: v for k, v in edge.items() if k in edge_fields} for edge in edges]
                 logger.info("从Neo4j获取图数据")
             except Exception as e:
                 logger.warning(f"从Neo4j获取数据失败: {e}")
@@ -130,7 +250,7 @@ class GraphService:
         else:
             logger.info("从SQLite获取图数据")
         
-        return {
+        graph_data = {
             "id": graph.id,
             "title": graph.title,
             "description": graph.description,
@@ -140,9 +260,264 @@ class GraphService:
                 "created_at": graph.created_at,
                 "updated_at": graph.updated_at,
                 "node_count": graph.node_count,
-                "edge_count": graph.edge_count
+                "edge_count": graph.edge_count,
+                "version": graph.data_version
             }
         }
+        if not projected:
+            self.cache.set(graph.id, graph.data_version, graph_data)
+        return graph_data
+    
+    @staticmethod
+    def _graph_fields(fields: Optional[str]) -> tuple[Optional[List[str]], Optional[List[str]]]:
+        """将图谱级的字段列表拆分为节点字段和边字段"""
+        allowed = set(NODE_FIELD_COLUMNS) | set(EDGE_FIELD_COLUMNS)
+        requested = parse_fields(fields, allowed)
+        if requested is None:
+            return None, None
+        
+        node_fields = [field for field in requested if field in NODE_FIELD_COLUMNS]
+        edge_fields = list(EDGE_REQUIRED_FIELDS)
+        edge_fields.extend(
+            field for field in requested if field in EDGE_FIELD_COLUMNS and field not in edge_fields
+        )
+        return node_fields, edge_fields
+    
+    def stream_graph_ndjson(
+        self,
+        graph: Graph,
+        chunk_size: Optional[int] = None,
+        fields: Optional[str] = None
+    ) -> Iterator[str]:
+        """以NDJSON格式分批输出图谱数据
+        
+        依次输出一行图谱元数据、所有节点、所有边和一行结束标记。节点和边按批从
+        SQLite游标中读取并立即写出，内存占用与图谱规模无关。
+        """
+        chunk_size = chunk_size or settings.GRAPH_STREAM_CHUNK_SIZE
+        node_fields, edge_fields = self._graph_fields(fields)
+        
+        def dumps(record: dict) -> str:
+            return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        
+        yield dumps({
+            "type": "graph",
+            "data": {
+                "id": graph.id,
+                "title": graph.title,
+                "description": graph.description,
+                "metadata": {
+                    "created_at": graph.created_at,
+                    "updated_at": graph.updated_at,
+                    "node_count": graph.node_count,
+                    "edge_count": graph.edge_count,
+                    "version": graph.data_version
+                }
+            }
+        })
+        
+        node_total = 0
+        buffer = []
+        for node in iter_graph_dicts(self.db, Node, graph.id, node_fields, chunk_size):
+            buffer.append(dumps({"type": "node", "data": node}))
+            if len(buffer) >= chunk_size:
+                node_total += len(buffer)
+                yield "".join(buffer)
+                buffer = []
+        if buffer:
+            node_total += len(buffer)
+            yield "".join(buffer)
+            buffer = []
+        
+        edge_total = 0
+        for edge in iter_graph_dicts(self.db, Edge, graph.id, edge_fields, chunk_size):
+            buffer.append(dumps({"type": "edge", "data": edge}))
+            if len(buffer) >= chunk_size:
+                edge_total += len(buffer)
+                yield "".join(buffer)
+                buffer = []
+        if buffer:
+            edge_total += len(buffer)
+            yield "".join(buffer)
+        
+        # 结束标记，客户端可据此判断数据是否完整
+        yield dumps({"type": "end", "node_count": node_total, "edge_count": edge_total})
+    
+    def list_nodes(
+        self,
+        graph: Graph,
+        type: Optional[str] = None,
+        label: Optional[str] = None,
+        search: Optional[str] = None,
+        property_filters: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[str] = None
+    ) -> tuple[List[dict], Optional[str]]:
+        """按条件分页查询节点，过滤和分页均在SQL中完成
+        
+        使用键集分页（按主键排序），读取一页的代价与页大小相关而与图谱规模无关。
+        返回 (节点列表, 下一页游标)，没有更多数据时游标为None。
+        """
+        entities, to_dict = self._projection(Node, parse_fields(fields, NODE_FIELD_COLUMNS))
+        query = self.db.query(*entities).filter(Node.graph_id == graph.id)
+        
+        if type:
+            query = query.filter(func.lower(Node.type) == type.lower())
+        if label:
+            query = query.filter(func.lower(Node.label).contains(label.lower(), autoescape=True))
+        if search:
+            query = query.filter(
+                text_search_condition(self.db, search, Node.label, Node.type, Node.properties)
+            )
+        indexed = PropertyIndexService(self.db).declared(graph, "node") if property_filters else None
+        if indexed:
+            query = query.filter(graph_scope_condition(Node.graph_id, graph.id))
+        for condition in property_conditions(self.db, Node.properties, property_filters, indexed):
+            query = query.filter(condition)
+        
+        return self._fetch_page(query, Node, to_dict, cursor, limit)
+    
+    def list_edges(
+        self,
+        graph: Graph,
+        type: Optional[str] = None,
+        label: Optional[str] = None,
+        search: Optional[str] = None,
+        node_id: Optional[str] = None,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+        property_filters: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[str] = None
+    ) -> tuple[List[dict], Optional[str]]:
+        """按条件分页查询边，过滤和分页均在SQL中完成"""
+        edge_fields = parse_fields(fields, EDGE_FIELD_COLUMNS, EDGE_REQUIRED_FIELDS)
+        entities, to_dict = self._projection(Edge, edge_fields)
+        query = self.db.query(*entities).filter(Edge.graph_id == graph.id)
+        
+        if type:
+            query = query.filter(func.lower(Edge.type) == type.lower())
+        if label:
+            query = query.filter(func.lower(Edge.label).contains(label.lower(), autoescape=True))
+        if search:
+            query = query.filter(
+                text_search_condition(self.db, search, Edge.label, Edge.type, Edge.properties)
+            )
+        if node_id:
+            query = query.filter(
+                (Edge.source_node_id == node_id) | (Edge.target_node_id == node_id)
+            )
+        if source:
+            query = query.filter(Edge.source_node_id == source)
+        if target:
+            query = query.filter(Edge.target_node_id == target)
+        indexed = PropertyIndexService(self.db).declared(graph, "edge") if property_filters else None
+        if indexed:
+            query = query.filter(graph_scope_condition(Edge.graph_id, graph.id))
+        for condition in property_conditions(self.db, Edge.properties, property_filters, indexed):
+            query = query.filter(condition)
+        
+        return self._fetch_page(query, Edge, to_dict, cursor, limit)
+    
+    def _fetch_page(self, query, model, to_dict, cursor: Optional[str], limit: Optional[int]) -> tuple[List[dict], Optional[str]]:
+        """按主键执行键集分页"""
+        if cursor:
+            query = query.filter(model.id > decode_cursor(cursor))
+        query = query.order_by(model.id)
+        
+        if limit is None:
+            return [to_dict(row) for row in query.all()], None
+        
+        # 多取一行用于判断是否还有下一页
+        rows = query.limit(limit + 1).all()
+        next_cursor = encode_cursor(rows[limit - 1].row_id) if len(rows) > limit else None
+        return [to_dict(row) for row in rows[:limit]], next_cursor
+    
+    def _projection(self, model, fields: Optional[List[str]]) -> tuple[list, Callable]:
+        """返回 (查询列, 行转字典函数)
+        
+        只查询需要的列（附带主键 row_id 用于分页），不实例化ORM对象；
+        未选择 properties 时不读取也不解析JSON列。
+        """
+        entities = select_columns(model, fields)
+        entities.append(model.__table__.c.id.label("row_id"))
+        return entities, row_converter(model, fields)
+    
+    def get_viewport(
+        self,
+        graph: Graph,
+        min_x: float,
+        min_y: float,
+        max_x: float,
+        max_y: float,
+        limit: int,
+        include_edges: bool = True
+    ) -> dict:
+        """获取矩形区域内的节点及与其相连的边
+        
+        优先使用R*Tree空间索引定位节点，不可用时退化为坐标范围扫描。
+        """
+        query = self.db.query(Node).filter(
+            Node.graph_id == graph.id,
+            Node.x.between(min_x, max_x),
+            Node.y.between(min_y, max_y)
+        )
+        
+        if self._has_spatial_index():
+            # R*Tree以32位浮点存储坐标和图谱键并向外取整，最终仍以上面的精确条件过滤
+            rtree = table(
+                NODE_RTREE_TABLE, column("node_pk"), column("min_x"), column("max_x"),
+                column("min_y"), column("max_y"), column("min_g"), column("max_g")
+            )
+            graphs = table(NODE_RTREE_GRAPHS_TABLE, column("key"), column("graph_id"))
+            # 与节点查询在同一语句中，分片图谱使用分片文件中的索引
+            graph_key = select(graphs.c.key).where(graphs.c.graph_id == graph.id).scalar_subquery()
+            in_box = select(rtree.c.node_pk).where(
+                rtree.c.max_x >= min_x,
+                rtree.c.min_x <= max_x,
+                rtree.c.max_y >= min_y,
+                rtree.c.min_y <= max_y,
+                rtree.c.max_g >= graph_key,
+                rtree.c.min_g <= graph_key
+            )
+            query = query.filter(Node.id.in_(in_box))
+        
+        db_nodes = query.limit(limit + 1).all()
+        truncated = len(db_nodes) > limit
+        nodes = [self._node_to_dict(db_node) for db_node in db_nodes[:limit]]
+        
+        edges = []
+        if include_edges and nodes:
+            node_ids = [node["id"] for node in nodes]
+            seen = set()
+            # 分批查询，避免超出SQLite的参数数量限制
+            for start in range(0, len(node_ids), VIEWPORT_EDGE_BATCH):
+                batch = node_ids[start:start + VIEWPORT_EDGE_BATCH]
+                for db_edge in self.db.query(Edge).filter(
+                    Edge.graph_id == graph.id,
+                    Edge.source_node_id.in_(batch) | Edge.target_node_id.in_(batch)
+                ):
+                    if db_edge.id not in seen:
+                        seen.add(db_edge.id)
+                        edges.append(self._edge_to_dict(db_edge))
+        
+        return {
+            "nodes": nodes,
+            "edges": edges,
+            "truncated": truncated
+        }
+    
+    def _has_spatial_index(self) -> bool:
+        """当前数据库是否存在节点空间索引"""
+        bind = self.db.get_bind()
+        if bind.dialect.name != "sqlite":
+            return False
+        return self.db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": NODE_RTREE_TABLE}
+        ).first() is not None
     
     def update_graph(self, graph_id: str, graph_data: GraphUpdate, user: User) -> dict:
         """更新图谱"""
@@ -160,31 +535,41 @@ class GraphService:
             if graph_data.description is not None:
                 graph.description = graph_data.description
             
+            diff = None
+            if graph_data.mode == "diff":
+                # 只写入与已有数据不同的行，变更逐行记入变更日志
+                if graph_data.nodes is not None or graph_data.edges is not None:
+                    diff = self._apply_graph_diff(graph, graph_data.nodes, graph_data.edges)
+                if graph_data.title or graph_data.description is not None:
+                    self._record_changes(graph, [("graph", "update", graph.id, {
+                        "title": graph.title,
+                        "description": graph.description
+                    })])
             # 如果提供了节点和边数据，更新存储
-            if graph_data.nodes is not None or graph_data.edges is not None:
-                nodes = graph_data.nodes or []
-                edges = graph_data.edges or []
+            elif graph_data.nodes is not None or graph_data.edges is not None:
+                nodes = self._unique_by_id(graph_data.nodes)
+                edges = self._unique_by_id(graph_data.edges)
                 
-                # 先更新SQLite中的数据
+                # 更新SQLite中的数据，Neo4j由同步任务按SQLite中的数据重建
+                enqueue(self.db, graph.neo4j_graph_id, SYNC_GRAPH, {"graph_id": graph.id})
                 self._save_graph_data_to_sqlite(graph.id, nodes, edges)
                 
-                # 然后尝试更新Neo4j中的数据
-                try:
-                    self._clear_graph_data_from_neo4j(graph.neo4j_graph_id)
-                    self._save_graph_data_to_neo4j(graph.neo4j_graph_id, nodes, edges)
-                    logger.info("数据已同时更新到SQLite和Neo4j")
-                except Exception as e:
-                    logger.warning(f"Neo4j不可用，数据仅更新到SQLite: {e}")
-                
                 # 更新计数
                 graph.node_count = len(nodes)
                 graph.edge_count = len(edges)
-            
+                
+                # 整体替换数据，客户端需要重新加载
+                self._record_changes(graph, [("graph", "reset", graph.id, None)])
+            else:
+                self._record_changes(graph, [("graph", "update", graph.id, {
+                    "title": graph.title,
+                    "description": graph.description
+                })])
             self.db.commit()
             self.db.refresh(graph)
             
             # 返回格式化的数据
-            return {
+            result = {
                 "id": graph.id,
                 "title": graph.title,
                 "description": graph.description,
@@ -196,7 +581,13 @@ class GraphService:
                     "edge_count": graph.edge_count
                 }
             }
+            if diff is not None:
+                result["diff"] = diff
+            return result
             
+        except HTTPException:
+            self.db.rollback()
+            raise
         except Exception as e:
             self.db.rollback()
             raise HTTPException(
@@ -204,6 +595,161 @@ class GraphService:
                 detail=f"更新图谱失败: {str(e)}"
             )
     
+    def _apply_graph_diff(self, graph: Graph, nodes: Optional[List[dict]], edges: Optional[List[dict]]) -> dict:
+        """按业务ID比较提交的节点/边与已有数据，只写入新增、修改和删除的行（不提交事务）
+        
+        nodes/edges 为图谱的完整目标集合，为 None 时不比较该集合；被删除节点的
+        相关边随节点级联删除。新增和修改各以一条 executemany 语句写入，删除按
+        ID集合分批执行，写入量与变化的行数成正比。返回各集合的差异计数。
+        """
+        diff = {}
+        node_upserts = []
+        nodes_to_delete = []
+        if nodes is not None:
+            node_upserts, nodes_to_delete, diff["nodes"] = self._diff_rows(
+                graph, Node, [self._node_item(node_data) for node_data in nodes]
+            )
+            self._write_diff_rows(graph, Node, node_upserts)
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_NODES, {"rows": [row for row, _ in node_upserts]})
+            self._record_changes(graph, [("node", op, row["id"], row) for row, op in node_upserts])
+        
+        if edges is not None:
+            items = []
+            for index, edge_data in enumerate(edges):
+                source = edge_data.get('source') or edge_data.get('source_node_id')
+                target = edge_data.get('target') or edge_data.get('target_node_id')
+                if not source or not target:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"第 {index + 1} 条边缺少源节点或目标节点ID"
+                    )
+                items.append({
+                    "id": edge_data.get('id') or str(uuid.uuid4()),
+                    "source": source,
+                    "target": target,
+                    "label": edge_data.get('label') or '',
+                    "type": edge_data.get('type') or 'relationship',
+                    "properties": edge_data.get('properties') or {},
+                    "weight": edge_data.get('weight'),
+                    "color": edge_data.get('color')
+                })
+            edge_upserts, edges_to_delete, diff["edges"] = self._diff_rows(graph, Edge, items)
+            
+            edge_table = Edge.__table__
+            deleted_edge_ids = []
+            for start in range(0, len(edges_to_delete), ID_QUERY_BATCH):
+                deleted_edge_ids.extend(self.db.execute(
+                    delete(edge_table).where(
+                        edge_table.c.graph_id == graph.id,
+                        edge_table.c.edge_id.in_(edges_to_delete[start:start + ID_QUERY_BATCH])
+                    ).returning(edge_table.c.edge_id)
+                ).scalars())
+            graph.edge_count -= len(deleted_edge_ids)
+            enqueue(self.db, graph.neo4j_graph_id, DELETE_EDGES, {"rows": deleted_edge_ids})
+            self._record_changes(graph, [("edge", "delete", edge_id, None) for edge_id in deleted_edge_ids])
+            
+            self._write_diff_rows(graph, Edge, edge_upserts)
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_EDGES, {"rows": [row for row, _ in edge_upserts]})
+            self._record_changes(graph, [("edge", op, row["id"], row) for row, op in edge_upserts])
+        
+        if nodes_to_delete:
+            _, cascaded_edge_ids = self._delete_node_set(graph, nodes_to_delete)
+            if "edges" in diff:
+                diff["edges"]["deleted"] += len(cascaded_edge_ids)
+            else:
+                diff["edges"] = {
+                    "inserted": 0,
+                    "updated": 0,
+                    "deleted": len(cascaded_edge_ids),
+                    "unchanged": graph.edge_count
+                }
+        
+        return diff
+    
+    @staticmethod
+    def _node_item(node_data: dict) -> dict:
+        """按整图保存时的默认值规范化提交的节点"""
+        return {
+            "id": node_data.get('id') or str(uuid.uuid4()),
+            "label": node_data.get('label', ''),
+            "type": node_data.get('type') or 'entity',
+            "properties": node_data.get('properties') or {},
+            "x": node_data.get('x'),
+            "y": node_data.get('y'),
+            "size": node_data.get('size'),
+            "color": node_data.get('color')
+        }
+    
+    def _diff_rows(self, graph: Graph, model, items: List[dict]) -> tuple:
+        """比较规范化后的提交行与已有行
+        
+        两侧都转换为 row_converter 的字典后比较，与读取接口看到的数据一致。
+        ID重复时以最后一次为准。返回 ([(行字典, "insert"|"update")], 待删除ID, 计数)。
+        """
+        columns = field_columns(model)
+        to_dict = row_converter(model)
+        existing = {row["id"]: row for row in iter_graph_dicts(self.db, model, graph.id)}
+        
+        submitted = {}
+        for item in items:
+            submitted[item["id"]] = to_dict([item[field] for field in columns])
+        
+        upserts = []
+        unchanged = 0
+        for item_id, row in submitted.items():
+            current = existing.get(item_id)
+            if current is None:
+                upserts.append((row, "insert"))
+            elif current != row:
+                upserts.append((row, "update"))
+            else:
+                unchanged += 1
+        to_delete = [item_id for item_id in existing if item_id not in submitted]
+        
+        inserted = sum(1 for _, op in upserts if op == "insert")
+        return upserts, to_delete, {
+            "inserted": inserted,
+            "updated": len(upserts) - inserted,
+            "deleted": len(to_delete),
+            "unchanged": unchanged
+        }
+    
+    def _write_diff_rows(self, graph: Graph, model, upserts: List[tuple]):
+        """以 executemany 写入差异中的新增行和修改行，并更新计数"""
+        table = model.__table__
+        columns = field_columns(model)
+        
+        def values(row: dict) -> dict:
+            # row_converter 省略了空值，写回时补全为整行
+            return {
+                columns[field].name: row.get(field, {} if field == "properties" else None)
+                for field in columns
+            }
+        
+        inserts = [{"id": str(uuid.uuid4()), "graph_id": graph.id, **values(row)} for row, op in upserts if op == "insert"]
+        if inserts:
+            self.db.execute(insert(model), inserts)
+        
+        updates = [
+            {f"b_{name}": value for name, value in values(row).items()}
+            for row, op in upserts if op == "update"
+        ]
+        if updates:
+            id_column = columns["id"]
+            statement = update(table).where(
+                table.c.graph_id == graph.id,
+                id_column == bindparam(f"b_{id_column.name}")
+            ).values({
+                column.name: bindparam(f"b_{column.name}")
+                for field, column in columns.items() if field != "id"
+            })
+            self.db.execute(statement, updates)
+        
+        if model is Node:
+            graph.node_count += len(inserts)
+        else:
+            graph.edge_count += len(inserts)
+    
     def delete_graph(self, graph_id: str, user: User) -> bool:
         """删除图谱"""
         graph = self.get_graph_by_id(graph_id, user)
@@ -214,19 +760,28 @@ class GraphService:
             )
         
         try:
-            # 从SQLite删除节点和边数据
-            self._clear_graph_data_from_sqlite(graph.id)
+            if graph.shard:
+                # 分片中只有该图谱的数据，提交后删除整个文件，不再逐行删除
+                set_committed_value(graph, "nodes", [])
+                set_committed_value(graph, "edges", [])
+            else:
+                # 从SQLite删除节点和边数据
+                self._clear_graph_data_from_sqlite(graph.id)
+            self.db.query(GraphChange).filter(GraphChange.graph_id == graph.id).delete()
+            PropertyIndexService(self.db).remove_graph(graph)
             
-            # 从Neo4j删除图数据（如果可用）
-            try:
-                self._clear_graph_data_from_neo4j(graph.neo4j_graph_id)
-                logger.info("已从SQLite和Neo4j删除图数据")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，仅从SQLite删除图数据: {e}")
+            enqueue(self.db, graph.neo4j_graph_id, DELETE_GRAPH, {})
             
             # 从SQLite删除图谱记录
+            version = graph.data_version
+            shard = graph.shard
             self.db.delete(graph)
+            self._adjust_graph_count(user, -1)
             self.db.commit()
+            self.cache.invalidate(graph_id, version)
+            if shard:
+                route_graph(self.db, None)
+                shard_manager.drop(shard)
             
             return True
             
@@ -237,85 +792,10 @@ class GraphService:
                 detail=f"删除图谱失败: {str(e)}"
             )
     
-    def _save_graph_data_to_neo4j(self, graph_id: str, nodes: List, edges: List):
-        """将图数据保存到Neo4j"""
-        try:
-            with get_neo4j_session() as session:
-                # 创建节点
-                for node in nodes:
-                    # 处理Pydantic模型或字典
-                    if hasattr(node, 'model_dump'):
-                        node_data = node.model_dump()
-                    elif hasattr(node, 'dict'):
-                        node_data = node.dict()
-                    else:
-                        node_data = node
-                    
-                    session.run(
-                        """
-                        CREATE (n:Node {
-                            id: $id,
-                            graph_id: $graph_id,
-                            label: $label,
-                            type: $type,
-                            properties: $properties,
-                            x: $x,
-                            y: $y,
-                            size: $size,
-                            color: $color
-                        })
-                        """,
-                        id=node_data.get('id') or str(uuid.uuid4()),
-                        graph_id=graph_id,
-                        label=node_data.get('label'),
-                        type=node_data.get('type'),
-                        properties=node_data.get('properties', {}),
-                        x=node_data.get('x'),
-                        y=node_data.get('y'),
-                        size=node_data.get('size'),
-                        color=node_data.get('color')
-                    )
-                
-                # 创建边
-                for edge in edges:
-                    # 处理Pydantic模型或字典
-                    if hasattr(edge, 'model_dump'):
-                        edge_data = edge.model_dump()
-                    elif hasattr(edge, 'dict'):
-                        edge_data = edge.dict()
-                    else:
-                        edge_data = edge
-                    
-                    session.run(
-                        """
-                        MATCH (source:Node {id: $source, graph_id: $graph_id})
-                        MATCH (target:Node {id: $target, graph_id: $graph_id})
-                        CREATE (source)-[r:EDGE {
-                            id: $id,
-                            graph_id: $graph_id,
-                            label: $label,
-                            type: $type,
-                            properties: $properties,
-                            weight: $weight,
-                            color: $color
-                        }]->(target)
-                        """,
-                        id=edge_data.get('id') or str(uuid.uuid4()),
-                        graph_id=graph_id,
-                        source=edge_data.get('source_node_id'),
-                        target=edge_data.get('target_node_id'),
-                        label=edge_data.get('label'),
-                        type=edge_data.get('type'),
-                        properties=edge_data.get('properties', {}),
-                        weight=edge_data.get('weight'),
-                        color=edge_data.get('color')
-                    )
-        except Exception as e:
-            logger.warning(f"保存数据到Neo4j失败: {e}")
-            raise
-    
     def _get_graph_data_from_neo4j(self, graph_id: str) -> tuple[List[dict], List[dict]]:
-        """从Neo4j获取图数据"""
+        """从Neo4j获取图数据，Neo4j未连接或熔断时直接返回空数据"""
+        if not neo4j_available():
+            return [], []
         try:
             with get_neo4j_session() as session:
                 # 获取节点
@@ -323,7 +803,7 @@ class GraphService:
                     "MATCH (n:Node {graph_id: $graph_id}) RETURN n",
                     graph_id=graph_id
                 )
-                nodes = [dict(record["n"]) for record in nodes_result]
+                nodes = [self._decode_neo4j_properties(dict(record["n"])) for record in nodes_result]
                 
                 # 获取边
                 edges_result = session.run(
@@ -335,7 +815,7 @@ class GraphService:
                 )
                 edges = []
                 for record in edges_result:
-                    edge_data = dict(record["r"])
+                    edge_data = self._decode_neo4j_properties(dict(record["r"]))
                     edge_data["source"] = record["source"]
                     edge_data["target"] = record["target"]
                     edges.append(edge_data)
@@ -345,31 +825,34 @@ class GraphService:
             logger.warning(f"从Neo4j获取数据失败: {e}")
             return [], []
     
-    def _clear_graph_data_from_neo4j(self, graph_id: str):
-        """从Neo4j清除图数据"""
-        try:
-            with get_neo4j_session() as session:
-                # 删除边
-                session.run(
-                    "MATCH ()-[r:EDGE {graph_id: $graph_id}]-() DELETE r",
-                    graph_id=graph_id
-                )
-                # 删除节点
-                session.run(
-                    "MATCH (n:Node {graph_id: $graph_id}) DELETE n",
-                    graph_id=graph_id
-                )
-        except Exception as e:
-            logger.warning(f"从Neo4j清除数据失败: {e}")
-            # 不抛出异常，允许继续运行
+    @staticmethod
+    def _decode_neo4j_properties(item: dict) -> dict:
+        """同步任务将 properties 以JSON字符串写入Neo4j，读取时还原"""
+        if isinstance(item.get("properties"), str):
+            item["properties"] = json.loads(item["properties"])
+        return item
+    
+    @staticmethod
+    def _unique_by_id(items: Optional[List]) -> List[dict]:
+        """节点和边的业务ID在图内唯一，同一ID出现多次时以最后一次为准"""
+        unique = {}
+        for item in items or []:
+            # 处理Pydantic模型或字典
+            data = item.model_dump() if hasattr(item, 'model_dump') else dict(item)
+            data['id'] = data.get('id') or str(uuid.uuid4())
+            unique[data['id']] = data
+        return list(unique.values())
     
     def _save_graph_data_to_sqlite(self, graph_id: str, nodes: List, edges: List):
-        """将图数据保存到SQLite"""
+        """将图数据保存到SQLite（PostgreSQL 下以 COPY 批量写入）
+        
+        不提交事务，由调用方与发件箱记录、图谱计数等修改一起提交或回滚。
+        """
         try:
             # 先清除旧数据
             self._clear_graph_data_from_sqlite(graph_id)
             
-            # 保存节点
+            node_rows = []
             for node in nodes:
                 # 处理Pydantic模型或字典
                 if hasattr(node, 'model_dump'):
@@ -379,20 +862,20 @@ class GraphService:
                 else:
                     node_data = node
                 
-                db_node = Node(
-                    graph_id=graph_id,
-                    node_id=node_data.get('id', str(uuid.uuid4())),
-                    label=node_data.get('label', ''),
-                    type=node_data.get('type', 'entity'),
-                    properties=node_data.get('properties', {}),
-                    x=node_data.get('x'),
-                    y=node_data.get('y'),
-                    size=node_data.get('size'),
-                    color=node_data.get('color')
-                )
-                self.db.add(db_node)
-            
-            # 保存边
+                node_rows.append({
+                    "id": str(uuid.uuid4()),
+                    "graph_id": graph_id,
+                    "node_id": node_data.get('id', str(uuid.uuid4())),
+                    "label": node_data.get('label', ''),
+                    "type": node_data.get('type', 'entity'),
+                    "properties": node_data.get('properties', {}),
+                    "x": node_data.get('x'),
+                    "y": node_data.get('y'),
+                    "size": node_data.get('size'),
+                    "color": node_data.get('color')
+                })
+            
+            edge_rows = []
             for edge in edges:
                 # 处理Pydantic模型或字典
                 if hasattr(edge, 'model_dump'):
@@ -402,68 +885,47 @@ class GraphService:
                 else:
                     edge_data = edge
                 
-                db_edge = Edge(
-                    graph_id=graph_id,
-                    edge_id=edge_data.get('id', str(uuid.uuid4())),
-                    source_node_id=edge_data.get('source_node_id', ''),
-                    target_node_id=edge_data.get('target_node_id', ''),
-                    label=edge_data.get('label', ''),
-                    type=edge_data.get('type', 'relationship'),
-                    properties=edge_data.get('properties', {}),
-                    weight=edge_data.get('weight'),
-                    color=edge_data.get('color')
-                )
-                self.db.add(db_edge)
-            
-            self.db.commit()
-            logger.info(f"已保存到SQLite: {len(nodes)} 节点, {len(edges)} 边")
+                edge_rows.append({
+                    "id": str(uuid.uuid4()),
+                    "graph_id": graph_id,
+                    "edge_id": edge_data.get('id', str(uuid.uuid4())),
+                    "source_node_id": edge_data.get('source_node_id', ''),
+                    "target_node_id": edge_data.get('target_node_id', ''),
+                    "label": edge_data.get('label', ''),
+                    "type": edge_data.get('type', 'relationship'),
+                    "properties": edge_data.get('properties', {}),
+                    "weight": edge_data.get('weight'),
+                    "color": edge_data.get('color')
+                })
+            
+            self._insert_rows(Node, node_rows)
+            self._insert_rows(Edge, edge_rows)
+            logger.info(f"已写入SQLite: {len(nodes)} 节点, {len(edges)} 边")
             
         except Exception as e:
-            self.db.rollback()
             logger.error(f"保存数据到SQLite失败: {e}")
             raise
     
-    def _get_graph_data_from_sqlite(self, graph_id: str) -> tuple[List[dict], List[dict]]:
-        """从SQLite获取图数据"""
+    def _insert_rows(self, model, rows: List[dict]):
+        """批量写入完整的节点/边行：PostgreSQL 使用 COPY，其他数据库使用 executemany"""
+        if not rows:
+            return
+        connection = self.db.connection()
+        if connection.dialect.name == "postgresql":
+            copy_rows(connection, model.__table__, rows)
+        else:
+            self.db.execute(insert(model), rows)
+    
+    def _get_graph_data_from_sqlite(
+        self,
+        graph_id: str,
+        node_fields: Optional[List[str]] = None,
+        edge_fields: Optional[List[str]] = None
+    ) -> tuple[List[dict], List[dict]]:
+        """从SQLite获取图数据，可只查询指定字段"""
         try:
-            # 获取节点
-            db_nodes = self.db.query(Node).filter(Node.graph_id == graph_id).all()
-            nodes = []
-            for db_node in db_nodes:
-                node_dict = {
-                    "id": db_node.node_id,  # 使用业务ID而不是数据库主键
-                    "label": db_node.label,
-                    "type": db_node.type,
-                    "properties": db_node.properties or {}
-                }
-                if db_node.x is not None:
-                    node_dict["x"] = db_node.x
-                if db_node.y is not None:
-                    node_dict["y"] = db_node.y
-                if db_node.size is not None:
-                    node_dict["size"] = db_node.size
-                if db_node.color:
-                    node_dict["color"] = db_node.color
-                nodes.append(node_dict)
-            
-            # 获取边
-            db_edges = self.db.query(Edge).filter(Edge.graph_id == graph_id).all()
-            edges = []
-            for db_edge in db_edges:
-                edge_dict = {
-                    "id": db_edge.edge_id,  # 使用业务ID而不是数据库主键
-                    "source": db_edge.source_node_id,  # 前端期望的字段名
-                    "target": db_edge.target_node_id,  # 前端期望的字段名
-                    "type": db_edge.type,
-                    "properties": db_edge.properties or {}
-                }
-                if db_edge.label:
-                    edge_dict["label"] = db_edge.label
-                if db_edge.weight is not None:
-                    edge_dict["weight"] = db_edge.weight
-                if db_edge.color:
-                    edge_dict["color"] = db_edge.color
-                edges.append(edge_dict)
+            nodes = list(iter_graph_dicts(self.db, Node, graph_id, node_fields))
+            edges = list(iter_graph_dicts(self.db, Edge, graph_id, edge_fields))
             
             return nodes, edges
             
@@ -471,18 +933,125 @@ class GraphService:
             logger.error(f"从SQLite获取数据失败: {e}")
             return [], []
     
+    def _bump_version(self, graph: Graph, count: int = 1) -> int:
+        """在当前事务中原子递增图谱数据版本，返回新版本号"""
+        graphs = Graph.__table__
+        previous = graph.data_version
+        version = self.db.execute(
+            update(graphs)
+            .where(graphs.c.id == graph.id)
+            .values(data_version=graphs.c.data_version + count)
+            .returning(graphs.c.data_version)
+        ).scalar_one()
+        set_committed_value(graph, "data_version", version)
+        # 旧版本的缓存不会再被读取，及时释放
+        self.cache.invalidate(graph.id, previous)
+        return version
+    
+    def _record_changes(self, graph: Graph, changes: List[tuple]) -> int:
+        """将变更写入变更日志，每条变更占用一个递增的版本号
+        
+        changes 中每一项为 (entity, op, entity_id, data)，与数据修改在同一事务中提交。
+        返回最新版本号。
+        """
+        if not changes:
+            return graph.data_version
+        
+        version = self._bump_version(graph, len(changes))
+        first_version = version - len(changes) + 1
+        self.db.execute(
+            insert(GraphChange),
+            [
+                {
+                    "graph_id": graph.id,
+                    "version": first_version + offset,
+                    "entity": entity,
+                    "op": op,
+                    "entity_id": entity_id,
+                    "data": data
+                }
+                for offset, (entity, op, entity_id, data) in enumerate(changes)
+            ]
+        )
+        return version
+    
+    def get_changes(self, graph: Graph, since: int, limit: int) -> dict:
+        """获取指定版本之后的变更"""
+        rows = self.db.query(GraphChange).filter(
+            GraphChange.graph_id == graph.id,
+            GraphChange.version > since
+        ).order_by(GraphChange.version).limit(limit + 1).all()
+        
+        has_more = len(rows) > limit
+        changes = [
+            {
+                "version": row.version,
+                "entity": row.entity,
+                "op": row.op,
+                "id": row.entity_id,
+                "data": row.data,
+                "created_at": row.created_at
+            }
+            for row in rows[:limit]
+        ]
+        
+        return {
+            "since": since,
+            "version": changes[-1]["version"] if has_more else graph.data_version,
+            "current_version": graph.data_version,
+            "changes": changes,
+            "has_more": has_more,
+            # 存在整体替换时客户端应重新加载整个图谱
+            "reset_required": any(change["op"] == "reset" for change in changes)
+        }
+    
+    @staticmethod
+    def _node_to_dict(db_node: Node) -> dict:
+        """将节点记录转换为前端使用的字典格式"""
+        node_dict = {
+            "id": db_node.node_id,  # 使用业务ID而不是数据库主键
+            "label": db_node.label,
+            "type": db_node.type,
+            "properties": db_node.properties or {}
+        }
+        if db_node.x is not None:
+            node_dict["x"] = db_node.x
+        if db_node.y is not None:
+            node_dict["y"] = db_node.y
+        if db_node.size is not None:
+            node_dict["size"] = db_node.size
+        if db_node.color:
+            node_dict["color"] = db_node.color
+        return node_dict
+    
+    @staticmethod
+    def _edge_to_dict(db_edge: Edge) -> dict:
+        """将边记录转换为前端使用的字典格式"""
+        edge_dict = {
+            "id": db_edge.edge_id,  # 使用业务ID而不是数据库主键
+            "source": db_edge.source_node_id,  # 前端期望的字段名
+            "target": db_edge.target_node_id,  # 前端期望的字段名
+            "type": db_edge.type,
+            "properties": db_edge.properties or {}
+        }
+        if db_edge.label:
+            edge_dict["label"] = db_edge.label
+        if db_edge.weight is not None:
+            edge_dict["weight"] = db_edge.weight
+        if db_edge.color:
+            edge_dict["color"] = db_edge.color
+        return edge_dict
+    
     def _clear_graph_data_from_sqlite(self, graph_id: str):
-        """从SQLite清除图数据"""
+        """从SQLite清除图数据，不提交事务（由调用方提交）"""
         try:
             # 删除边
             self.db.query(Edge).filter(Edge.graph_id == graph_id).delete()
             # 删除节点
             self.db.query(Node).filter(Node.graph_id == graph_id).delete()
-            self.db.commit()
             logger.info(f"已从SQLite清除图数据: {graph_id}")
             
         except Exception as e:
-            self.db.rollback()
             logger.error(f"从SQLite清除数据失败: {e}")
             raise
     
@@ -495,10 +1064,15 @@ class GraphService:
                 detail="图谱不存在"
             )
         
+        # 生成节点ID
+        node_id = node_data.get('id', str(uuid.uuid4()))
+        if self._existing_node_ids(graph.id, [node_id]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"节点ID已存在: {node_id}"
+            )
+        
         try:
-            # 生成节点ID
-            node_id = node_data.get('id', str(uuid.uuid4()))
-            
             # 创建节点对象
             db_node = Node(
                 graph_id=graph.id,
@@ -518,37 +1092,10 @@ class GraphService:
             # 更新节点计数
             graph.node_count += 1
             
-            # 尝试保存到Neo4j
-            try:
-                with get_neo4j_session() as session:
-                    session.run(
-                        """
-                        CREATE (n:Node {
-                            id: $id,
-                            graph_id: $graph_id,
-                            label: $label,
-                            type: $type,
-                            properties: $properties,
-                            x: $x,
-                            y: $y,
-                            size: $size,
-                            color: $color
-                        })
-                        """,
-                        id=node_id,
-                        graph_id=graph.neo4j_graph_id,
-                        label=node_data.get('label'),
-                        type=node_data.get('type'),
-                        properties=node_data.get('properties', {}),
-                        x=node_data.get('x'),
-                        y=node_data.get('y'),
-                        size=node_data.get('size'),
-                        color=node_data.get('color')
-                    )
-                logger.info("节点已同时保存到SQLite和Neo4j")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，节点仅保存到SQLite: {e}")
+            node = self._node_to_dict(db_node)
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_NODES, {"rows": [node]})
             
+            self._record_changes(graph, [("node", "insert", node_id, node)])
             self.db.commit()
             
             return {
@@ -618,37 +1165,10 @@ class GraphService:
             # 更新边计数
             graph.edge_count += 1
             
-            # 尝试保存到Neo4j
-            try:
-                with get_neo4j_session() as session:
-                    session.run(
-                        """
-                        MATCH (source:Node {id: $source, graph_id: $graph_id})
-                        MATCH (target:Node {id: $target, graph_id: $graph_id})
-                        CREATE (source)-[r:EDGE {
-                            id: $id,
-                            graph_id: $graph_id,
-                            label: $label,
-                            type: $type,
-                            properties: $properties,
-                            weight: $weight,
-                            color: $color
-                        }]->(target)
-                        """,
-                        id=edge_id,
-                        graph_id=graph.neo4j_graph_id,
-                        source=edge_data.get('source'),
-                        target=edge_data.get('target'),
-                        label=edge_data.get('label'),
-                        type=edge_data.get('type'),
-                        properties=edge_data.get('properties', {}),
-                        weight=edge_data.get('weight'),
-                        color=edge_data.get('color')
-                    )
-                logger.info("边已同时保存到SQLite和Neo4j")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，边仅保存到SQLite: {e}")
+            edge = self._edge_to_dict(db_edge)
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_EDGES, {"rows": [edge]})
             
+            self._record_changes(graph, [("edge", "insert", edge_id, edge)])
             self.db.commit()
             
             return {
@@ -672,6 +1192,260 @@ class GraphService:
                 detail=f"添加边失败: {str(e)}"
             )
     
+    def add_nodes(self, graph_id: str, nodes: List[dict], user: User) -> List[str]:
+        """批量添加节点
+        
+        一次查询校验节点ID冲突，在同一事务中以 executemany 写入，节点计数只更新
+        一次，Neo4j写入进入同步发件箱。返回新节点的ID列表。
+        """
+        if len(nodes) > settings.GRAPH_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"单次最多添加 {settings.GRAPH_BATCH_MAX_SIZE} 个节点"
+            )
+        
+        graph = self.get_graph_by_id(graph_id, user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        items = []
+        for node_data in nodes:
+            items.append({
+                "id": node_data.get('id') or str(uuid.uuid4()),
+                "label": node_data.get('label', ''),
+                "type": node_data.get('type') or 'entity',
+                "properties": node_data.get('properties') or {},
+                "x": node_data.get('x'),
+                "y": node_data.get('y'),
+                "size": node_data.get('size'),
+                "color": node_data.get('color')
+            })
+        
+        node_ids = [item["id"] for item in items]
+        duplicates = {node_id for node_id, count in Counter(node_ids).items() if count > 1}
+        conflicts = duplicates | self._existing_node_ids(graph.id, node_ids)
+        if conflicts:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"节点ID重复: {', '.join(sorted(conflicts)[:20])}"
+            )
+        
+        try:
+            self.db.execute(insert(Node), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "graph_id": graph.id,
+                    "node_id": item["id"],
+                    "label": item["label"],
+                    "type": item["type"],
+                    "properties": item["properties"],
+                    "x": item["x"],
+                    "y": item["y"],
+                    "size": item["size"],
+                    "color": item["color"]
+                }
+                for item in items
+            ])
+            graph.node_count += len(items)
+            
+            to_dict = row_converter(Node)
+            rows = [to_dict([item[field] for field in NODE_FIELD_COLUMNS]) for item in items]
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_NODES, {"rows": rows})
+            self._record_changes(graph, [("node", "insert", row["id"], row) for row in rows])
+            self.db.commit()
+            
+            return node_ids
+            
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"批量添加节点失败: {str(e)}"
+            )
+    
+    def add_edges(self, graph_id: str, edges: List[dict], user: User) -> List[str]:
+        """批量添加边
+        
+        所有端点以一次集合查询校验存在性，其余与 add_nodes 相同。返回新边的ID列表。
+        """
+        if len(edges) > settings.GRAPH_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"单次最多添加 {settings.GRAPH_BATCH_MAX_SIZE} 条边"
+            )
+        
+        graph = self.get_graph_by_id(graph_id, user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        items = []
+        for index, edge_data in enumerate(edges):
+            if not edge_data.get('source') or not edge_data.get('target'):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"第 {index + 1} 条边缺少源节点或目标节点ID"
+                )
+            items.append({
+                "id": edge_data.get('id') or str(uuid.uuid4()),
+                "source": edge_data['source'],
+                "target": edge_data['target'],
+                "label": edge_data.get('label') or '',
+                "type": edge_data.get('type') or 'relationship',
+                "properties": edge_data.get('properties') or {},
+                "weight": edge_data.get('weight'),
+                "color": edge_data.get('color')
+            })
+        
+        endpoints = {item["source"] for item in items} | {item["target"] for item in items}
+        missing = endpoints - self._existing_node_ids(graph.id, endpoints)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"源节点或目标节点不存在: {', '.join(sorted(missing)[:20])}"
+            )
+        
+        edge_ids = [item["id"] for item in items]
+        duplicates = {edge_id for edge_id, count in Counter(edge_ids).items() if count > 1}
+        conflicts = duplicates | self._existing_edge_ids(graph.id, edge_ids)
+        if conflicts:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"边ID重复: {', '.join(sorted(conflicts)[:20])}"
+            )
+        
+        try:
+            self.db.execute(insert(Edge), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "graph_id": graph.id,
+                    "edge_id": item["id"],
+                    "source_node_id": item["source"],
+                    "target_node_id": item["target"],
+                    "label": item["label"],
+                    "type": item["type"],
+                    "properties": item["properties"],
+                    "weight": item["weight"],
+                    "color": item["color"]
+                }
+                for item in items
+            ])
+            graph.edge_count += len(items)
+            
+            to_dict = row_converter(Edge)
+            rows = [to_dict([item[field] for field in EDGE_FIELD_COLUMNS]) for item in items]
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_EDGES, {"rows": rows})
+            self._record_changes(graph, [("edge", "insert", row["id"], row) for row in rows])
+            self.db.commit()
+            
+            return [item["id"] for item in items]
+            
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"批量添加边失败: {str(e)}"
+            )
+    
+    def update_node_positions(self, graph_id: str, positions: List[tuple], user: User) -> int:
+        """批量更新节点位置（布局保存）
+        
+        positions 中每项为 (node_id, x, y[, size[, color]])。不存在的节点先以一次
+        集合查询排除（不依赖 executemany 的 rowcount，部分驱动不能可靠返回），
+        其余按字段组合分组，每组以一条 executemany UPDATE 写入，同一事务提交；
+        Neo4j更新进入同步发件箱。整批在变更日志中只记录一条 move 变更，
+        data.node_ids 为移动的节点ID，data.positions 为与请求相同的紧凑数组，
+        避免为每个节点写一行日志。返回实际更新的节点数。
+        """
+        if len(positions) > settings.GRAPH_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"单次最多更新 {settings.GRAPH_BATCH_MAX_SIZE} 个节点位置"
+            )
+        
+        graph = self.get_graph_by_id(graph_id, user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        # 同一节点出现多次时以最后一次为准
+        moves = {}
+        for position in positions:
+            fields = ("x", "y", "size", "color")[:len(position) - 1]
+            moves[position[0]] = dict(zip(fields, position[1:]))
+        
+        try:
+            # 忽略不存在的节点
+            existing = self._existing_node_ids(graph.id, moves)
+            moves = {node_id: values for node_id, values in moves.items() if node_id in existing}
+            
+            # 按更新的字段组合分组，每组参数结构相同，可用一条 executemany 执行
+            groups = {}
+            for node_id, values in moves.items():
+                params = {f"b_{field}": value for field, value in values.items()}
+                params["b_node_id"] = node_id
+                groups.setdefault(tuple(values), []).append(params)
+            
+            nodes = Node.__table__
+            for fields, rows in groups.items():
+                statement = update(nodes).where(
+                    nodes.c.graph_id == graph.id,
+                    nodes.c.node_id == bindparam("b_node_id")
+                ).values({field: bindparam(f"b_{field}") for field in fields})
+                self.db.execute(statement, rows)
+            
+            enqueue(self.db, graph.neo4j_graph_id, UPDATE_NODES, {
+                "rows": [{"id": node_id, "values": values} for node_id, values in moves.items()]
+            })
+            if moves:
+                self._record_changes(graph, [("node", "move", None, {
+                    "node_ids": list(moves),
+                    "positions": [[node_id, *values.values()] for node_id, values in moves.items()]
+                })])
+            self.db.commit()
+            
+            return len(moves)
+            
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"批量更新节点位置失败: {str(e)}"
+            )
+    
+    def _existing_node_ids(self, graph_id: str, node_ids) -> set:
+        """返回给定ID中已存在于图谱的节点ID"""
+        node_ids = list(set(node_ids))
+        found = set()
+        for start in range(0, len(node_ids), ID_QUERY_BATCH):
+            found.update(self.db.execute(
+                select(Node.node_id).where(
+                    Node.graph_id == graph_id,
+                    Node.node_id.in_(node_ids[start:start + ID_QUERY_BATCH])
+                )
+            ).scalars())
+        return found
+    
+    def _existing_edge_ids(self, graph_id: str, edge_ids) -> set:
+        """返回给定ID中已存在于图谱的边ID"""
+        edge_ids = list(set(edge_ids))
+        found = set()
+        for start in range(0, len(edge_ids), ID_QUERY_BATCH):
+            found.update(self.db.execute(
+                select(Edge.edge_id).where(
+                    Edge.graph_id == graph_id,
+                    Edge.edge_id.in_(edge_ids[start:start + ID_QUERY_BATCH])
+                )
+            ).scalars())
+        return found
+    
     def update_node(self, graph_id: str, node_id: str, node_data: dict, user: User) -> dict:
         """更新节点"""
         graph = self.get_graph_by_id(graph_id, user)
@@ -710,34 +1484,10 @@ class GraphService:
             if 'color' in node_data:
                 db_node.color = node_data['color']
             
-            # 尝试更新Neo4j中的节点
-            try:
-                with get_neo4j_session() as session:
-                    session.run(
-                        """
-                        MATCH (n:Node {id: $id, graph_id: $graph_id})
-                        SET n.label = $label,
-                            n.type = $type,
-                            n.properties = $properties,
-                            n.x = $x,
-                            n.y = $y,
-                            n.size = $size,
-                            n.color = $color
-                        """,
-                        id=node_id,
-                        graph_id=graph.neo4j_graph_id,
-                        label=db_node.label,
-                        type=db_node.type,
-                        properties=db_node.properties,
-                        x=db_node.x,
-                        y=db_node.y,
-                        size=db_node.size,
-                        color=db_node.color
-                    )
-                logger.info("节点已同时更新到SQLite和Neo4j")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，节点仅更新到SQLite: {e}")
+            node = self._node_to_dict(db_node)
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_NODES, {"rows": [node]})
             
+            self._record_changes(graph, [("node", "update", node_id, node)])
             self.db.commit()
             
             return {
@@ -795,30 +1545,10 @@ class GraphService:
             if 'color' in edge_data:
                 db_edge.color = edge_data['color']
             
-            # 尝试更新Neo4j中的边
-            try:
-                with get_neo4j_session() as session:
-                    session.run(
-                        """
-                        MATCH ()-[r:EDGE {id: $id, graph_id: $graph_id}]->()
-                        SET r.label = $label,
-                            r.type = $type,
-                            r.properties = $properties,
-                            r.weight = $weight,
-                            r.color = $color
-                        """,
-                        id=edge_id,
-                        graph_id=graph.neo4j_graph_id,
-                        label=db_edge.label,
-                        type=db_edge.type,
-                        properties=db_edge.properties,
-                        weight=db_edge.weight,
-                        color=db_edge.color
-                    )
-                logger.info("边已同时更新到SQLite和Neo4j")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，边仅更新到SQLite: {e}")
+            edge = self._edge_to_dict(db_edge)
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_EDGES, {"rows": [edge]})
             
+            self._record_changes(graph, [("edge", "update", edge_id, edge)])
             self.db.commit()
             
             return {
@@ -876,6 +1606,11 @@ class GraphService:
             
             # 如果指定了新ID，创建新节点
             if primary_node_id not in node_ids:
+                if self._existing_node_ids(graph.id, [primary_node_id]):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"节点ID已存在: {primary_node_id}"
+                    )
                 primary_node = Node(
                     graph_id=graph.id,
                     node_id=primary_node_id,
@@ -943,54 +1678,27 @@ class GraphService:
             # 更新节点计数
             graph.node_count -= len(nodes_to_remove)
             
-            # 尝试在Neo4j中执行合并
-            try:
-                with get_neo4j_session() as session:
-                    # 在Neo4j中合并节点
-                    session.run(
-                        """
-                        // 更新所有指向被合并节点的边到主节点
-                        MATCH (n:Node {graph_id: $graph_id})
-                        WHERE n.id IN $nodes_to_remove
-                        MATCH (n)-[r]-(other)
-                        WITH n, r, other
-                        MATCH (primary:Node {id: $primary_node_id, graph_id: $graph_id})
-                        CREATE (primary)-[new_r:EDGE]->(other)
-                        SET new_r = properties(r)
-                        DELETE r, n
-                        """,
-                        graph_id=graph.neo4j_graph_id,
-                        nodes_to_remove=nodes_to_remove,
-                        primary_node_id=primary_node_id
-                    )
-                    
-                    # 更新主节点信息
-                    if primary_node:
-                        session.run(
-                            """
-                            MATCH (n:Node {id: $id, graph_id: $graph_id})
-                            SET n.label = $label,
-                                n.type = $type,
-                                n.properties = $properties,
-                                n.x = $x,
-                                n.y = $y,
-                                n.size = $size,
-                                n.color = $color
-                            """,
-                            id=primary_node_id,
-                            graph_id=graph.neo4j_graph_id,
-                            label=primary_node.label,
-                            type=primary_node.type,
-                            properties=primary_node.properties,
-                            x=primary_node.x,
-                            y=primary_node.y,
-                            size=primary_node.size,
-                            color=primary_node.color
-                        )
-                logger.info("节点已在SQLite和Neo4j中合并")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，节点仅在SQLite中合并: {e}")
             
+            changes = [(
+                "node",
+                "update" if primary_node_id in node_ids else "insert",
+                primary_node_id,
+                self._node_to_dict(primary_node)
+            )]
+            updated_edges = {edge.id: edge for edge in edges_to_update_source + edges_to_update_target}
+            changes.extend(
+                ("edge", "update", edge.edge_id, self._edge_to_dict(edge))
+                for edge in updated_edges.values()
+            )
+            changes.extend(("node", "delete", removed_id, None) for removed_id in nodes_to_remove)
+            
+            # Neo4j: 写入主节点，删除被合并的节点及其关系，再按新端点重建相关边
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_NODES, {"rows": [changes[0][3]]})
+            enqueue(self.db, graph.neo4j_graph_id, DELETE_NODES, {"rows": nodes_to_remove})
+            enqueue(self.db, graph.neo4j_graph_id, UPSERT_EDGES, {
+                "rows": [data for entity, _, _, data in changes if entity == "edge"]
+            })
+            self._record_changes(graph, changes)
             self.db.commit()
             
             return {
@@ -1025,57 +1733,15 @@ class GraphService:
             )
         
         try:
-            # 查找节点
-            db_node = self.db.query(Node).filter(
-                Node.graph_id == graph.id,
-                Node.node_id == node_id
-            ).first()
-            
-            if not db_node:
+            deleted_node_ids, deleted_edge_ids = self._delete_node_set(graph, [node_id])
+            if not deleted_node_ids:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="节点不存在"
                 )
-            
-            # 删除与该节点相关的所有边
-            deleted_edges = self.db.query(Edge).filter(
-                Edge.graph_id == graph.id,
-                (Edge.source_node_id == node_id) | (Edge.target_node_id == node_id)
-            ).all()
-            
-            deleted_edge_count = len(deleted_edges)
-            
-            # 从SQLite删除边
-            self.db.query(Edge).filter(
-                Edge.graph_id == graph.id,
-                (Edge.source_node_id == node_id) | (Edge.target_node_id == node_id)
-            ).delete()
-            
-            # 从SQLite删除节点
-            self.db.delete(db_node)
-            
-            # 更新图谱计数
-            graph.node_count -= 1
-            graph.edge_count -= deleted_edge_count
-            
-            # 尝试从Neo4j删除
-            try:
-                with get_neo4j_session() as session:
-                    # 删除节点及其关联的边
-                    session.run(
-                        """
-                        MATCH (n:Node {id: $id, graph_id: $graph_id})
-                        DETACH DELETE n
-                        """,
-                        id=node_id,
-                        graph_id=graph.neo4j_graph_id
-                    )
-                logger.info("节点已从SQLite和Neo4j删除")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，节点仅从SQLite删除: {e}")
-            
             self.db.commit()
             
+            deleted_edge_count = len(deleted_edge_ids)
             return {
                 "deleted_node_id": node_id,
                 "deleted_edges_count": deleted_edge_count,
@@ -1128,21 +1794,9 @@ class GraphService:
             # 更新边计数
             graph.edge_count -= 1
             
-            # 尝试从Neo4j删除
-            try:
-                with get_neo4j_session() as session:
-                    session.run(
-                        """
-                        MATCH ()-[r:EDGE {id: $id, graph_id: $graph_id}]->()
-                        DELETE r
-                        """,
-                        id=edge_id,
-                        graph_id=graph.neo4j_graph_id
-                    )
-                logger.info("边已从SQLite和Neo4j删除")
-            except Exception as e:
-                logger.warning(f"Neo4j不可用，边仅从SQLite删除: {e}")
+            enqueue(self.db, graph.neo4j_graph_id, DELETE_EDGES, {"rows": [edge_id]})
             
+            self._record_changes(graph, [("edge", "delete", edge_id, None)])
             self.db.commit()
             
             return {
@@ -1159,4 +1813,127 @@ class GraphService:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"删除边失败: {str(e)}"
-            )
\ No newline at end of file
+            )
+    
+    def delete_nodes(self, graph_id: str, node_ids: List[str], user: User) -> dict:
+        """批量删除节点及其相关边，不存在的节点ID被忽略"""
+        if len(node_ids) > settings.GRAPH_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"单次最多删除 {settings.GRAPH_BATCH_MAX_SIZE} 个节点"
+            )
+        
+        graph = self.get_graph_by_id(graph_id, user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        node_ids = list(dict.fromkeys(node_ids))
+        
+        try:
+            deleted_node_ids, deleted_edge_ids = self._delete_node_set(graph, node_ids)
+            self.db.commit()
+            
+            return {
+                "deleted_node_ids": deleted_node_ids,
+                "deleted_nodes_count": len(deleted_node_ids),
+                "deleted_edge_ids": deleted_edge_ids,
+                "deleted_edges_count": len(deleted_edge_ids),
+                "not_found_count": len(node_ids) - len(deleted_node_ids),
+                "message": f"成功删除 {len(deleted_node_ids)} 个节点，同时删除了 {len(deleted_edge_ids)} 条相关边"
+            }
+            
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"批量删除节点失败: {str(e)}"
+            )
+    
+    def _delete_node_set(self, graph: Graph, node_ids: List[str]) -> tuple:
+        """删除一组节点及其相关边（不提交事务）
+        
+        相关边以集合语句（source/target IN 节点ID）级联删除，删除语句通过
+        RETURNING 直接返回被删除的ID，不加载ORM对象；计数按删除行数调整，
+        Neo4j删除进入同步发件箱。返回 (被删除的节点ID, 被删除的边ID)。
+        """
+        nodes = Node.__table__
+        edges = Edge.__table__
+        
+        deleted_edge_ids = []
+        deleted_node_ids = []
+        for start in range(0, len(node_ids), ID_QUERY_BATCH):
+            chunk = node_ids[start:start + ID_QUERY_BATCH]
+            deleted_edge_ids.extend(self.db.execute(
+                delete(edges).where(
+                    edges.c.graph_id == graph.id,
+                    or_(edges.c.source_node_id.in_(chunk), edges.c.target_node_id.in_(chunk))
+                ).returning(edges.c.edge_id)
+            ).scalars())
+            deleted_node_ids.extend(self.db.execute(
+                delete(nodes).where(
+                    nodes.c.graph_id == graph.id,
+                    nodes.c.node_id.in_(chunk)
+                ).returning(nodes.c.node_id)
+            ).scalars())
+        
+        graph.node_count -= len(deleted_node_ids)
+        graph.edge_count -= len(deleted_edge_ids)
+        
+        enqueue(self.db, graph.neo4j_graph_id, DELETE_NODES, {"rows": deleted_node_ids})
+        
+        changes = [("edge", "delete", edge_id, None) for edge_id in deleted_edge_ids]
+        changes.extend(("node", "delete", node_id, None) for node_id in deleted_node_ids)
+        self._record_changes(graph, changes)
+        return deleted_node_ids, deleted_edge_ids
+    
+    def delete_edges(self, graph_id: str, edge_ids: List[str], user: User) -> dict:
+        """批量删除边，不存在的边ID被忽略"""
+        if len(edge_ids) > settings.GRAPH_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"单次最多删除 {settings.GRAPH_BATCH_MAX_SIZE} 条边"
+            )
+        
+        graph = self.get_graph_by_id(graph_id, user)
+        if not graph:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="图谱不存在"
+            )
+        
+        edge_ids = list(dict.fromkeys(edge_ids))
+        edges = Edge.__table__
+        
+        try:
+            deleted_edge_ids = []
+            for start in range(0, len(edge_ids), ID_QUERY_BATCH):
+                deleted_edge_ids.extend(self.db.execute(
+                    delete(edges).where(
+                        edges.c.graph_id == graph.id,
+                        edges.c.edge_id.in_(edge_ids[start:start + ID_QUERY_BATCH])
+                    ).returning(edges.c.edge_id)
+                ).scalars())
+            
+            graph.edge_count -= len(deleted_edge_ids)
+            
+            enqueue(self.db, graph.neo4j_graph_id, DELETE_EDGES, {"rows": deleted_edge_ids})
+            
+            self._record_changes(graph, [("edge", "delete", edge_id, None) for edge_id in deleted_edge_ids])
+            self.db.commit()
+            
+            return {
+                "deleted_edge_ids": deleted_edge_ids,
+                "deleted_edges_count": len(deleted_edge_ids),
+                "not_found_count": len(edge_ids) - len(deleted_edge_ids),
+                "message": f"成功删除 {len(deleted_edge_ids)} 条边"
+            }
+            
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"批量删除边失败: {str(e)}"
+            )
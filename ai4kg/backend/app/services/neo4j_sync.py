@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal, get_neo4j_session, neo4j_enabled
+from app.core.metrics import metrics
+from app.core.shards import route_graph
+from app.core.write_queue import write_queue
+from app.models.models import Graph, Neo4jOutbox, Node, Edge
+from app.services.graph_reader import iter_graph_dicts
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 发件箱操作
+UPSERT_NODES = "upsert_nodes"  # rows: 完整节点数据
+UPDATE_NODES = "update_nodes"  # rows: {"id", "values"}，只更新给出的属性
+DELETE_NODES = "delete_nodes"  # rows: 节点ID，同时删除相关边
+UPSERT_EDGES = "upsert_edges"  # rows: 完整边数据，端点变化时重建关系
+DELETE_EDGES = "delete_edges"  # rows: 边ID
+SYNC_GRAPH = "sync_graph"  # 按SQLite中的当前数据重建整个图谱
+DELETE_GRAPH = "delete_graph"  # 删除整个图谱
+
+# 所有语句都是幂等的：同步任务在写入Neo4j后、删除发件箱记录前中断时会重放
+NODE_UPSERT_QUERY = """
+UNWIND $rows AS node
+MERGE (n:Node {graph_id: $graph_id, id: node.id})
+SET n.label = node.label,
+    n.type = node.type,
+    n.properties = node.properties,
+    n.x = node.x,
+    n.y = node.y,
+    n.size = node.size,
+    n.color = node.color
+"""
+
+NODE_UPDATE_QUERY = """
+UNWIND $rows AS node
+MATCH (n:Node {graph_id: $graph_id, id: node.id})
+SET n += node.values
+"""
+
+NODE_DELETE_QUERY = """
+UNWIND $rows AS id
+MATCH (n:Node {graph_id: $graph_id, id: id})
+DETACH DELETE n
+"""
+
+EDGE_UPSERT_QUERY = """
+UNWIND $rows AS edge
+OPTIONAL MATCH ()-[old:EDGE {graph_id: $graph_id, id: edge.id}]->()
+DELETE old
+WITH DISTINCT edge
+MATCH (source:Node {graph_id: $graph_id, id: edge.source})
+MATCH (target:Node {graph_id: $graph_id, id: edge.target})
+CREATE (source)-[r:EDGE {graph_id: $graph_id, id: edge.id}]->(target)
+SET r.label = edge.label,
+    r.type = edge.type,
+    r.properties = edge.properties,
+    r.weight = edge.weight,
+    r.color = edge.color
+"""
+
+EDGE_DELETE_QUERY = """
+UNWIND $rows AS id
+MATCH ()-[r:EDGE {graph_id: $graph_id, id: id}]->()
+DELETE r
+"""
+
+GRAPH_CLEAR_QUERY = """
+MATCH (n:Node {graph_id: $graph_id})
+WITH n LIMIT $limit
+DETACH DELETE n
+RETURN count(*) AS deleted
+"""
+
+# 连接类错误：Neo4j不可用时不计入重试次数，恢复后按原顺序继续同步
+UNAVAILABLE_ERRORS = (ServiceUnavailable, SessionExpired, TransientError)
+
+def enqueue(db: Session, neo4j_graph_id: str, op: str, payload: dict):
+    """在当前事务中写入一条待同步记录，随数据修改一起提交
+
+    Neo4j未连接时不记录，请求不再为不可用的Neo4j付出任何代价。
+    """
+    if not neo4j_enabled():
+        return
+    if "rows" in payload and not payload["rows"]:
+        return
+    db.execute(insert(Neo4jOutbox).values(graph_id=neo4j_graph_id, op=op, payload=payload, attempts=0))
+
+def _with_encoded_properties(rows: List[dict]) -> List[dict]:
+    """Neo4j属性不支持嵌套对象，properties 以JSON字符串存储"""
+    return [
+        {**row, "properties": json.dumps(row.get("properties") or {}, ensure_ascii=False)}
+        for row in rows
+    ]
+
+# 行操作: (语句, 行转换)
+ROW_OPERATIONS = {
+    UPSERT_NODES: (NODE_UPSERT_QUERY, _with_encoded_properties),
+    UPDATE_NODES: (NODE_UPDATE_QUERY, None),
+    DELETE_NODES: (NODE_DELETE_QUERY, None),
+    UPSERT_EDGES: (EDGE_UPSERT_QUERY, _with_encoded_properties),
+    DELETE_EDGES: (EDGE_DELETE_QUERY, None),
+}
+
+def write_rows(session, query: str, rows: list, **params):
+    """以 UNWIND $rows 分批执行写入语句
+
+    每批 NEO4J_BATCH_SIZE 行，每 NEO4J_TRANSACTION_SIZE 行提交一次事务。
+    """
+    batch_size = max(1, settings.NEO4J_BATCH_SIZE)
+    transaction_size = max(batch_size, settings.NEO4J_TRANSACTION_SIZE)
+    for tx_start in range(0, len(rows), transaction_size):
+        tx_rows = rows[tx_start:tx_start + transaction_size]
+        with session.begin_transaction() as tx:
+            for start in range(0, len(tx_rows), batch_size):
+                tx.run(query, rows=tx_rows[start:start + batch_size], **params).consume()
+            tx.commit()
+
+def clear_graph(session, neo4j_graph_id: str):
+    """分事务删除图谱的所有节点和边"""
+    while True:
+        with session.begin_transaction() as tx:
+            deleted = tx.run(
+                GRAPH_CLEAR_QUERY,
+                graph_id=neo4j_graph_id,
+                limit=max(1, settings.NEO4J_TRANSACTION_SIZE)
+            ).single()["deleted"]
+            tx.commit()
+        if not deleted:
+            return
+
+def sync_graph(db: Session, session, neo4j_graph_id: str, graph_id: str):
+    """清空Neo4j中的图谱后按SQLite中的当前数据重新写入"""
+    clear_graph(session, neo4j_graph_id)
+    route_graph(db, db.get(Graph, graph_id))
+    for model, query in ((Node, NODE_UPSERT_QUERY), (Edge, EDGE_UPSERT_QUERY)):
+        rows = []
+        for row in iter_graph_dicts(db, model, graph_id):
+            rows.append(row)
+            if len(rows) >= settings.NEO4J_TRANSACTION_SIZE:
+                write_rows(session, query, _with_encoded_properties(rows), graph_id=neo4j_graph_id)
+                rows = []
+        write_rows(session, query, _with_encoded_properties(rows), graph_id=neo4j_graph_id)
+
+def _unique_rows(op: str, rows: list) -> list:
+    """合并后的行按ID去重，同一ID保留最后一次写入
+
+    同一次 UNWIND 中重复的边ID会各自创建一条关系；部分更新按顺序合并为一行。
+    """
+    if op not in (UPSERT_NODES, UPDATE_NODES, UPSERT_EDGES):
+        return rows
+    unique = {}
+    for row in rows:
+        previous = unique.pop(row["id"], None)
+        if op == UPDATE_NODES and previous is not None:
+            row = {"id": row["id"], "values": {**previous["values"], **row["values"]}}
+        unique[row["id"]] = row
+    return list(unique.values())
+
+def _group_entries(entries: List[Neo4jOutbox]) -> Iterator[List[Neo4jOutbox]]:
+    """将同一图谱、同一行操作的相邻记录合并为一批，保持原有顺序"""
+    group = []
+    for entry in entries:
+        if group and (
+            entry.op not in ROW_OPERATIONS
+            or (entry.graph_id, entry.op) != (group[0].graph_id, group[0].op)
+        ):
+            yield group
+            group = []
+        group.append(entry)
+        if entry.op not in ROW_OPERATIONS:
+            yield group
+            group = []
+    if group:
+        yield group
+
+def _delete_entries(db: Session, ids: List[int]):
+    db.execute(delete(Neo4jOutbox).where(Neo4jOutbox.id.in_(ids)))
+    db.commit()
+
+def _record_attempt(db: Session, entry_id: int, error: str) -> int:
+    entry = db.get(Neo4jOutbox, entry_id)
+    entry.attempts += 1
+    entry.last_error = error
+    db.commit()
+    return entry.attempts
+
+def _write_outbox(db: Session, func, *args):
+    """修改发件箱：写入队列运行时交给写入线程与请求的写操作一起提交，否则在同步任务的会话中提交"""
+    if write_queue.running:
+        return write_queue.call(func, *args)
+    return func(db, *args)
+
+class _EntryFailed(Exception):
+    """单条记录写入Neo4j失败（语句或数据错误）"""
+
+    def __init__(self, entry: Neo4jOutbox, error: Exception):
+        super().__init__(str(error))
+        self.entry = entry
+        self.error = error
+
+class Neo4jSyncWorker:
+    """将发件箱中的写操作按 id 顺序批量同步到Neo4j的后台任务
+
+    - 相邻的同类行操作合并为一次 UNWIND 写入
+    - 某条记录失败时停止本轮同步并按指数退避重试，后续记录不会越过它执行；
+      写入错误超过 NEO4J_SYNC_MAX_ATTEMPTS 次后跳过该记录
+    - Neo4j不可用时只退避，不计入重试次数
+    - 待同步数量和最早记录的等待时间输出到 /metrics
+    - 发件箱的删除和失败次数经写入队列提交，不在同步线程中获取主库的写锁
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0  # 连续失败轮数，用于计算退避间隔
+
+    def start(self):
+        """在当前事件循环中启动同步任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Neo4j同步任务已启动")
+
+    async def stop(self):
+        """停止同步任务，未同步的记录保留在发件箱中"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                pending = await asyncio.to_thread(self._drain)
+            except Exception as e:
+                logger.error(f"Neo4j同步任务出错: {e}")
+                self._failures += 1
+                pending = 0
+
+            if self._failures:
+                delay = min(settings.NEO4J_SYNC_MAX_BACKOFF, settings.NEO4J_SYNC_INTERVAL * 2 ** self._failures)
+            elif pending:
+                delay = 0
+            else:
+                delay = settings.NEO4J_SYNC_INTERVAL
+            await asyncio.sleep(delay)
+
+    def _drain(self) -> int:
+        with SessionLocal() as db:
+            self.drain_once(db)
+            return metrics.get("neo4j_sync.pending")
+
+    def drain_once(self, db: Session) -> int:
+        """同步一批记录，返回成功写入的记录数"""
+        if not neo4j_enabled():
+            return 0
+
+        entries = db.execute(
+            select(Neo4jOutbox)
+            .where(Neo4jOutbox.attempts < settings.NEO4J_SYNC_MAX_ATTEMPTS)
+            .order_by(Neo4jOutbox.id)
+            .limit(settings.NEO4J_SYNC_BATCH_SIZE)
+        ).scalars().all()
+
+        applied = 0
+        try:
+            if entries:
+                with get_neo4j_session() as session:
+                    for group in _group_entries(entries):
+                        applied += self._apply_group(db, session, group)
+            self._failures = 0
+        except UNAVAILABLE_ERRORS as e:
+            self._failures += 1
+            metrics.incr("neo4j_sync.unavailable")
+            logger.warning(f"Neo4j暂不可用，稍后重试同步: {e}")
+        except _EntryFailed as e:
+            self._failures += 1
+            self._record_failure(db, e.entry, e.error)
+        finally:
+            self._update_lag(db)
+
+        return applied
+
+    def _apply_group(self, db: Session, session, group: List[Neo4jOutbox]) -> int:
+        try:
+            self._apply(db, session, group)
+        except UNAVAILABLE_ERRORS:
+            raise
+        except Exception as e:
+            if len(group) == 1:
+                raise _EntryFailed(group[0], e)
+            # 合并后的批次失败时逐条执行，定位出错的记录（语句幂等，可安全重放）
+            applied = 0
+            for entry in group:
+                applied += self._apply_group(db, session, [entry])
+            return applied
+
+        _write_outbox(db, _delete_entries, [entry.id for entry in group])
+        metrics.incr("neo4j_sync.applied", len(group))
+        return len(group)
+
+    def _apply(self, db: Session, session, group: List[Neo4jOutbox]):
+        op = group[0].op
+        neo4j_graph_id = group[0].graph_id
+
+        if op in ROW_OPERATIONS:
+            query, convert = ROW_OPERATIONS[op]
+            rows = _unique_rows(op, [row for entry in group for row in entry.payload["rows"]])
+            write_rows(session, query, convert(rows) if convert else rows, graph_id=neo4j_graph_id)
+        elif op == SYNC_GRAPH:
+            sync_graph(db, session, neo4j_graph_id, group[0].payload["graph_id"])
+        elif op == DELETE_GRAPH:
+            clear_graph(session, neo4j_graph_id)
+        else:
+            raise ValueError(f"未知的同步操作: {op}")
+
+    def _record_failure(self, db: Session, entry: Neo4jOutbox, error: Exception):
+        attempts = _write_outbox(db, _record_attempt, entry.id, str(error)[:2000])
+        metrics.incr("neo4j_sync.errors")
+
+        if attempts >= settings.NEO4J_SYNC_MAX_ATTEMPTS:
+            metrics.incr("neo4j_sync.dead_letters")
+            logger.error(f"同步记录 {entry.id}（{entry.op}）失败 {attempts} 次，已跳过: {error}")
+        else:
+            logger.warning(f"同步记录 {entry.id}（{entry.op}）失败，将重试: {error}")
+
+    def _update_lag(self, db: Session):
+        """更新待同步数量和最早记录的等待时间（秒）"""
+        pending, oldest = db.execute(
+            select(func.count(), func.min(Neo4jOutbox.created_at))
+            .where(Neo4jOutbox.attempts < settings.NEO4J_SYNC_MAX_ATTEMPTS)
+        ).one()
+
+        lag = 0.0
+        if oldest is not None:
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            now = datetime.now(timezone.utc)
+            if oldest.tzinfo is None:
+                now = now.replace(tzinfo=None)
+            lag = max(0.0, (now - oldest).total_seconds())
+
+        metrics.set_gauge("neo4j_sync.pending", pending)
+        metrics.set_gauge("neo4j_sync.lag_seconds", round(lag, 3))
+
+neo4j_sync_worker = Neo4jSyncWorker()
@@ -0,0 +1,184 @@
+from fastapi import HTTPException, status
+from sqlalchemy import literal_column, text
+from sqlalchemy.orm import Session
+from typing import Dict, List
+import hashlib
+import logging
+
+from app.core.config import get_settings
+from app.core.shards import route_graph
+from app.models.models import Graph, Node, Edge, PropertyIndex
+from app.services.query_filters import graph_scope_condition, property_value_expression
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+ENTITY_MODELS = {"node": Node, "edge": Edge}
+
+class PropertyIndexService:
+    """图谱属性索引服务
+
+    图谱为节点/边 properties 中常用于过滤的键声明值类型后，在节点或边表上建立
+    (属性值表达式, graph_id, id) 表达式索引（SQLite 为 json_extract，PostgreSQL 为按JSON
+    类型判断后的 ->> 及类型转换），索引以 WHERE graph_id = '<图谱ID>' 限定为该图谱的部分索引
+    （graph_id 列使等值匹配的行在索引中按 id 排序，SQLite 不再额外排序）。
+    之后该键上同类型值的等值和范围过滤编译为相同表达式，按索引查找而不是扫描整个图谱；
+    等值匹配的行在索引中已按 id 排序，分页不需要额外排序。
+
+    其他图谱的行不进入索引，其中的值不影响建立索引和写入；但主库中每个部分索引都会在
+    每次写入时检查条件，因此主库中的索引总数限制为 PROPERTY_INDEX_MAX_TOTAL。
+    分片图谱的索引建在各自的分片文件中，不计入该限制。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def list_indexes(self, graph: Graph) -> List[dict]:
+        """列出图谱声明的属性索引"""
+        indexes = self.db.query(PropertyIndex).filter(
+            PropertyIndex.graph_id == graph.id
+        ).order_by(PropertyIndex.id).all()
+        return [self._to_dict(index) for index in indexes]
+
+    def declared(self, graph: Graph, entity: str) -> Dict[str, str]:
+        """图谱已索引的属性键 {属性键: 类型}，用于编译过滤条件"""
+        rows = self.db.query(PropertyIndex.key, PropertyIndex.value_type).filter(
+            PropertyIndex.graph_id == graph.id,
+            PropertyIndex.entity == entity
+        ).all()
+        return {key: value_type for key, value_type in rows}
+
+    def create_index(self, graph: Graph, entity: str, key: str, value_type: str) -> dict:
+        """声明属性索引并建立表达式索引（已有数据量大时建立索引需要一定时间）"""
+        # 写入会话中尚未选择图谱的存储
+        route_graph(self.db, graph)
+        existing = self.db.query(PropertyIndex).filter(
+            PropertyIndex.graph_id == graph.id,
+            PropertyIndex.entity == entity,
+            PropertyIndex.key == key
+        ).first()
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"属性索引已存在: {key}（{existing.value_type}）"
+            )
+        count = self.db.query(PropertyIndex).filter(PropertyIndex.graph_id == graph.id).count()
+        if count >= settings.PROPERTY_INDEX_MAX_PER_GRAPH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"每个图谱最多声明 {settings.PROPERTY_INDEX_MAX_PER_GRAPH} 个属性索引"
+            )
+        if not graph.shard:
+            total = self.db.query(PropertyIndex).join(Graph, Graph.id == PropertyIndex.graph_id).filter(
+                Graph.shard.is_(None)
+            ).count()
+            if total >= settings.PROPERTY_INDEX_MAX_TOTAL:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"属性索引总数已达上限 {settings.PROPERTY_INDEX_MAX_TOTAL}"
+                )
+
+        try:
+            model = ENTITY_MODELS[entity]
+            index = PropertyIndex(
+                graph_id=graph.id,
+                entity=entity,
+                key=key,
+                value_type=value_type,
+                index_name=self._index_name(model, graph.id, key, value_type)
+            )
+            self.db.add(index)
+            self.db.flush()
+            self._create_db_index(model, graph.id, key, value_type, index.index_name)
+            self.db.commit()
+            self.db.refresh(index)
+            return self._to_dict(index)
+
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"创建属性索引失败: {str(e)}"
+            )
+
+    def delete_index(self, graph: Graph, index_id: int):
+        """取消声明，没有其他图谱使用时删除数据库中的索引"""
+        route_graph(self.db, graph)
+        index = self.db.query(PropertyIndex).filter(
+            PropertyIndex.graph_id == graph.id,
+            PropertyIndex.id == index_id
+        ).first()
+        if not index:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="属性索引不存在"
+            )
+
+        try:
+            self.db.delete(index)
+            self.db.flush()
+            self._drop_unused_db_index(graph, index)
+            self.db.commit()
+
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"删除属性索引失败: {str(e)}"
+            )
+
+    def remove_graph(self, graph: Graph):
+        """删除图谱的所有声明（在删除图谱的事务中调用，不提交）"""
+        indexes = self.db.query(PropertyIndex).filter(PropertyIndex.graph_id == graph.id).all()
+        for index in indexes:
+            self.db.delete(index)
+        self.db.flush()
+        if not graph.shard:
+            # 分片文件随图谱删除
+            for index in indexes:
+                self._drop_unused_db_index(graph, index)
+
+    @staticmethod
+    def _index_name(model, graph_id: str, key: str, value_type: str) -> str:
+        digest = hashlib.sha1(f"{graph_id}\0{key}\0{value_type}".encode("utf-8")).hexdigest()[:16]
+        return f"ix_{model.__tablename__}_prop_{digest}"
+
+    def _connection(self, model):
+        # 节点/边所在的库（分片图谱为分片文件）
+        return self.db.connection(bind_arguments={"mapper": model})
+
+    def _create_db_index(self, model, graph_id: str, key: str, value_type: str, name: str):
+        connection = self._connection(model)
+        compile_kwargs = {"literal_binds": True}
+        expression = property_value_expression(
+            literal_column("properties"), key, value_type, connection.dialect.name
+        ).compile(dialect=connection.dialect, compile_kwargs=compile_kwargs)
+        scope = graph_scope_condition(
+            literal_column("graph_id"), graph_id
+        ).compile(dialect=connection.dialect, compile_kwargs=compile_kwargs)
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {model.__tablename__} (({expression}), graph_id, id) WHERE {scope}"
+        ))
+        logger.info(f"已建立属性索引 {name}: {model.__tablename__}.{key} ({value_type})")
+
+    def _drop_unused_db_index(self, graph: Graph, index: PropertyIndex):
+        # 早期版本的索引不限定图谱，同名索引由声明它的图谱共用
+        if not graph.shard:
+            in_use = self.db.query(PropertyIndex.id).join(Graph, Graph.id == PropertyIndex.graph_id).filter(
+                PropertyIndex.index_name == index.index_name,
+                Graph.shard.is_(None)
+            ).first()
+            if in_use:
+                return
+        self._connection(ENTITY_MODELS[index.entity]).execute(text(f"DROP INDEX IF EXISTS {index.index_name}"))
+        logger.info(f"已删除属性索引 {index.index_name}")
+
+    @staticmethod
+    def _to_dict(index: PropertyIndex) -> dict:
+        return {
+            "id": index.id,
+            "entity": index.entity,
+            "key": index.key,
+            "type": index.value_type,
+            "created_at": index.created_at
+        }
@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Boolean, Float, Text, case, cast, exists, func, literal_column, select, or_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+# 属性过滤条件格式: key=value, key!=value, key>=value, key<=value, key>value, key<value
+PROPERTY_FILTER_PATTERN = re.compile(r"^(?P<key>[^=!<>]+?)(?P<op>>=|<=|!=|=|>|<)(?P<value>.*)$")
+
+
+def parse_property_filter(raw: str) -> Tuple[str, str, Any]:
+    """解析属性过滤条件，值按JSON解析（数字、布尔），否则视为字符串"""
+    match = PROPERTY_FILTER_PATTERN.match(raw or "")
+    if not match:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"属性过滤条件格式错误: {raw}"
+        )
+
+    key = match.group("key").strip()
+    raw_value = match.group("value")
+    try:
+        value = json.loads(raw_value)
+        if not isinstance(value, (str, int, float, bool)):
+            value = raw_value
+    except ValueError:
+        value = raw_value
+
+    return key, match.group("op"), value
+
+
+def property_value_type(value: Any) -> str:
+    """过滤值的类型: string / number / boolean"""
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    return "string"
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def property_value_expression(column, key: str, value_type: str, dialect: str):
+    """按类型读取属性值的表达式，属性键以字面量写入SQL
+
+    属性索引以同一表达式建立，过滤条件使用它时可以走索引查找
+    （参数化的JSON路径无法匹配表达式索引）。
+    """
+    if dialect == "postgresql":
+        key_literal = literal_column(_sql_string(key))
+        expr = column.op("->>", return_type=Text)(key_literal)
+        if value_type == "number":
+            expr = cast(expr, Float)
+        elif value_type == "boolean":
+            expr = cast(expr, Boolean)
+        # 只转换JSON类型相符的值，其他值为 NULL，建立索引和写入不会因无法转换的值失败
+        return case((func.jsonb_typeof(column.op("->")(key_literal)) == value_type, expr))
+    # SQLite json_extract 按JSON类型返回 TEXT / INTEGER / REAL，true/false 为 1/0
+    return func.json_extract(column, literal_column(_sql_string(f'$."{key}"')))
+
+
+def graph_scope_condition(column, graph_id: str):
+    """限定图谱的条件，图谱ID以字面量写入SQL
+
+    属性索引是只包含一个图谱的部分索引，查询条件与索引的 WHERE 子句字面相同时
+    才能使用（绑定参数无法证明满足部分索引的条件）。
+    """
+    return column == literal_column(_sql_string(graph_id))
+
+
+def property_condition(column, key: str, op: str, value: Any, dialect: str = "sqlite", indexed_type: Optional[str] = None):
+    """将属性过滤条件编译为SQL表达式
+
+    属性键已建立属性索引（indexed_type 为声明的类型）且过滤值类型相同时，按类型
+    比较索引表达式，只匹配该类型的值。
+    PostgreSQL 下字符串和布尔值的等值条件编译为 JSONB 包含查询（@>），可使用
+    properties 列的 GIN 索引；数字仍按数值比较，与字符串形式的数字也能匹配。
+    """
+    if isinstance(value, bool) and op not in ("=", "!="):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"布尔属性只支持 = 和 != 比较: {key}"
+        )
+
+    if indexed_type is not None and indexed_type == property_value_type(value):
+        expr = property_value_expression(column, key, indexed_type, dialect)
+    elif dialect == "postgresql" and op == "=" and isinstance(value, (bool, str)):
+        return type_coerce(column, JSONB).contains({key: value})
+    elif isinstance(value, bool):
+        expr = column[key].as_boolean()
+    elif isinstance(value, (int, float)):
+        expr = column[key].as_float()
+    else:
+        expr = column[key].as_string()
+
+    if op == "=":
+        return expr == value
+    if op == "!=":
+        return expr != value
+    if op == ">=":
+        return expr >= value
+    if op == "<=":
+        return expr <= value
+    if op == ">":
+        return expr > value
+    return expr < value
+
+
+def property_conditions(
+    db: Session,
+    column,
+    raw_filters: Optional[List[str]],
+    indexed: Optional[Dict[str, str]] = None
+) -> list:
+    """批量编译属性过滤条件，indexed 为已建立属性索引的 {属性键: 类型}"""
+    dialect = db.get_bind().dialect.name
+    indexed = indexed or {}
+    conditions = []
+    for raw in raw_filters or []:
+        key, op, value = parse_property_filter(raw)
+        conditions.append(property_condition(column, key, op, value, dialect=dialect, indexed_type=indexed.get(key)))
+    return conditions
+
+
+def json_values_contain(db: Session, column, needle: str):
+    """判断JSON对象中是否有值包含指定关键词（不区分大小写）"""
+    needle = needle.lower()
+    if db.get_bind().dialect.name == "sqlite":
+        values = func.json_each(column).table_valued("value")
+        return exists(
+            select(1).select_from(values).where(
+                func.lower(values.c.value).contains(needle, autoescape=True)
+            )
+        )
+    if db.get_bind().dialect.name == "postgresql":
+        values = func.jsonb_each_text(type_coerce(column, JSONB)).table_valued("value")
+        return exists(
+            select(1).select_from(values).where(
+                func.lower(values.c.value).contains(needle, autoescape=True)
+            )
+        )
+    # 其他数据库退化为对JSON文本的匹配
+    return func.lower(cast(column, Text)).contains(needle, autoescape=True)
+
+
+def text_search_condition(db: Session, needle: str, label_column, type_column, properties_column):
+    """与原Python过滤逻辑一致的搜索条件：匹配标签、类型或任意属性值"""
+    needle = needle.lower()
+    return or_(
+        func.lower(label_column).contains(needle, autoescape=True),
+        func.lower(type_column).contains(needle, autoescape=True),
+        json_values_contain(db, properties_column, needle)
+    )
+
+
+def parse_fields(raw: Optional[str], allowed: Iterable[str], required: Iterable[str] = ("id",)) -> Optional[List[str]]:
+    """解析逗号分隔的字段列表，未指定时返回None（返回全部字段）
+
+    必需字段总是包含在结果中，未知字段返回400。
+    """
+    if not raw:
+        return None
+
+    requested = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的字段: {', '.join(unknown)}"
+        )
+
+    fields = list(required)
+    fields.extend(field for field in requested if field not in fields)
+    return fields
+
+
+def encode_cursor(value: str) -> str:
+    """将排序键编码为不透明的分页游标"""
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """解析分页游标"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
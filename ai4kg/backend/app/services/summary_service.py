@@ -0,0 +1,265 @@
+from sqlalchemy import Integer, and_, case, cast, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from typing import Dict, Optional
+import logging
+
+from app.core.concurrency import run_db
+from app.core.config import get_settings
+from app.core.shards import route_graph
+from app.core.write_queue import write_db
+from app.models.models import Graph, GraphSummary, Node, Edge
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 正在后台重新生成概要的图谱，同一图谱同时只有一个任务
+_rebuilding: set = set()
+
+class SummaryService:
+    """图谱多分辨率概要（LOD）服务
+
+    将带坐标的节点按空间网格聚合：第 L 级把坐标范围划分为 2^L x 2^L 个网格，
+    每个网格对应一个聚类（节点数、平均位置、类型分布），跨网格的边聚合为
+    聚类之间的边。各级概要存储在 graph_summaries 表中，并记录生成时图谱的
+    data_version。读取只查询已存储的概要，图谱数据变更后照常返回旧版本
+    （stale 为 true），尚未生成过时返回空概要，由后台任务 rebuild_summary 重新生成，
+    读取请求既不计算也不写数据库。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_summary(self, graph: Graph, level: int) -> tuple[dict, bool]:
+        """获取指定缩放级别的概要（只读），返回 (概要, 是否需要在后台重新生成)
+
+        已存储的概要落后于图谱数据时直接返回；尚未生成过概要时返回空概要（version 为 None）。
+        """
+        max_level = settings.LOD_MAX_LEVEL
+        level = max(0, min(level, max_level))
+
+        summary = self.db.query(GraphSummary).filter(
+            GraphSummary.graph_id == graph.id,
+            GraphSummary.level == level
+        ).first()
+
+        if summary is None:
+            return {
+                "level": level,
+                "max_level": max_level,
+                "version": None,
+                "stale": True,
+                "bounds": None,
+                "clusters": [],
+                "edges": [],
+                "unpositioned": 0
+            }, True
+
+        return {
+            "level": summary.level,
+            "max_level": max_level,
+            "version": summary.version,
+            "stale": summary.version != graph.data_version,
+            "bounds": summary.bounds,
+            "clusters": summary.clusters or [],
+            "edges": summary.edges or [],
+            "unpositioned": summary.unpositioned or 0
+        }, summary.version != graph.data_version
+
+    def _stored_version(self, graph_id: str) -> Optional[int]:
+        return self.db.query(GraphSummary.version).filter(
+            GraphSummary.graph_id == graph_id,
+            GraphSummary.level == 0
+        ).scalar()
+
+    def compute(self, graph_id: str) -> Optional[Dict[int, GraphSummary]]:
+        """计算图谱所有级别的概要（只读），已是最新版本或图谱已删除时返回None"""
+        graph = self.db.get(Graph, graph_id)
+        if graph is None or self._stored_version(graph.id) == graph.data_version:
+            return None
+        route_graph(self.db, graph)
+        return self.build(graph)
+
+    def store(self, graph_id: str, summaries: Dict[int, GraphSummary]) -> Optional[int]:
+        """用 compute 的结果替换已存储的概要，返回存储的数据版本
+
+        已存储的版本不比计算结果旧时（并发任务已写入）保留原概要；图谱已删除时返回None。
+        """
+        if self.db.get(Graph, graph_id) is None:
+            return None
+        version = summaries[0].version
+        stored = self._stored_version(graph_id)
+        if stored is not None and stored >= version:
+            return stored
+
+        try:
+            self.db.query(GraphSummary).filter(GraphSummary.graph_id == graph_id).delete()
+            self.db.add_all(summaries.values())
+            self.db.commit()
+            logger.info(f"已重新生成图谱概要: {graph_id} (版本 {version})")
+        except IntegrityError:
+            # 并发任务已写入同一图谱的概要
+            self.db.rollback()
+        return version
+
+    def build(self, graph: Graph) -> Dict[int, GraphSummary]:
+        """计算图谱所有级别的概要（不写入数据库）
+
+        在数据库中按最细网格聚合节点和边（不加载单个节点），较粗级别由
+        最细级别的网格合并得到。
+        """
+        version = graph.data_version
+        max_level = settings.LOD_MAX_LEVEL
+
+        positioned, unpositioned, bounds = self._bounds(graph.id)
+        if positioned:
+            node_cells, edge_cells = self._aggregate_finest(graph.id, bounds, max_level)
+        else:
+            node_cells, edge_cells = [], []
+
+        summaries = {}
+        for level in range(max_level + 1):
+            clusters, edges = self._merge_level(node_cells, edge_cells, max_level, level)
+            summaries[level] = GraphSummary(
+                graph_id=graph.id,
+                level=level,
+                version=version,
+                bounds=bounds,
+                clusters=clusters,
+                edges=edges,
+                unpositioned=unpositioned
+            )
+        return summaries
+
+    def _bounds(self, graph_id: str) -> tuple[int, int, Optional[dict]]:
+        """统计带坐标节点数、无坐标节点数和坐标范围"""
+        positioned_filter = and_(Node.x.isnot(None), Node.y.isnot(None))
+        total, positioned, min_x, max_x, min_y, max_y = self.db.query(
+            func.count(Node.id),
+            func.count(case((positioned_filter, 1))),
+            func.min(case((positioned_filter, Node.x))),
+            func.max(case((positioned_filter, Node.x))),
+            func.min(case((positioned_filter, Node.y))),
+            func.max(case((positioned_filter, Node.y)))
+        ).filter(Node.graph_id == graph_id).one()
+
+        if not positioned:
+            return 0, total, None
+
+        bounds = {"min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y}
+        return positioned, total - positioned, bounds
+
+    def _cell_index(self, coordinate, origin: float, extent: float, cells: int):
+        """计算坐标所在的网格编号，最大值落在最后一个网格内"""
+        width = extent / cells if extent > 0 else 1.0
+        offset = (coordinate - origin) / width
+        if self.db.get_bind().dialect.name == "sqlite":
+            # 坐标不小于 origin，CAST 截断即向下取整
+            index = cast(offset, Integer)
+        else:
+            index = cast(func.floor(offset), Integer)
+        return case((index >= cells, cells - 1), else_=index)
+
+    def _aggregate_finest(self, graph_id: str, bounds: dict, max_level: int) -> tuple[list, list]:
+        """按最细网格聚合节点和边"""
+        cells = 2 ** max_level
+        extent_x = bounds["max_x"] - bounds["min_x"]
+        extent_y = bounds["max_y"] - bounds["min_y"]
+
+        def cell_of(model):
+            return (
+                self._cell_index(model.x, bounds["min_x"], extent_x, cells),
+                self._cell_index(model.y, bounds["min_y"], extent_y, cells)
+            )
+
+        cx, cy = cell_of(Node)
+        node_cells = self.db.query(
+            cx, cy, Node.type, func.count(Node.id), func.sum(Node.x), func.sum(Node.y)
+        ).filter(
+            Node.graph_id == graph_id,
+            Node.x.isnot(None),
+            Node.y.isnot(None)
+        ).group_by(cx, cy, Node.type).all()
+
+        source = aliased(Node)
+        target = aliased(Node)
+        scx, scy = cell_of(source)
+        tcx, tcy = cell_of(target)
+        edge_cells = self.db.query(
+            scx, scy, tcx, tcy, func.count(Edge.id), func.sum(Edge.weight)
+        ).select_from(Edge).join(
+            source, and_(source.graph_id == Edge.graph_id, source.node_id == Edge.source_node_id)
+        ).join(
+            target, and_(target.graph_id == Edge.graph_id, target.node_id == Edge.target_node_id)
+        ).filter(
+            Edge.graph_id == graph_id,
+            source.x.isnot(None), source.y.isnot(None),
+            target.x.isnot(None), target.y.isnot(None)
+        ).group_by(scx, scy, tcx, tcy).all()
+
+        return node_cells, edge_cells
+
+    @staticmethod
+    def _merge_level(node_cells: list, edge_cells: list, max_level: int, level: int) -> tuple[list, list]:
+        """将最细网格合并为指定级别的聚类和聚合边"""
+        shift = max_level - level
+
+        clusters = {}
+        for cx, cy, node_type, count, sum_x, sum_y in node_cells:
+            key = (cx >> shift, cy >> shift)
+            cluster = clusters.setdefault(key, {
+                "id": f"{level}:{key[0]}:{key[1]}",
+                "cell": list(key),
+                "count": 0,
+                "sum_x": 0.0,
+                "sum_y": 0.0,
+                "types": {},
+                "internal_edges": 0
+            })
+            cluster["count"] += count
+            cluster["sum_x"] += sum_x
+            cluster["sum_y"] += sum_y
+            cluster["types"][node_type] = cluster["types"].get(node_type, 0) + count
+
+        edges = {}
+        for scx, scy, tcx, tcy, count, weight in edge_cells:
+            source_key = (scx >> shift, scy >> shift)
+            target_key = (tcx >> shift, tcy >> shift)
+            if source_key == target_key:
+                clusters[source_key]["internal_edges"] += count
+                continue
+            edge = edges.setdefault((source_key, target_key), {
+                "source": clusters[source_key]["id"],
+                "target": clusters[target_key]["id"],
+                "count": 0,
+                "weight": 0.0
+            })
+            edge["count"] += count
+            edge["weight"] += weight or 0.0
+
+        cluster_list = []
+        for cluster in clusters.values():
+            cluster["x"] = cluster.pop("sum_x") / cluster["count"]
+            cluster["y"] = cluster.pop("sum_y") / cluster["count"]
+            cluster_list.append(cluster)
+
+        return cluster_list, list(edges.values())
+
+async def rebuild_summary(db: Session, graph_id: str):
+    """后台任务：重新生成图谱概要
+
+    在数据库线程池中聚合节点和边，写入队列只负责替换存储的概要，聚合期间不占用写入线程。
+    同一图谱已有任务在运行时直接返回；失败只记录日志，下一次读取会再次调度。
+    """
+    if graph_id in _rebuilding:
+        return
+    _rebuilding.add(graph_id)
+    try:
+        service = SummaryService(db)
+        summaries = await run_db(service.compute, graph_id)
+        if summaries is not None:
+            await write_db(service.store, graph_id, summaries)
+    except Exception as e:
+        logger.error(f"重新生成图谱概要失败: {graph_id}: {e}")
+    finally:
+        _rebuilding.discard(graph_id)
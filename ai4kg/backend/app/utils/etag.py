@@ -0,0 +1,50 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+from app.core.metrics import metrics
+
+def graph_etag(graph, *variants) -> str:
+    """根据图谱ID、数据版本和表示形式（查询参数、格式等）生成弱ETag
+
+    图谱的任何变更都会递增 data_version，因此只需读取 graphs 表即可判断
+    客户端缓存是否仍然有效。
+    """
+    digest = hashlib.sha1(repr(variants).encode("utf-8")).hexdigest()[:12]
+    return f'W/"{graph.id}-{graph.data_version}-{digest}"'
+
+def request_variant(request: Request) -> tuple:
+    """影响响应内容的请求部分：排序后的查询参数和Accept头"""
+    return (
+        tuple(sorted(request.query_params.multi_items())),
+        request.headers.get("accept", "")
+    )
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """按弱比较规则判断 If-None-Match 是否命中"""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in header.split(","))
+
+def etag_headers(etag: str) -> dict:
+    """附加到响应上的缓存相关头"""
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept, Authorization"
+    }
+
+def not_modified(etag: str) -> Response:
+    """返回304响应"""
+    metrics.incr("http.not_modified")
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
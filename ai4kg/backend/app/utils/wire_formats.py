@@ -0,0 +1,178 @@
+from datetime import date, datetime
+from typing import Any, List, Optional
+import json
+import uuid
+
+from fastapi import HTTPException, Request, Response, status
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # 可选依赖
+    pa = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# 兼容的别名
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+}
+
+BINARY_MEDIA_TYPES = {
+    MSGPACK_MEDIA_TYPE: lambda: msgpack is not None,
+    ARROW_MEDIA_TYPE: lambda: pa is not None,
+}
+
+def _parse_accept(header: str) -> List[tuple]:
+    """解析Accept头，按q值降序返回 (媒体类型, q)"""
+    entries = []
+    for index, part in enumerate(header.split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        media_type = fields[0].lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        entries.append((media_type, q, index))
+    entries.sort(key=lambda entry: (-entry[1], entry[2]))
+    return [(MEDIA_TYPE_ALIASES.get(media_type, media_type), q) for media_type, q, _ in entries]
+
+def negotiate(request: Request) -> Optional[str]:
+    """根据Accept头选择二进制格式，返回None表示使用JSON
+
+    客户端只接受未安装依赖的二进制格式时返回406。
+    """
+    accept = request.headers.get("accept", "")
+    if not accept:
+        return None
+
+    unavailable = []
+    for media_type, q in _parse_accept(accept):
+        if q <= 0:
+            continue
+        if media_type in BINARY_MEDIA_TYPES:
+            if BINARY_MEDIA_TYPES[media_type]():
+                return media_type
+            unavailable.append(media_type)
+            continue
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return None
+
+    if unavailable:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"服务器不支持响应格式: {', '.join(unavailable)}"
+        )
+    return None
+
+def _msgpack_default(value: Any):
+    """msgpack无法直接编码的类型"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"无法编码的类型: {type(value).__name__}")
+
+def msgpack_response(success: bool, message: str, data: Any, headers: Optional[dict] = None) -> Response:
+    """以MessagePack编码与DataResponse相同结构的响应"""
+    payload = {"success": success, "message": message, "data": data}
+    content = msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    return Response(content=content, media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+
+# Arrow列定义: (字段名, 类型)；type/color为字典编码，properties以JSON字符串存储
+def _dictionary_string():
+    return pa.dictionary(pa.int32(), pa.string())
+
+def _node_columns():
+    return [
+        ("id", pa.string()),
+        ("label", pa.string()),
+        ("type", _dictionary_string()),
+        ("color", _dictionary_string()),
+        ("x", pa.float64()),
+        ("y", pa.float64()),
+        ("size", pa.float64()),
+        ("properties", pa.string()),
+    ]
+
+def _edge_columns():
+    return [
+        ("id", pa.string()),
+        ("source", pa.string()),
+        ("target", pa.string()),
+        ("label", pa.string()),
+        ("type", _dictionary_string()),
+        ("color", _dictionary_string()),
+        ("weight", pa.float64()),
+        ("properties", pa.string()),
+    ]
+
+def _graph_columns():
+    """节点和边合并为一张表，以 kind 区分，不适用的列为null"""
+    columns = [("kind", _dictionary_string())]
+    seen = set()
+    for name, data_type in _node_columns() + _edge_columns():
+        if name not in seen:
+            seen.add(name)
+            columns.append((name, data_type))
+    return columns
+
+def _column_values(rows: List[dict], name: str) -> list:
+    if name == "properties":
+        return [
+            json.dumps(row["properties"], ensure_ascii=False) if row.get("properties") is not None else None
+            for row in rows
+        ]
+    return [row.get(name) for row in rows]
+
+def _record_batch(rows: List[dict], columns: List[tuple], metadata: Optional[dict]):
+    arrays = []
+    for name, data_type in columns:
+        values = _column_values(rows, name)
+        if pa.types.is_dictionary(data_type):
+            array = pa.array(values, type=pa.string()).dictionary_encode()
+        else:
+            array = pa.array(values, type=data_type)
+        arrays.append(array)
+
+    schema = pa.schema(
+        [pa.field(name, data_type) for name, data_type in columns],
+        metadata={
+            key: json.dumps(value, ensure_ascii=False, default=_msgpack_default)
+            for key, value in (metadata or {}).items()
+        }
+    )
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _arrow_response(batch, headers: Optional[dict] = None) -> Response:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE, headers=headers)
+
+def arrow_nodes_response(nodes: List[dict], metadata: Optional[dict] = None, headers: Optional[dict] = None) -> Response:
+    """节点列表的Arrow IPC流"""
+    return _arrow_response(_record_batch(nodes, _node_columns(), metadata), headers)
+
+def arrow_edges_response(edges: List[dict], metadata: Optional[dict] = None, headers: Optional[dict] = None) -> Response:
+    """边列表的Arrow IPC流"""
+    return _arrow_response(_record_batch(edges, _edge_columns(), metadata), headers)
+
+def arrow_graph_response(graph_data: dict, headers: Optional[dict] = None) -> Response:
+    """完整图谱的Arrow IPC流，图谱基本信息存放在schema元数据的 graph 键中"""
+    rows = [{"kind": "node", **node} for node in graph_data["nodes"]]
+    rows.extend({"kind": "edge", **edge} for edge in graph_data["edges"])
+    graph_info = {key: value for key, value in graph_data.items() if key not in ("nodes", "edges")}
+    return _arrow_response(_record_batch(rows, _graph_columns(), {"graph": graph_info}), headers)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+混合负载下的接口延迟基准测试
+
+在临时数据库上启动一个 uvicorn 进程，创建一个大图谱和一个小图谱，然后同时运行：
+
+- slow: 若干客户端反复读取整个大图谱（GET /api/graphs/{id}）
+- fast: 若干客户端反复分页读取小图谱的节点（GET /api/graphs/{id}/nodes?limit=20）
+
+输出两类请求的吞吐和 p50/p95/p99/最大延迟。数据库代码阻塞事件循环时，
+fast 请求的尾延迟会随大图谱读取一起升高。
+
+用法: python benchmarks/concurrent_load.py [--nodes 20000] [--slow 4] [--fast 16] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _start_server(directory: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, SQLITE_DB_PATH=os.path.join(directory, "bench.db"), DEBUG="false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+async def _setup(client: httpx.AsyncClient, node_count: int) -> tuple:
+    response = await client.post("/api/auth/register", json={
+        "username": "bench", "email": "bench@example.com", "password": "benchmark123"
+    })
+    headers = {"Authorization": f"Bearer {response.json()['data']['token']}"}
+
+    nodes = [{"id": f"n{i}", "label": f"节点{i}", "type": "entity", "x": i % 1000, "y": i // 1000} for i in range(node_count)]
+    edges = [{"id": f"e{i}", "source_node_id": f"n{i}", "target_node_id": f"n{i + 1}", "type": "link"} for i in range(node_count - 1)]
+    big = await client.post("/api/graphs", json={"title": "big", "nodes": nodes, "edges": edges}, headers=headers, timeout=600)
+    small = await client.post("/api/graphs", json={"title": "small", "nodes": nodes[:100]}, headers=headers)
+    return headers, big.json()["data"]["id"], small.json()["data"]["id"]
+
+async def _worker(client: httpx.AsyncClient, url: str, headers: dict, stop_at: float, latencies: list, errors: list):
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=headers, timeout=120)
+        except httpx.TimeoutException:
+            errors.append("timeout")
+            continue
+        elapsed = time.perf_counter() - started
+        if response.status_code == 200:
+            latencies.append(elapsed)
+        else:
+            errors.append(response.status_code)
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run(args):
+    with tempfile.TemporaryDirectory(prefix="ai4kg-load-") as directory:
+        port = _free_port()
+        server = _start_server(directory, port)
+        try:
+            limits = httpx.Limits(max_connections=args.slow + args.fast + 4)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+                await _wait_ready(client)
+                headers, big_id, small_id = await _setup(client, args.nodes)
+
+                results = {"slow": ([], []), "fast": ([], [])}
+                stop_at = time.monotonic() + args.seconds
+                workers = [
+                    _worker(client, f"/api/graphs/{big_id}", headers, stop_at, *results["slow"])
+                    for _ in range(args.slow)
+                ] + [
+                    _worker(client, f"/api/graphs/{small_id}/nodes?limit=20", headers, stop_at, *results["fast"])
+                    for _ in range(args.fast)
+                ]
+                await asyncio.gather(*workers)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'请求':<6}{'次数':>8}{'次/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'错误':>6}")
+    for name, (latencies, errors) in results.items():
+        if not latencies:
+            print(f"{name:<6}{0:>8}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{len(errors):>6}")
+            continue
+        row = [_percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99)] + [max(latencies) * 1000]
+        print(
+            f"{name:<6}{len(latencies):>8}{len(latencies) / args.seconds:>10.1f}"
+            + "".join(f"{value:>10.1f}" for value in row)
+            + f"{len(errors):>6}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="混合负载下的接口延迟基准测试")
+    parser.add_argument("--nodes", type=int, default=20000, help="大图谱的节点数")
+    parser.add_argument("--slow", type=int, default=4, help="读取大图谱的并发客户端数")
+    parser.add_argument("--fast", type=int, default=16, help="分页读取小图谱的并发客户端数")
+    parser.add_argument("--seconds", type=float, default=10.0, help="持续时间（秒）")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+并发写入基准测试
+
+在临时数据库上启动一个 uvicorn 进程，创建若干图谱，然后由多个客户端同时向这些
+图谱添加节点（POST /api/graphs/{id}/nodes），输出吞吐、p50/p95/p99/最大延迟、
+失败次数（如 "database is locked"）以及服务端的写入队列指标。
+
+用法: python benchmarks/concurrent_writes.py [--writers 32] [--graphs 4] [--seconds 10] [--no-queue]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _start_server(directory: str, port: int, queue: bool) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SQLITE_DB_PATH=os.path.join(directory, "bench.db"),
+        SQLITE_WRITE_QUEUE=str(queue).lower(),
+        DEBUG="false"
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+async def _setup(client: httpx.AsyncClient, graph_count: int) -> tuple:
+    response = await client.post("/api/auth/register", json={
+        "username": "bench", "email": "bench@example.com", "password": "benchmark123"
+    })
+    headers = {"Authorization": f"Bearer {response.json()['data']['token']}"}
+    graph_ids = []
+    for i in range(graph_count):
+        response = await client.post("/api/graphs", json={"title": f"graph{i}"}, headers=headers)
+        graph_ids.append(response.json()["data"]["id"])
+    return headers, graph_ids
+
+async def _worker(client: httpx.AsyncClient, url: str, headers: dict, stop_at: float, latencies: list, errors: Counter):
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json={"label": "节点", "type": "entity", "properties": {"n": 1}}, headers=headers, timeout=120)
+        except httpx.TimeoutException:
+            errors["timeout"] += 1
+            continue
+        elapsed = time.perf_counter() - started
+        if response.status_code == 200:
+            latencies.append(elapsed)
+        elif "locked" in response.text:
+            errors["database is locked"] += 1
+        else:
+            errors[response.status_code] += 1
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run(args):
+    latencies, errors = [], Counter()
+    with tempfile.TemporaryDirectory(prefix="ai4kg-writes-") as directory:
+        port = _free_port()
+        server = _start_server(directory, port, not args.no_queue)
+        try:
+            limits = httpx.Limits(max_connections=args.writers + 4)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+                await _wait_ready(client)
+                headers, graph_ids = await _setup(client, args.graphs)
+
+                stop_at = time.monotonic() + args.seconds
+                await asyncio.gather(*[
+                    _worker(client, f"/api/graphs/{graph_ids[i % len(graph_ids)]}/nodes", headers, stop_at, latencies, errors)
+                    for i in range(args.writers)
+                ])
+                snapshot = (await client.get("/metrics")).json()
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"写入队列: {'关闭' if args.no_queue else '开启'}  客户端: {args.writers}  图谱: {args.graphs}")
+    if latencies:
+        row = [_percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99)] + [max(latencies) * 1000]
+        print(f"{'次数':>8}{'次/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+        print(f"{len(latencies):>8}{len(latencies) / args.seconds:>10.1f}" + "".join(f"{value:>10.1f}" for value in row))
+    print(f"失败: {dict(errors) or 0}")
+
+    counters = snapshot["counters"]
+    if counters.get("write_queue.batches"):
+        print(f"批次: {counters['write_queue.batches']}  平均每批命令数: "
+              f"{counters['write_queue.commands'] / counters['write_queue.batches']:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="并发写入基准测试")
+    parser.add_argument("--writers", type=int, default=32, help="并发写入的客户端数")
+    parser.add_argument("--graphs", type=int, default=4, help="写入的图谱数")
+    parser.add_argument("--seconds", type=float, default=10.0, help="持续时间（秒）")
+    parser.add_argument("--no-queue", action="store_true", help="关闭写入队列（对比用）")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+SQLite存储配置基准测试
+
+分别以 default（SQLite默认设置）和 tuned（SQLITE_* 配置项）两种存储配置
+在临时数据库上执行相同的负载并输出耗时：
+
+- 单行事务写入（每个节点单独提交，受 synchronous 和日志模式影响最大）
+- 批量写入（一个事务内 executemany）
+- 整图读取
+- 并发读写（一个写线程持续提交小事务，多个读线程同时查询），统计吞吐和锁等待错误
+
+用法: python benchmarks/sqlite_profile.py [--nodes 50000] [--commits 2000] [--seconds 5] [--readers 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from app.core.database import Base, apply_sqlite_pragmas, sqlite_pragmas
+from app.models.models import Graph, Node
+
+nodes_table = Node.__table__
+
+def _node_row(graph_id: str, index: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "graph_id": graph_id,
+        "node_id": f"n{index}",
+        "label": f"节点{index}",
+        "type": "entity",
+        "properties": {"index": index},
+        "x": random.random() * 1000,
+        "y": random.random() * 1000,
+    }
+
+def _create_engine(path: str, profile: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    apply_sqlite_pragmas(engine, sqlite_pragmas(profile))
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def _timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+def _single_commits(engine, graph_id: str, count: int):
+    for index in range(count):
+        with engine.begin() as connection:
+            connection.execute(insert(Node), [_node_row(graph_id, index)])
+
+def _bulk_insert(engine, graph_id: str, count: int):
+    with engine.begin() as connection:
+        connection.execute(insert(Node), [_node_row(graph_id, index) for index in range(count)])
+
+def _read_graph(engine, graph_id: str):
+    with engine.connect() as connection:
+        for _ in connection.execute(select(nodes_table).where(nodes_table.c.graph_id == graph_id)):
+            pass
+
+def _concurrent(engine, graph_id: str, node_count: int, seconds: float, readers: int) -> dict:
+    stop = threading.Event()
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def add(key: str):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        index = 10 ** 9
+        while not stop.is_set():
+            index += 1
+            try:
+                with engine.begin() as connection:
+                    connection.execute(insert(Node), [_node_row(graph_id, index)])
+                add("writes")
+            except OperationalError:
+                add("locked")
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with engine.connect() as connection:
+                    connection.execute(
+                        select(func.count()).select_from(nodes_table).where(nodes_table.c.graph_id == graph_id)
+                    ).scalar()
+                    connection.execute(
+                        select(nodes_table).where(
+                            nodes_table.c.graph_id == graph_id,
+                            nodes_table.c.node_id == f"n{random.randrange(node_count)}"
+                        )
+                    ).first()
+                add("reads")
+            except OperationalError:
+                add("locked")
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {key: round(value / seconds, 1) if key != "locked" else value for key, value in counts.items()}
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"ai4kg-bench-{profile}-") as directory:
+        engine = _create_engine(os.path.join(directory, "bench.db"), profile)
+        try:
+            return _run_workload(engine, args)
+        finally:
+            engine.dispose()
+
+def _run_workload(engine, args) -> dict:
+    graph_id = str(uuid.uuid4())
+    with engine.begin() as connection:
+        connection.execute(insert(Graph), [{"id": graph_id, "title": "benchmark"}])
+        single_graph_id = str(uuid.uuid4())
+        connection.execute(insert(Graph), [{"id": single_graph_id, "title": "single"}])
+
+    results = {
+        "single_commits_s": _timed(_single_commits, engine, single_graph_id, args.commits),
+        "bulk_insert_s": _timed(_bulk_insert, engine, graph_id, args.nodes),
+        "read_graph_s": _timed(_read_graph, engine, graph_id),
+    }
+    results.update(_concurrent(engine, graph_id, args.nodes, args.seconds, args.readers))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite存储配置基准测试")
+    parser.add_argument("--nodes", type=int, default=50000, help="批量写入和读取的节点数")
+    parser.add_argument("--commits", type=int, default=2000, help="单行事务写入的次数")
+    parser.add_argument("--seconds", type=float, default=5.0, help="并发读写的持续时间（秒）")
+    parser.add_argument("--readers", type=int, default=4, help="并发读线程数")
+    args = parser.parse_args()
+
+    results = {profile: run_profile(profile, args) for profile in ("default", "tuned")}
+
+    labels = {
+        "single_commits_s": f"单行事务写入 {args.commits} 次（秒）",
+        "bulk_insert_s": f"批量写入 {args.nodes} 个节点（秒）",
+        "read_graph_s": "整图读取（秒）",
+        "writes": "并发写入（次/秒）",
+        "reads": "并发读取（次/秒）",
+        "locked": "database is locked 错误数",
+    }
+    print(f"{'default':>12}{'tuned':>12}")
+    for key, label in labels.items():
+        default, tuned = results["default"][key], results["tuned"][key]
+        if isinstance(default, float):
+            default, tuned = f"{default:.3f}", f"{tuned:.3f}"
+        print(f"{default:>12}{tuned:>12}  {label}")
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,11 @@ from dotenv import load_dotenv
 
 from app.api.routers import auth, graphs, nodes, edges, analysis, files, search
 from app.core.config import get_settings
-from app.core.database import init_databases, close_databases
+from app.core.database import init_databases, close_databases, neo4j_breaker, neo4j_enabled
+from app.core.metrics import metrics
+from app.core.shards import shard_manager
+from app.core.write_queue import write_queue
+from app.services.neo4j_sync import neo4j_sync_worker
 
 load_dotenv()
 
@@ -14,9 +18,22 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # 启动时初始化数据库连接
     await init_databases()
+    # SQLite主库的写操作由单个写入线程按批提交
+    if write_queue.enabled():
+        write_queue.start()
+    # Neo4j可用时在后台同步发件箱中的写操作
+    if neo4j_enabled():
+        # 熔断期间在后台探测Neo4j是否恢复
+        neo4j_breaker.start()
+        if get_settings().NEO4J_SYNC_ENABLED:
+            neo4j_sync_worker.start()
     yield
-    # 关闭时清理数据库连接
+    # 关闭时停止后台任务并清理数据库连接（同步任务经写入队列提交发件箱的修改，先于写入队列停止）
+    await neo4j_sync_worker.stop()
+    await write_queue.stop()
+    await neo4j_breaker.stop()
     await close_databases()
+    shard_manager.dispose()
 
 app = FastAPI(
     title="AI4KG API",
@@ -55,6 +72,11 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "ai4kg-backend"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """运行指标（缓存命中率等）"""
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -17,12 +17,14 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # 设置测试环境变量
 os.environ["TESTING"] = "true"
 os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+# 写入队列使用自己的连接，看不到测试会话所在的外层事务
+os.environ["SQLITE_WRITE_QUEUE"] = "false"
 os.environ["SECRET_KEY"] = "test-secret-key-for-jwt-signing"
 os.environ["ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "30"
 
 from main import app
-from app.core.database import get_db, Base
+from app.core.database import get_db, Base, GraphSession
 from app.models.models import User, Graph, Node, Edge
 
 # 测试数据库配置
@@ -32,7 +34,7 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(class_=GraphSession, autocommit=False, autoflush=False, bind=engine)
 
 
 @pytest.fixture(scope="session")
@@ -204,6 +206,33 @@ def sample_graph_with_nodes(client, authenticated_user):
     return graph_data["data"]
 
 
+@pytest.fixture
+def sample_graph_with_positions(client, authenticated_user):
+    """创建节点带坐标的示例图谱"""
+    graph_data = {
+        "title": "测试图谱（含坐标）",
+        "nodes": [
+            {"id": "a", "label": "A", "type": "entity", "x": 0, "y": 0},
+            {"id": "b", "label": "B", "type": "entity", "x": 10, "y": 10},
+            {"id": "c", "label": "C", "type": "concept", "x": 100, "y": 100},
+            {"id": "d", "label": "D", "type": "entity"}
+        ],
+        "edges": [
+            {"id": "ab", "source_node_id": "a", "target_node_id": "b", "type": "link"},
+            {"id": "bc", "source_node_id": "b", "target_node_id": "c", "type": "link"}
+        ]
+    }
+    
+    response = client.post(
+        "/api/graphs",
+        json=graph_data,
+        headers=authenticated_user["headers"]
+    )
+    assert response.status_code == 200
+    
+    return response.json()["data"]
+
+
 # 测试标记
 pytest_plugins = ("pytest_asyncio",)
 
@@ -69,6 +69,41 @@ class TestEdgeRetrieval:
         # 根据实现，可能返回404或空列表
         assert response.status_code in [200, 404]
     
+    def test_get_edges_filters_and_pagination(self, client: TestClient, authenticated_user, sample_graph_with_nodes):
+        """测试边的过滤条件和游标分页"""
+        graph_id = sample_graph_with_nodes["id"]
+        headers = authenticated_user["headers"]
+        for source, target, edge_type, weight in [
+            ("node-1", "node-2", "knows", 1.0),
+            ("node-1", "node-3", "works_at", 2.0),
+            ("node-3", "node-4", "located_in", 3.0),
+        ]:
+            response = client.post(
+                f"/api/graphs/{graph_id}/edges",
+                json={"source": source, "target": target, "type": edge_type, "properties": {"w": weight}},
+                headers=headers
+            )
+            assert response.status_code == 200
+        
+        response = client.get(f"/api/graphs/{graph_id}/edges?node_id=node-3", headers=headers)
+        assert {e["type"] for e in response.json()["data"]} == {"works_at", "located_in"}
+        
+        response = client.get(f"/api/graphs/{graph_id}/edges?prop=w>1.5", headers=headers)
+        assert {e["type"] for e in response.json()["data"]} == {"works_at", "located_in"}
+        
+        response = client.get(f"/api/graphs/{graph_id}/edges?limit=2", headers=headers)
+        page = response.json()["data"]
+        assert len(page["items"]) == 2
+        assert page["next_cursor"]
+        
+        response = client.get(
+            f"/api/graphs/{graph_id}/edges?limit=2&cursor={page['next_cursor']}",
+            headers=headers
+        )
+        last_page = response.json()["data"]
+        assert len(last_page["items"]) == 1
+        assert last_page["next_cursor"] is None
+    
     def test_get_edges_unauthorized(self, client: TestClient, sample_graph):
         """测试未授权获取边"""
         graph_id = sample_graph["id"]
@@ -443,7 +478,73 @@ class TestEdgeBatchOperations:
         
         data = response.json()
         assert data["success"] is True
+    
+    def test_create_edges_batch_endpoint(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试批量创建边接口：端点统一校验，单次事务写入"""
+        graph_id = sample_graph_with_positions["id"]
+        headers = authenticated_user["headers"]
+        
+        response = client.post(
+            f"/api/graphs/{graph_id}/edges/batch",
+            json={"edges": [
+                {"id": "ac", "source": "a", "target": "c", "type": "link", "weight": 2.0},
+                {"source_node_id": "c", "target_node_id": "d", "type": "link"}
+            ]},
+            headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["count"] == 2
+        assert data["ids"][0] == "ac"
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert graph["metadata"]["edge_count"] == 4
+        edges = {edge["id"]: edge for edge in graph["edges"]}
+        assert edges["ac"]["weight"] == 2.0
+        
+        # 任一端点不存在时整批拒绝
+        response = client.post(
+            f"/api/graphs/{graph_id}/edges/batch",
+            json={"edges": [
+                {"source": "a", "target": "b", "type": "link"},
+                {"source": "a", "target": "missing", "type": "link"}
+            ]},
+            headers=headers
+        )
+        assert response.status_code == 400
+        assert "missing" in response.json()["detail"]
+        assert len(client.get(f"/api/graphs/{graph_id}/edges", headers=headers).json()["data"]) == 4
+        
+        # 边ID与已有的边或同批的边重复时整批拒绝
+        for edges in (
+            [{"id": "ab", "source": "a", "target": "c", "type": "link"}],
+            [{"id": "cd", "source": "c", "target": "d", "type": "link"}, {"id": "cd", "source": "d", "target": "c", "type": "link"}]
+        ):
+            response = client.post(f"/api/graphs/{graph_id}/edges/batch", json={"edges": edges}, headers=headers)
+            assert response.status_code == 400
+            assert response.json()["detail"].startswith("边ID重复")
+        assert len(client.get(f"/api/graphs/{graph_id}/edges", headers=headers).json()["data"]) == 4
 
+    
+    def test_delete_edges_batch(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试批量删除边"""
+        graph_id = sample_graph_with_positions["id"]
+        headers = authenticated_user["headers"]
+        
+        response = client.post(
+            f"/api/graphs/{graph_id}/edges/batch-delete",
+            json={"ids": ["ab", "missing"]},
+            headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["deleted_edge_ids"] == ["ab"]
+        assert data["not_found_count"] == 1
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert graph["metadata"]["edge_count"] == 1
+        assert graph["metadata"]["node_count"] == 4
+        assert [edge["id"] for edge in graph["edges"]] == ["bc"]
 
 @pytest.mark.edges
 class TestEdgeValidation:
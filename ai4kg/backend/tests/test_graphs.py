@@ -3,6 +3,8 @@
 """
 import pytest
 from fastapi.testclient import TestClient
+import json
+import os
 import uuid
 
 
@@ -70,6 +72,125 @@ class TestGraphList:
         """测试未授权访问图谱列表"""
         response = client.get("/api/graphs")
         assert response.status_code == 401
+    
+    def test_get_graphs_cursor_with_typed_timestamps(self, client: TestClient, authenticated_user, db_session):
+        """测试列表游标的时间键是字符串，相同时间和不同格式的时间都不会重复或遗漏"""
+        import base64
+        import json
+        from datetime import datetime
+        from sqlalchemy import update
+        from app.models.models import Graph
+        headers = authenticated_user["headers"]
+        created = [
+            client.post("/api/graphs", json={"title": f"游标图谱{i}"}, headers=headers).json()["data"]["id"]
+            for i in range(6)
+        ]
+        # 两个图谱使用相同的整秒时间，一个带微秒（其余为 CURRENT_TIMESTAMP 写入的值）
+        db_session.execute(update(Graph).where(Graph.id.in_(created[:2])).values(updated_at=datetime(2020, 1, 1, 8, 0, 0)))
+        db_session.execute(update(Graph).where(Graph.id == created[2]).values(updated_at=datetime(2020, 1, 1, 8, 0, 0, 500)))
+        db_session.flush()
+        
+        seen = []
+        cursor = None
+        while True:
+            url = "/api/graphs?size=1" + (f"&cursor={cursor}" if cursor else "")
+            data = client.get(url, headers=headers).json()["data"]
+            seen.extend(graph["id"] for graph in data["graphs"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+            updated_at, _ = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            assert isinstance(updated_at, str)
+            datetime.fromisoformat(updated_at)
+        assert len(seen) == len(set(seen)) == 6
+        assert seen[3:] == [created[2], *sorted(created[:2], reverse=True)]
+        
+        # 其他数据库返回时间对象，游标以 ISO 8601 编码并解析回带时区的时间
+        from fastapi import HTTPException
+        from app.services.graph_service import GraphService
+        from app.services.query_filters import encode_cursor
+        moment = datetime.fromisoformat("2020-01-01T08:00:00.000500+00:00")
+        cursor = encode_cursor(json.dumps([moment.isoformat(), "g"]))
+        assert GraphService._decode_list_cursor(cursor, parse_time=True) == (moment, "g")
+        with pytest.raises(HTTPException):
+            GraphService._decode_list_cursor(encode_cursor(json.dumps(["昨天", "g"])), parse_time=True)
+    
+    def test_get_graphs_cursor_pagination(self, client: TestClient, authenticated_user):
+        """测试游标分页遍历全部图谱，总数随创建和删除维护"""
+        headers = authenticated_user["headers"]
+        created = []
+        for i in range(5):
+            response = client.post("/api/graphs", json={"title": f"分页图谱{i}"}, headers=headers)
+            created.append(response.json()["data"]["id"])
+        
+        seen = []
+        cursor = None
+        while True:
+            url = "/api/graphs?size=2" + (f"&cursor={cursor}" if cursor else "")
+            data = client.get(url, headers=headers).json()["data"]
+            assert data["total"] == 5
+            seen.extend(graph["id"] for graph in data["graphs"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(created)
+        
+        client.delete(f"/api/graphs/{created[0]}", headers=headers)
+        data = client.get("/api/graphs", headers=headers).json()["data"]
+        assert data["total"] == 4
+        
+        response = client.get("/api/graphs?cursor=invalid", headers=headers)
+        assert response.status_code == 400
+    
+    def test_get_graphs_title_search(self, client: TestClient, authenticated_user):
+        """测试标题子串搜索（长关键词走全文索引，短关键词回退LIKE）"""
+        headers = authenticated_user["headers"]
+        for title in ["Protein Network", "社交关系网络", "Citation graph"]:
+            client.post("/api/graphs", json={"title": title}, headers=headers)
+        
+        def titles(search):
+            data = client.get(f"/api/graphs?search={search}", headers=headers).json()["data"]
+            assert data["total"] == len(data["graphs"])
+            return sorted(graph["title"] for graph in data["graphs"])
+        
+        assert titles("NETWORK") == ["Protein Network"]
+        assert titles("关系网") == ["社交关系网络"]
+        assert titles("ph") == ["Citation graph"]
+        
+        # 标题修改后索引同步更新
+        graph_id = client.get("/api/graphs?search=Citation", headers=headers).json()["data"]["graphs"][0]["id"]
+        client.put(f"/api/graphs/{graph_id}", json={"title": "Reference graph"}, headers=headers)
+        assert titles("Citation") == []
+        assert titles("Reference") == ["Reference graph"]
+    
+    def test_title_search_survives_rowid_renumbering(self, client: TestClient, authenticated_user, db_session):
+        """测试图谱的隐式 rowid 被重新编号（VACUUM、导出导入）后标题索引仍指向正确的图谱"""
+        from sqlalchemy import text
+        from app.models.models import create_graph_title_index
+        headers = authenticated_user["headers"]
+        for title in ["Protein Network", "Citation graph"]:
+            client.post("/api/graphs", json={"title": title}, headers=headers)
+        
+        def titles(search):
+            data = client.get(f"/api/graphs?search={search}", headers=headers).json()["data"]
+            return sorted(graph["title"] for graph in data["graphs"])
+        
+        db_session.execute(text("UPDATE graphs SET rowid = rowid + 1000"))
+        assert titles("Network") == ["Protein Network"]
+        
+        graph_id = client.get("/api/graphs?search=Citation", headers=headers).json()["data"]["graphs"][0]["id"]
+        client.put(f"/api/graphs/{graph_id}", json={"title": "Reference graph"}, headers=headers)
+        assert titles("Citation") == []
+        assert titles("Reference") == ["Reference graph"]
+        
+        # 旧版本以 rowid 关联的索引在启动时重建
+        db_session.execute(text("DROP TABLE graph_title_keys"))
+        assert create_graph_title_index(db_session.connection())
+        assert titles("Network") == ["Protein Network"]
+        assert titles("Reference") == ["Reference graph"]
+        
+        client.delete(f"/api/graphs/{graph_id}", headers=headers)
+        assert titles("Reference") == []
 
 
 @pytest.mark.graphs
@@ -127,6 +248,58 @@ class TestGraphCreation:
         """测试未授权创建图谱"""
         response = client.post("/api/graphs", json=sample_graph_data)
         assert response.status_code == 401
+    
+    def test_create_graph_commits_data_with_graph_row(self, tmp_path, monkeypatch):
+        """测试图谱记录与节点、边在同一事务中提交：写入数据期间其他连接看不到新图谱，失败时不留下空图谱"""
+        from fastapi import HTTPException
+        from sqlalchemy import create_engine, func, select
+        from sqlalchemy.orm import sessionmaker
+        from app.core.database import Base, GraphSession
+        from app.models.models import Edge, Graph, User
+        from app.schemas.schemas import GraphCreate
+        from app.services.graph_service import GraphService
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'create.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(class_=GraphSession, autoflush=False, bind=engine)()
+        user = User(username="creator", email="creator@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        
+        def graph_count():
+            with engine.connect() as connection:
+                return connection.execute(select(func.count()).select_from(Graph.__table__)).scalar()
+        
+        visible = []
+        insert_rows = GraphService._insert_rows
+        
+        def observing_insert(service, model, rows):
+            visible.append(graph_count())
+            if model is Edge and fail:
+                raise RuntimeError("写入失败")
+            insert_rows(service, model, rows)
+        
+        monkeypatch.setattr(GraphService, "_insert_rows", observing_insert)
+        graph_data = GraphCreate(
+            title="新图谱",
+            nodes=[{"id": "a", "label": "A", "type": "entity"}, {"id": "b", "label": "B", "type": "entity"}],
+            edges=[{"id": "e", "source_node_id": "a", "target_node_id": "b", "type": "link"}]
+        )
+        try:
+            fail = False
+            GraphService(db).create_graph(graph_data, user)
+            assert visible == [0, 0]
+            assert graph_count() == 1
+            
+            fail = True
+            with pytest.raises(HTTPException):
+                GraphService(db).create_graph(graph_data, user)
+            assert graph_count() == 1
+            db.refresh(user)
+            assert user.graph_count == 1
+        finally:
+            db.close()
+            engine.dispose()
 
 
 @pytest.mark.graphs
@@ -197,6 +370,1190 @@ class TestGraphRetrieval:
             headers=other_headers
         )
         assert response.status_code in [403, 404]  # 可能是403禁止访问或404未找到
+    
+    def test_get_graph_ndjson_stream(self, client: TestClient, authenticated_user, sample_graph_with_nodes):
+        """测试以NDJSON流式获取图谱"""
+        graph_id = sample_graph_with_nodes["id"]
+        client.post(
+            f"/api/graphs/{graph_id}/edges",
+            json={"source": "node-1", "target": "node-2", "type": "knows"},
+            headers=authenticated_user["headers"]
+        )
+        
+        response = client.get(
+            f"/api/graphs/{graph_id}",
+            headers={**authenticated_user["headers"], "Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert records[0]["type"] == "graph"
+        assert records[0]["data"]["id"] == graph_id
+        assert records[-1] == {"type": "end", "node_count": 4, "edge_count": 1}
+        
+        node_ids = {r["data"]["id"] for r in records if r["type"] == "node"}
+        assert node_ids == {"node-1", "node-2", "node-3", "node-4"}
+        edges = [r["data"] for r in records if r["type"] == "edge"]
+        assert edges[0]["source"] == "node-1"
+        assert edges[0]["target"] == "node-2"
+    
+    def test_get_graph_ndjson_stream_not_found(self, client: TestClient, authenticated_user):
+        """测试流式获取不存在的图谱"""
+        response = client.get(
+            f"/api/graphs/{uuid.uuid4()}",
+            headers={**authenticated_user["headers"], "Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == 404
+
+
+class FakeRedis:
+    """测试用的内存Redis"""
+    
+    def __init__(self):
+        self.store = {}
+    
+    def get(self, key):
+        return self.store.get(key)
+    
+    def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+    
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+@pytest.mark.graphs
+class TestGraphCache:
+    """图谱快照缓存测试"""
+    
+    @pytest.fixture
+    def fake_redis(self, monkeypatch):
+        from app.core.metrics import metrics
+        
+        redis = FakeRedis()
+        monkeypatch.setattr("app.services.graph_cache.get_redis", lambda: redis)
+        metrics.reset()
+        return redis
+    
+    def test_graph_cached_and_invalidated(self, client: TestClient, authenticated_user, sample_graph_with_nodes, fake_redis):
+        """测试图谱读取命中缓存，变更后使用新版本"""
+        from app.core.metrics import metrics
+        
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_nodes["id"]
+        
+        first = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        second = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert first == second
+        assert metrics.get("graph_cache.misses") == 1
+        assert metrics.get("graph_cache.hits") == 1
+        assert len(fake_redis.store) == 1
+        
+        client.put(f"/api/graphs/{graph_id}/nodes/node-1", json={"label": "新标签"}, headers=headers)
+        assert fake_redis.store == {}
+        
+        third = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        labels = {n["id"]: n["label"] for n in third["nodes"]}
+        assert labels["node-1"] == "新标签"
+        assert metrics.get("graph_cache.misses") == 2
+    
+    def test_oversized_graph_not_cached(self, client: TestClient, authenticated_user, sample_graph_with_nodes, fake_redis, monkeypatch):
+        """测试超过大小上限的图谱不写入缓存，同一版本之后的读取不再序列化整个图谱"""
+        from app.core.metrics import metrics
+        from app.services import graph_cache
+        
+        monkeypatch.setattr(graph_cache.settings, "GRAPH_CACHE_MAX_BYTES", 10)
+        url = f"/api/graphs/{sample_graph_with_nodes['id']}"
+        headers = authenticated_user["headers"]
+        client.get(url, headers=headers)
+        
+        assert len(fake_redis.store) == 1
+        assert next(iter(fake_redis.store)).endswith(":oversize")
+        assert metrics.get("graph_cache.oversize") == 1
+        
+        encoded = []
+        encoder = graph_cache.jsonable_encoder
+        monkeypatch.setattr(graph_cache, "jsonable_encoder", lambda data: encoded.append(data) or encoder(data))
+        assert client.get(url, headers=headers).status_code == 200
+        assert encoded == []
+        assert metrics.get("graph_cache.oversize") == 1
+        assert metrics.get("graph_cache.oversize_skips") == 1
+        
+        # 变更后新版本重新判断大小，旧版本的标记被删除
+        client.put(f"{url}/nodes/node-1", json={"label": "新标签"}, headers=headers)
+        assert fake_redis.store == {}
+
+
+class FakeNeo4jResult:
+    def consume(self):
+        pass
+    
+    def single(self):
+        return {"deleted": 0}
+
+
+class FakeNeo4jSession:
+    """记录事务和语句的Neo4j会话替身，语句包含 fail_on 时抛出 error"""
+    
+    def __init__(self):
+        self.transactions = []
+        self.fail_on = None
+        self.error = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def begin_transaction(self):
+        self.transactions.append([])
+        return self
+    
+    def run(self, query, **params):
+        query = " ".join(query.split())
+        if self.fail_on and self.fail_on in query:
+            raise self.error
+        self.transactions[-1].append((query, params))
+        return FakeNeo4jResult()
+    
+    def commit(self):
+        pass
+
+
+@pytest.mark.graphs
+class TestNeo4jSync:
+    """Neo4j发件箱同步测试"""
+    
+    @pytest.fixture
+    def neo4j_session(self, monkeypatch):
+        from app.core.metrics import metrics
+        from app.services import neo4j_sync
+        
+        session = FakeNeo4jSession()
+        monkeypatch.setattr(neo4j_sync, "neo4j_enabled", lambda: True)
+        monkeypatch.setattr(neo4j_sync, "get_neo4j_session", lambda: session)
+        monkeypatch.setattr(neo4j_sync.settings, "NEO4J_BATCH_SIZE", 2)
+        monkeypatch.setattr(neo4j_sync.settings, "NEO4J_TRANSACTION_SIZE", 4)
+        metrics.reset()
+        return session
+    
+    def _outbox(self, db_session):
+        from app.models.models import Neo4jOutbox
+        
+        return [
+            (entry.op, entry.attempts)
+            for entry in db_session.query(Neo4jOutbox).order_by(Neo4jOutbox.id)
+        ]
+    
+    def test_writes_queued_and_drained_in_batches(self, client: TestClient, authenticated_user, db_session, neo4j_session):
+        """测试写操作只进入发件箱，同步任务按顺序合并批次写入Neo4j"""
+        from app.core.metrics import metrics
+        from app.services.neo4j_sync import Neo4jSyncWorker
+        
+        headers = authenticated_user["headers"]
+        graph_id = client.post(
+            "/api/graphs",
+            json={
+                "title": "Neo4j同步",
+                "nodes": [{"id": f"n{i}", "label": f"N{i}", "type": "entity"} for i in range(5)],
+                "edges": [
+                    {"id": f"e{i}", "source_node_id": f"n{i}", "target_node_id": f"n{i + 1}", "type": "link"}
+                    for i in range(3)
+                ]
+            },
+            headers=headers
+        ).json()["data"]["id"]
+        client.post(f"/api/graphs/{graph_id}/nodes", json={"id": "x", "label": "X", "type": "entity", "properties": {"k": 1}}, headers=headers)
+        client.post(f"/api/graphs/{graph_id}/nodes", json={"id": "y", "label": "Y", "type": "entity"}, headers=headers)
+        client.delete(f"/api/graphs/{graph_id}/edges/e0", headers=headers)
+        
+        # 请求期间不访问Neo4j
+        assert neo4j_session.transactions == []
+        assert self._outbox(db_session) == [
+            ("sync_graph", 0), ("upsert_nodes", 0), ("upsert_nodes", 0), ("delete_edges", 0)
+        ]
+        
+        assert Neo4jSyncWorker().drain_once(db_session) == 4
+        assert self._outbox(db_session) == []
+        assert metrics.get("neo4j_sync.applied") == 4
+        assert metrics.get("neo4j_sync.pending") == 0
+        
+        # 清空图谱后按当前数据重建（7个节点: 事务[2, 2] + [2, 1]，2条边），再重放后续记录：
+        # 相邻的两条新增节点合并为一批，最后删除边
+        batches = [
+            [len(params["rows"]) for _, params in transaction if "rows" in params]
+            for transaction in neo4j_session.transactions
+        ]
+        assert batches == [[], [2, 2], [2, 1], [2], [2], [1]]
+        
+        statements = [query for transaction in neo4j_session.transactions for query, _ in transaction]
+        assert statements[0].startswith("MATCH (n:Node {graph_id: $graph_id})")
+        assert all(query.startswith("UNWIND $rows") for query in statements[1:])
+        assert "MERGE (n:Node {graph_id: $graph_id, id: node.id})" in statements[1]
+        upserted = neo4j_session.transactions[4][0][1]["rows"]
+        assert [row["id"] for row in upserted] == ["x", "y"]
+        assert upserted[0]["properties"] == '{"k": 1}'
+        assert neo4j_session.transactions[5][0][1]["rows"] == ["e0"]
+    
+    def test_merged_rows_deduplicated_by_id(self, client: TestClient, authenticated_user, db_session, neo4j_session):
+        """测试合并的相邻记录中同一节点/边只写入最后一次，避免重复创建关系"""
+        from app.services.neo4j_sync import Neo4jSyncWorker
+        
+        headers = authenticated_user["headers"]
+        graph_id = client.post(
+            "/api/graphs",
+            json={
+                "title": "去重",
+                "nodes": [{"id": "a", "label": "A", "type": "entity"}, {"id": "b", "label": "B", "type": "entity"}],
+                "edges": [{"id": "e", "source_node_id": "a", "target_node_id": "b", "type": "link"}]
+            },
+            headers=headers
+        ).json()["data"]["id"]
+        worker = Neo4jSyncWorker()
+        assert worker.drain_once(db_session) == 1
+        neo4j_session.transactions.clear()
+        
+        client.put(f"/api/graphs/{graph_id}/edges/e", json={"label": "第一次"}, headers=headers)
+        client.put(f"/api/graphs/{graph_id}/edges/e", json={"label": "第二次"}, headers=headers)
+        assert self._outbox(db_session) == [("upsert_edges", 0), ("upsert_edges", 0)]
+        client.put(f"/api/graphs/{graph_id}/nodes/positions", json={"positions": [["a", 1, 1]]}, headers=headers)
+        client.put(f"/api/graphs/{graph_id}/nodes/positions", json={"positions": [["a", 2, 2, 5]]}, headers=headers)
+        
+        assert worker.drain_once(db_session) == 4
+        (_, edge_params), = neo4j_session.transactions[0]
+        assert [(row["id"], row["label"]) for row in edge_params["rows"]] == [("e", "第二次")]
+        (_, node_params), = neo4j_session.transactions[1]
+        assert node_params["rows"] == [{"id": "a", "values": {"x": 2.0, "y": 2.0, "size": 5.0}}]
+    
+    def test_failed_entry_blocks_later_entries(self, client: TestClient, authenticated_user, sample_graph, db_session, neo4j_session):
+        """测试写入失败时按顺序重试，Neo4j不可用不计入重试次数"""
+        from neo4j.exceptions import ClientError, ServiceUnavailable
+        from app.core.metrics import metrics
+        from app.services.neo4j_sync import Neo4jSyncWorker
+        
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph["id"]
+        client.post(f"/api/graphs/{graph_id}/edges/batch-delete", json={"ids": ["missing"]}, headers=headers)
+        client.post(f"/api/graphs/{graph_id}/nodes", json={"id": "a", "label": "A", "type": "entity"}, headers=headers)
+        client.delete(f"/api/graphs/{graph_id}/nodes/a", headers=headers)
+        assert self._outbox(db_session) == [("upsert_nodes", 0), ("delete_nodes", 0)]
+        
+        worker = Neo4jSyncWorker()
+        neo4j_session.fail_on = "UNWIND"
+        neo4j_session.error = ServiceUnavailable("connection refused")
+        assert worker.drain_once(db_session) == 0
+        assert self._outbox(db_session) == [("upsert_nodes", 0), ("delete_nodes", 0)]
+        assert metrics.get("neo4j_sync.unavailable") == 1
+        
+        neo4j_session.error = ClientError("bad statement")
+        assert worker.drain_once(db_session) == 0
+        assert self._outbox(db_session) == [("upsert_nodes", 1), ("delete_nodes", 0)]
+        assert metrics.get("neo4j_sync.pending") == 2
+        
+        neo4j_session.fail_on = None
+        assert worker.drain_once(db_session) == 2
+        assert self._outbox(db_session) == []
+    
+    def test_outbox_rolled_back_with_failed_save(self, tmp_path, monkeypatch, neo4j_session):
+        """测试节点和边写入失败时发件箱记录随同回滚，不会留下指向不完整数据的同步记录"""
+        from fastapi import HTTPException
+        from sqlalchemy import create_engine, func, select
+        from sqlalchemy.orm import sessionmaker
+        from app.core.database import Base, GraphSession
+        from app.models.models import Edge, Neo4jOutbox, Node, User
+        from app.schemas.schemas import GraphCreate, GraphUpdate
+        from app.services.graph_service import GraphService
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(class_=GraphSession, autoflush=False, bind=engine)()
+        user = User(username="outbox", email="outbox@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        
+        def count(model):
+            with engine.connect() as connection:
+                return connection.execute(select(func.count()).select_from(model.__table__)).scalar()
+        
+        nodes = [{"id": "a", "label": "A", "type": "entity"}, {"id": "b", "label": "B", "type": "entity"}]
+        edges = [{"id": "e", "source_node_id": "a", "target_node_id": "b", "type": "link"}]
+        insert_rows = GraphService._insert_rows
+        
+        def failing_insert(service, model, rows):
+            if model is Edge:
+                raise RuntimeError("写入失败")
+            insert_rows(service, model, rows)
+        
+        try:
+            service = GraphService(db)
+            graph_id = service.create_graph(GraphCreate(title="原图谱", nodes=nodes, edges=edges), user)["id"]
+            assert count(Neo4jOutbox) == 1
+            
+            monkeypatch.setattr(GraphService, "_insert_rows", failing_insert)
+            with pytest.raises(HTTPException):
+                service.create_graph(GraphCreate(title="新图谱", nodes=nodes, edges=edges), user)
+            assert count(Neo4jOutbox) == 1
+            
+            # 整体替换失败时保留原数据，不记录重建
+            with pytest.raises(HTTPException):
+                service.update_graph(graph_id, GraphUpdate(nodes=[{"id": "c", "label": "C", "type": "entity"}], edges=edges), user)
+            assert count(Neo4jOutbox) == 1
+            assert count(Node) == 2
+            assert count(Edge) == 1
+        finally:
+            db.close()
+            engine.dispose()
+    
+    def test_outbox_updates_committed_by_write_queue(self, tmp_path, monkeypatch, neo4j_session):
+        """测试写入队列运行时发件箱的失败次数和删除由写入线程提交，同步任务的会话不写主库"""
+        import anyio
+        from neo4j.exceptions import ClientError
+        from sqlalchemy import create_engine, event, select
+        from sqlalchemy.orm import sessionmaker
+        from app.core.database import Base
+        from app.core.metrics import metrics
+        from app.core.write_queue import WriteQueue
+        from app.models.models import Neo4jOutbox
+        from app.services import neo4j_sync
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.add_all([
+            Neo4jOutbox(graph_id="g", op="upsert_nodes", payload={"rows": [{"id": "a", "label": "A", "type": "entity"}]}),
+            Neo4jOutbox(graph_id="g", op="delete_edges", payload={"rows": ["e"]}),
+        ])
+        db.commit()
+        flushes = []
+        event.listen(db, "after_flush", lambda session, context: flushes.append(session))
+        
+        def outbox():
+            with engine.connect() as connection:
+                return connection.execute(
+                    select(Neo4jOutbox.op, Neo4jOutbox.attempts, Neo4jOutbox.last_error).order_by(Neo4jOutbox.id)
+                ).all()
+        
+        queue = WriteQueue(engine, max_batch=8)
+        monkeypatch.setattr(neo4j_sync, "write_queue", queue)
+        worker = neo4j_sync.Neo4jSyncWorker()
+        queue.start()
+        try:
+            neo4j_session.fail_on = "UNWIND"
+            neo4j_session.error = ClientError("bad statement")
+            assert worker.drain_once(db) == 0
+            assert outbox() == [("upsert_nodes", 1, "bad statement"), ("delete_edges", 0, None)]
+            assert metrics.get("write_queue.commands") == 1
+            
+            neo4j_session.fail_on = None
+            assert worker.drain_once(db) == 2
+            assert outbox() == []
+            assert metrics.get("write_queue.commands") == 3
+            assert metrics.get("neo4j_sync.pending") == 0
+        finally:
+            anyio.run(queue.stop)
+            db.close()
+            engine.dispose()
+        
+        assert flushes == []
+        with pytest.raises(RuntimeError):
+            queue.call(lambda session: None)
+
+
+class FakeNeo4jDriver:
+    """available 为 False 时所有语句和连通性检查都抛出 ServiceUnavailable"""
+    
+    def __init__(self):
+        self.available = False
+        self.sessions = 0
+    
+    def session(self):
+        self.sessions += 1
+        return self
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def run(self, query, **params):
+        self.verify_connectivity()
+        return []
+    
+    def verify_connectivity(self):
+        from neo4j.exceptions import ServiceUnavailable
+        
+        if not self.available:
+            raise ServiceUnavailable("connection refused")
+
+
+@pytest.mark.graphs
+class TestNeo4jCircuitBreaker:
+    """Neo4j熔断测试"""
+    
+    @pytest.fixture
+    def neo4j_driver(self, client, monkeypatch):
+        from app.core import database
+        from app.core.metrics import metrics
+        
+        driver = FakeNeo4jDriver()
+        monkeypatch.setattr(database, "neo4j_driver", driver)
+        monkeypatch.setattr(database.neo4j_breaker, "failure_threshold", 2)
+        monkeypatch.setattr(database.neo4j_breaker, "reset_timeout", 60)
+        metrics.reset()
+        database.neo4j_breaker.reset()
+        yield driver
+        database.neo4j_breaker.reset()
+    
+    def test_reads_skip_neo4j_while_open(self, client: TestClient, authenticated_user, neo4j_driver):
+        """测试连续连接失败后熔断，请求不再访问Neo4j，探测成功后恢复"""
+        from app.core.database import neo4j_breaker
+        from app.core.metrics import metrics
+        
+        headers = authenticated_user["headers"]
+        graph_id = client.post("/api/graphs", json={"title": "空图谱"}, headers=headers).json()["data"]["id"]
+        
+        # 空图谱从Neo4j回退读取，两次连接失败后熔断
+        for _ in range(2):
+            assert client.get(f"/api/graphs/{graph_id}", headers=headers).status_code == 200
+        assert neo4j_driver.sessions == 2
+        assert neo4j_breaker.state == "open"
+        assert metrics.get("neo4j.circuit_state") == 2
+        assert metrics.get("neo4j.circuit_opened") == 1
+        
+        response = client.get(f"/api/graphs/{graph_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["data"]["nodes"] == []
+        assert neo4j_driver.sessions == 2
+        
+        # 探测失败保持打开，恢复后关闭
+        assert neo4j_breaker.probe_now() is False
+        assert neo4j_breaker.state == "open"
+        neo4j_driver.available = True
+        assert neo4j_breaker.probe_now() is True
+        assert metrics.get("neo4j.circuit_state") == 0
+        
+        client.get(f"/api/graphs/{graph_id}", headers=headers)
+        assert neo4j_driver.sessions == 3
+    
+    def test_half_open_allows_single_trial(self, neo4j_driver, monkeypatch):
+        """测试熔断超时后只放行一次试探，试探失败重新打开"""
+        from app.core.database import Neo4jUnavailable, get_neo4j_session, neo4j_breaker
+        from neo4j.exceptions import ServiceUnavailable
+        
+        for _ in range(2):
+            with pytest.raises(ServiceUnavailable):
+                with get_neo4j_session() as session:
+                    session.run("RETURN 1")
+        assert neo4j_breaker.state == "open"
+        with pytest.raises(Neo4jUnavailable):
+            get_neo4j_session()
+        
+        monkeypatch.setattr(neo4j_breaker, "reset_timeout", 0)
+        trial = get_neo4j_session()
+        assert neo4j_breaker.state == "half_open"
+        with pytest.raises(Neo4jUnavailable):
+            get_neo4j_session()
+        
+        with pytest.raises(ServiceUnavailable):
+            with trial as session:
+                session.run("RETURN 1")
+        assert neo4j_breaker.state == "open"
+        assert neo4j_driver.sessions == 3
+
+
+@pytest.mark.graphs
+class TestBusinessKeyMigration:
+    """节点/边业务ID唯一索引迁移测试"""
+    
+    def test_migrates_old_layout(self, tmp_path, monkeypatch):
+        """测试旧数据库去除重复ID、更新计数并改用复合索引"""
+        from sqlalchemy import create_engine, inspect, text
+        from app.core import database
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        database.Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            # 还原为旧版本的索引布局
+            for name in ("ix_nodes_graph_id_node_id", "ix_edges_graph_id_edge_id",
+                         "ix_edges_graph_id_source_node_id", "ix_edges_graph_id_target_node_id"):
+                connection.execute(text(f"DROP INDEX {name}"))
+            connection.execute(text("CREATE INDEX ix_nodes_graph_id_node_id ON nodes (graph_id, node_id)"))
+            connection.execute(text("CREATE INDEX ix_edges_source_node_id ON edges (source_node_id)"))
+            
+            connection.execute(text("INSERT INTO graphs (id, title, node_count, edge_count, data_version) VALUES ('g', 't', 3, 2, 5)"))
+            for row_id, node_id, label in (("1", "a", "first"), ("2", "a", "second"), ("3", "b", "b")):
+                connection.execute(text(
+                    "INSERT INTO nodes (id, graph_id, node_id, label, type) VALUES (:id, 'g', :node_id, :label, 'entity')"
+                ), {"id": row_id, "node_id": node_id, "label": label})
+            for row_id in ("1", "2"):
+                connection.execute(text(
+                    "INSERT INTO edges (id, graph_id, edge_id, source_node_id, target_node_id, type) "
+                    "VALUES (:id, 'g', 'ab', 'a', 'b', 'link')"
+                ), {"id": row_id})
+        
+        monkeypatch.setattr(database, "engine", engine)
+        database._migrate_business_keys()
+        database._ensure_indexes()
+        
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT node_id, label FROM nodes ORDER BY node_id")).all() == [("a", "first"), ("b", "b")]
+            assert connection.execute(text("SELECT count(*) FROM edges")).scalar() == 1
+            assert connection.execute(text("SELECT node_count, edge_count, data_version FROM graphs")).one() == (2, 1, 6)
+            assert connection.execute(text("SELECT version, entity, op FROM graph_changes")).all() == [(6, "graph", "reset")]
+        
+        indexes = {index["name"]: index for index in inspect(engine).get_indexes("nodes") + inspect(engine).get_indexes("edges")}
+        assert indexes["ix_nodes_graph_id_node_id"]["unique"]
+        assert indexes["ix_edges_graph_id_edge_id"]["unique"]
+        assert indexes["ix_edges_graph_id_source_node_id"]["column_names"] == ["graph_id", "source_node_id", "target_node_id"]
+        assert "ix_edges_source_node_id" not in indexes
+        
+        # 已迁移的数据库不再处理
+        database._migrate_business_keys()
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM graph_changes")).scalar() == 1
+        engine.dispose()
+    
+    def test_skipped_on_other_backends(self, monkeypatch):
+        """测试迁移只在SQLite上执行（语句依赖隐式 rowid）"""
+        from sqlalchemy import create_mock_engine
+        from app.core import database
+        
+        statements = []
+        engine = create_mock_engine("postgresql+psycopg2://", lambda sql, *args, **kwargs: statements.append(sql))
+        monkeypatch.setattr(database, "engine", engine)
+        database._migrate_business_keys()
+        assert statements == []
+    
+    def test_duplicate_ids_keep_last(self, client: TestClient, authenticated_user):
+        """测试整图保存时同一ID以最后一次为准"""
+        headers = authenticated_user["headers"]
+        response = client.post("/api/graphs", json={
+            "title": "重复ID",
+            "nodes": [
+                {"id": "a", "label": "旧", "type": "entity"},
+                {"id": "b", "label": "B", "type": "entity"},
+                {"id": "a", "label": "新", "type": "entity"},
+            ]
+        }, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["metadata"]["node_count"] == 2
+        
+        graph = client.get(f"/api/graphs/{data['id']}", headers=headers).json()["data"]
+        assert {node["id"]: node["label"] for node in graph["nodes"]} == {"a": "新", "b": "B"}
+
+
+@pytest.mark.graphs
+class TestRelationalBackends:
+    """关系数据库后端测试（SQLite / PostgreSQL）"""
+    
+    def test_postgres_schema_and_queries(self, tmp_path):
+        """测试PostgreSQL方言下的连接池参数、JSONB列、GIN索引和属性过滤编译结果"""
+        from sqlalchemy import create_engine, inspect, select
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateIndex, CreateTable
+        from app.core import database
+        from app.models.models import Node
+        from app.services.query_filters import property_condition
+        
+        assert database.engine_options("sqlite:///data/ai4kg.db") == {"connect_args": {"check_same_thread": False}}
+        options = database.engine_options("postgresql+psycopg2://user:pw@localhost/ai4kg")
+        assert options["pool_pre_ping"] is True
+        assert options["pool_size"] + options["max_overflow"] >= database.settings.DB_THREAD_POOL_SIZE
+        
+        dialect = postgresql.dialect()
+        assert "properties JSONB" in str(CreateTable(Node.__table__).compile(dialect=dialect))
+        gin = next(index for index in Node.__table__.indexes if index.name == "ix_nodes_properties_gin")
+        assert "USING gin (properties jsonb_path_ops)" in str(CreateIndex(gin).compile(dialect=dialect))
+        
+        def compiled(*args):
+            return str(select(Node.id).where(property_condition(Node.properties, *args, dialect="postgresql")).compile(dialect=dialect))
+        
+        assert "@>" in compiled("kind", "=", "person")
+        assert "@>" in compiled("active", "=", True)
+        assert "@>" not in compiled("age", "=", 30)
+        
+        # GIN索引只在PostgreSQL上创建
+        engine = create_engine(f"sqlite:///{tmp_path / 'gin.db'}")
+        database.Base.metadata.create_all(bind=engine)
+        assert "ix_nodes_properties_gin" not in {index["name"] for index in inspect(engine).get_indexes("nodes")}
+        engine.dispose()
+    
+    def test_copy_value_encoding(self):
+        """测试 COPY 文本格式的转义和空值"""
+        from app.core.database import _copy_value
+        
+        assert _copy_value(None) == "\\N"
+        assert _copy_value("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+        assert _copy_value({"名称": "x"}) == '{"名称": "x"}'
+        assert _copy_value(1.5) == "1.5"
+        assert _copy_value(True) == "t"
+    
+    @pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="未设置 TEST_POSTGRES_URL")
+    def test_postgres_round_trip(self):
+        """测试在PostgreSQL上以 COPY 创建图谱、读取并按属性过滤（需要本地PostgreSQL）"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.core.database import Base, engine_options
+        from app.models.models import User
+        from app.schemas.schemas import GraphCreate
+        from app.services.graph_service import GraphService
+        
+        url = os.environ["TEST_POSTGRES_URL"]
+        engine = create_engine(url, **engine_options(url))
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            user = User(username="pg", email="pg@example.com", password_hash="x")
+            session.add(user)
+            session.commit()
+            
+            service = GraphService(session)
+            created = service.create_graph(GraphCreate(
+                title="PostgreSQL",
+                nodes=[
+                    {"id": "a", "label": "制表符\t换行\n", "type": "person", "properties": {"kind": "x", "age": 3}},
+                    {"id": "b", "label": "B", "type": "person", "properties": {"kind": "y", "age": 5}},
+                ],
+                edges=[{"id": "ab", "source_node_id": "a", "target_node_id": "b", "type": "link"}]
+            ), user)
+            graph = service.get_graph_with_data(created["id"], user)
+            assert {node["id"]: node["label"] for node in graph["nodes"]} == {"a": "制表符\t换行\n", "b": "B"}
+            assert graph["edges"][0]["source"] == "a"
+            
+            db_graph = service.get_graph_by_id(created["id"], user)
+            nodes, _ = service.list_nodes(db_graph, property_filters=["kind=y"])
+            assert [node["id"] for node in nodes] == ["b"]
+            nodes, _ = service.list_nodes(db_graph, property_filters=["age>=3"], search="x")
+            assert [node["id"] for node in nodes] == ["a"]
+        finally:
+            session.close()
+            Base.metadata.drop_all(bind=engine)
+            engine.dispose()
+
+
+@pytest.mark.graphs
+class TestGraphShards:
+    """图谱分片存储测试"""
+    
+    @pytest.fixture
+    def shard_dir(self, monkeypatch, tmp_path):
+        from app.core.metrics import metrics
+        from app.core.shards import settings, shard_manager
+        
+        monkeypatch.setattr(settings, "SQLITE_SHARD_MODE", "graph")
+        monkeypatch.setattr(shard_manager, "directory", str(tmp_path))
+        # 只保留一个打开的分片，交替访问两个图谱时会淘汰并重新打开
+        monkeypatch.setattr(shard_manager, "cache_size", 1)
+        metrics.reset()
+        yield tmp_path
+        shard_manager.dispose()
+    
+    def test_graph_data_in_shard_files(self, client: TestClient, authenticated_user, db_session, shard_dir):
+        """测试节点和边写入各自图谱的分片文件，删除图谱时删除文件"""
+        from sqlalchemy import text
+        from app.core.metrics import metrics
+        
+        headers = authenticated_user["headers"]
+        graph_ids = []
+        for title in ("A", "B"):
+            response = client.post("/api/graphs", json={
+                "title": title,
+                "nodes": [
+                    {"id": "a", "label": f"{title}-a", "type": "entity"},
+                    {"id": "b", "label": f"{title}-b", "type": "entity"},
+                ],
+                "edges": [{"id": "ab", "source_node_id": "a", "target_node_id": "b", "type": "link"}]
+            }, headers=headers)
+            assert response.status_code == 200
+            graph_ids.append(response.json()["data"]["id"])
+        
+        # 主库中只有图谱目录，没有节点和边
+        assert db_session.execute(text("SELECT count(*) FROM nodes")).scalar() == 0
+        assert db_session.execute(text("SELECT count(*) FROM edges")).scalar() == 0
+        shards = db_session.execute(text("SELECT id, shard FROM graphs")).all()
+        assert {shard for _, shard in shards} == {f"{graph_id}.db" for graph_id in graph_ids}
+        assert all((shard_dir / f"{graph_id}.db").exists() for graph_id in graph_ids)
+        
+        first, second = graph_ids
+        response = client.post(f"/api/graphs/{first}/nodes", json={"id": "c", "label": "A-c", "type": "entity"}, headers=headers)
+        assert response.status_code == 200
+        
+        nodes = client.get(f"/api/graphs/{second}", headers=headers).json()["data"]["nodes"]
+        assert sorted(node["label"] for node in nodes) == ["B-a", "B-b"]
+        nodes = client.get(f"/api/graphs/{first}/nodes", headers=headers).json()["data"]
+        assert sorted(node["label"] for node in nodes) == ["A-a", "A-b", "A-c"]
+        assert metrics.get("shards.evicted") >= 2
+        
+        response = client.delete(f"/api/graphs/{first}", headers=headers)
+        assert response.status_code == 200
+        assert not (shard_dir / f"{first}.db").exists()
+        graph = client.get(f"/api/graphs/{second}", headers=headers).json()["data"]
+        assert len(graph["nodes"]) == 2 and len(graph["edges"]) == 1
+
+
+@pytest.mark.graphs
+class TestGraphViewport:
+    """视口查询测试"""
+    
+    def _viewport(self, client, headers, graph_id, box, **params):
+        query = "min_x={}&min_y={}&max_x={}&max_y={}".format(*box)
+        for key, value in params.items():
+            query += f"&{key}={value}"
+        response = client.get(f"/api/graphs/{graph_id}/viewport?{query}", headers=headers)
+        assert response.status_code == 200
+        return response.json()["data"]
+    
+    def test_viewport_returns_nodes_and_incident_edges(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试视口返回区域内节点及相连的边"""
+        headers = authenticated_user["headers"]
+        data = self._viewport(client, headers, sample_graph_with_positions["id"], (-1, -1, 20, 20))
+        
+        assert {n["id"] for n in data["nodes"]} == {"a", "b"}
+        assert {e["id"] for e in data["edges"]} == {"ab", "bc"}
+        assert data["truncated"] is False
+        
+        data = self._viewport(client, headers, sample_graph_with_positions["id"], (-1, -1, 20, 20), include_edges="false", limit=1)
+        assert len(data["nodes"]) == 1
+        assert data["edges"] == []
+        assert data["truncated"] is True
+    
+    def test_viewport_follows_node_mutations(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试节点增删改后空间索引保持同步"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        box = (50, 50, 150, 150)
+        
+        client.put(f"/api/graphs/{graph_id}/nodes/a", json={"x": 60, "y": 60}, headers=headers)
+        client.post(f"/api/graphs/{graph_id}/nodes", json={"id": "e", "label": "E", "type": "entity", "x": 120, "y": 80}, headers=headers)
+        client.delete(f"/api/graphs/{graph_id}/nodes/c", headers=headers)
+        
+        data = self._viewport(client, headers, graph_id, box)
+        assert {n["id"] for n in data["nodes"]} == {"a", "e"}
+        assert {e["id"] for e in data["edges"]} == {"ab"}
+    
+    def test_viewport_survives_rowid_renumbering(self, client: TestClient, authenticated_user, sample_graph_with_positions, db_session):
+        """测试节点的隐式 rowid 被重新编号（VACUUM、导出导入）后空间索引仍指向正确的节点"""
+        from sqlalchemy import text
+        from app.models.models import create_node_spatial_index
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        db_session.execute(text("UPDATE nodes SET rowid = rowid + 1000"))
+        data = self._viewport(client, headers, graph_id, (-1, -1, 20, 20))
+        assert {n["id"] for n in data["nodes"]} == {"a", "b"}
+        
+        client.put(f"/api/graphs/{graph_id}/nodes/b", json={"x": 200, "y": 200}, headers=headers)
+        client.put(f"/api/graphs/{graph_id}/nodes/d", json={"x": 5, "y": 5}, headers=headers)
+        data = self._viewport(client, headers, graph_id, (-1, -1, 20, 20))
+        assert {n["id"] for n in data["nodes"]} == {"a", "d"}
+        
+        # 旧版本以 rowid 为键的索引在启动时重建
+        db_session.execute(text("DROP TABLE node_rtree_keys"))
+        assert create_node_spatial_index(db_session.connection())
+        data = self._viewport(client, headers, graph_id, (-1, -1, 20, 20))
+        assert {n["id"] for n in data["nodes"]} == {"a", "d"}
+    
+    def test_viewport_index_scoped_by_graph(self, client: TestClient, authenticated_user, sample_graph_with_positions, db_session):
+        """测试空间索引按图谱划分，重叠区域内其他图谱的节点不在视口查询的索引范围中"""
+        from sqlalchemy import text
+        from app.models.models import create_node_spatial_index
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        other = client.post("/api/graphs", json={
+            "title": "重叠图谱",
+            "nodes": [{"id": f"o-{i}", "label": f"O{i}", "type": "entity", "x": i % 10, "y": i // 10} for i in range(50)]
+        }, headers=headers).json()["data"]["id"]
+        
+        data = self._viewport(client, headers, graph_id, (-1, -1, 20, 20))
+        assert {n["id"] for n in data["nodes"]} == {"a", "b"}
+        data = self._viewport(client, headers, other, (-1, -1, 20, 20))
+        assert len(data["nodes"]) == 50
+        
+        def entries_in_box(gid):
+            return db_session.execute(text(
+                "SELECT count(*) FROM node_rtree WHERE max_x >= -1 AND min_x <= 20 AND max_y >= -1 AND min_y <= 20 "
+                "AND max_g >= (SELECT key FROM node_rtree_graphs WHERE graph_id = :g) "
+                "AND min_g <= (SELECT key FROM node_rtree_graphs WHERE graph_id = :g)"
+            ), {"g": gid}).scalar()
+        assert entries_in_box(graph_id) == 2
+        assert entries_in_box(other) == 50
+        
+        # 旧版本没有图谱维度的索引在启动时重建
+        db_session.execute(text("DROP TABLE node_rtree_graphs"))
+        assert create_node_spatial_index(db_session.connection())
+        assert entries_in_box(graph_id) == 2
+        data = self._viewport(client, headers, graph_id, (-1, -1, 20, 20))
+        assert {n["id"] for n in data["nodes"]} == {"a", "b"}
+    
+    def test_viewport_invalid_box(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试无效的视口范围"""
+        response = client.get(
+            f"/api/graphs/{sample_graph_with_positions['id']}/viewport?min_x=10&min_y=0&max_x=0&max_y=10",
+            headers=authenticated_user["headers"]
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.graphs
+class TestGraphSummary:
+    """图谱多分辨率概要测试"""
+    
+    def _summary(self, client, headers, graph_id, level):
+        response = client.get(f"/api/graphs/{graph_id}/summary?level={level}", headers=headers)
+        assert response.status_code == 200
+        return response.json()["data"]
+    
+    def _build(self, client, headers, graph_id):
+        """首次读取返回202，响应后的后台任务生成概要"""
+        response = client.get(f"/api/graphs/{graph_id}/summary", headers=headers)
+        assert response.status_code == 202
+    
+    def test_summary_first_access_built_in_background(self, client: TestClient, authenticated_user, sample_graph_with_positions, db_session, monkeypatch):
+        """测试首次读取不在请求中计算概要，返回空概要并由后台任务生成"""
+        from app.api.routers import graphs as graphs_router
+        from app.models.models import GraphSummary
+        from app.services.summary_service import SummaryService
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        scheduled = []
+        
+        async def record(db, scheduled_graph_id):
+            scheduled.append(scheduled_graph_id)
+        
+        def no_build(self, graph):
+            raise AssertionError("读取请求中计算了概要")
+        
+        monkeypatch.setattr(graphs_router, "rebuild_summary", record)
+        monkeypatch.setattr(SummaryService, "build", no_build)
+        response = client.get(f"/api/graphs/{graph_id}/summary?level=2", headers=headers)
+        assert response.status_code == 202
+        data = response.json()["data"]
+        assert data["level"] == 2
+        assert data["version"] is None
+        assert data["stale"] is True
+        assert data["clusters"] == [] and data["edges"] == []
+        assert scheduled == [graph_id]
+        assert db_session.query(GraphSummary).filter(GraphSummary.graph_id == graph_id).count() == 0
+        monkeypatch.undo()
+        
+        self._build(client, headers, graph_id)
+        summary = self._summary(client, headers, graph_id, 2)
+        assert summary["stale"] is False
+        assert sum(c["count"] for c in summary["clusters"]) == 3
+    
+    def test_summary_levels(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试不同级别的聚类和聚合边"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        self._build(client, headers, graph_id)
+        
+        coarse = self._summary(client, headers, graph_id, 0)
+        assert coarse["unpositioned"] == 1
+        assert len(coarse["clusters"]) == 1
+        assert coarse["clusters"][0]["count"] == 3
+        assert coarse["clusters"][0]["internal_edges"] == 2
+        assert coarse["edges"] == []
+        
+        fine = self._summary(client, headers, graph_id, 3)
+        assert sum(c["count"] for c in fine["clusters"]) == 3
+        assert len(fine["clusters"]) == 2
+        assert len(fine["edges"]) == 1
+        assert fine["edges"][0]["count"] == 1
+    
+    def test_summary_rebuilt_after_mutation(self, client: TestClient, authenticated_user, sample_graph_with_positions, db_session, monkeypatch):
+        """测试图谱变更后先返回旧概要，由后台任务重新生成（读取请求不写数据库）"""
+        from app.api.routers import graphs as graphs_router
+        from app.models.models import GraphSummary
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        def stored_versions():
+            return {row.level: row.version for row in db_session.query(GraphSummary).filter(GraphSummary.graph_id == graph_id)}
+        
+        self._build(client, headers, graph_id)
+        before = self._summary(client, headers, graph_id, 0)
+        assert before["stale"] is False
+        client.post(
+            f"/api/graphs/{graph_id}/nodes",
+            json={"id": "e", "label": "E", "type": "entity", "x": 50, "y": 50},
+            headers=headers
+        )
+        
+        # 读取时返回旧版本并调度后台任务，请求本身不写入概要
+        scheduled = []
+        
+        async def record(db, scheduled_graph_id):
+            scheduled.append(scheduled_graph_id)
+        
+        monkeypatch.setattr(graphs_router, "rebuild_summary", record)
+        stale = self._summary(client, headers, graph_id, 0)
+        assert stale["stale"] is True
+        assert stale["version"] == before["version"]
+        assert stale["clusters"][0]["count"] == 3
+        assert scheduled == [graph_id]
+        assert set(stored_versions().values()) == {before["version"]}
+        monkeypatch.undo()
+        
+        # 响应后的后台任务重新生成，之后的读取得到新版本
+        self._summary(client, headers, graph_id, 0)
+        after = self._summary(client, headers, graph_id, 0)
+        assert after["stale"] is False
+        assert after["version"] > before["version"]
+        assert after["clusters"][0]["count"] == 4
+        assert set(stored_versions().values()) == {after["version"]}
+
+
+@pytest.mark.graphs
+class TestGraphChanges:
+    """增量同步变更日志测试"""
+    
+    def _changes(self, client, headers, graph_id, since, **params):
+        query = f"since={since}" + "".join(f"&{k}={v}" for k, v in params.items())
+        response = client.get(f"/api/graphs/{graph_id}/changes?{query}", headers=headers)
+        assert response.status_code == 200
+        return response.json()["data"]
+    
+    def test_changes_since_version(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试只返回指定版本之后的变更"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        since = graph["metadata"]["version"]
+        
+        client.post(f"/api/graphs/{graph_id}/nodes", json={"id": "e", "label": "E", "type": "entity"}, headers=headers)
+        client.put(f"/api/graphs/{graph_id}/edges/ab", json={"label": "更新"}, headers=headers)
+        client.delete(f"/api/graphs/{graph_id}/nodes/c", headers=headers)
+        
+        data = self._changes(client, headers, graph_id, since)
+        ops = [(c["entity"], c["op"], c["id"]) for c in data["changes"]]
+        assert ops == [
+            ("node", "insert", "e"),
+            ("edge", "update", "ab"),
+            ("edge", "delete", "bc"),
+            ("node", "delete", "c"),
+        ]
+        assert data["changes"][0]["data"]["label"] == "E"
+        assert data["changes"][1]["data"]["label"] == "更新"
+        assert data["version"] == data["changes"][-1]["version"]
+        assert data["has_more"] is False
+        assert data["reset_required"] is False
+        
+        # 已同步到最新版本时没有变更
+        latest = self._changes(client, headers, graph_id, data["version"])
+        assert latest["changes"] == []
+        
+        # 分页读取
+        page = self._changes(client, headers, graph_id, since, limit=3)
+        assert len(page["changes"]) == 3
+        assert page["has_more"] is True
+        rest = self._changes(client, headers, graph_id, page["version"])
+        assert [c["id"] for c in rest["changes"]] == ["c"]
+    
+    def test_changes_reset_on_replace(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试整体替换数据时要求客户端重新加载"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        client.put(
+            f"/api/graphs/{graph_id}",
+            json={"nodes": [{"id": "x", "label": "X", "type": "entity"}], "edges": []},
+            headers=headers
+        )
+        
+        data = self._changes(client, headers, graph_id, 0)
+        assert data["reset_required"] is True
+
+
+@pytest.mark.graphs
+class TestGraphFieldProjection:
+    """图谱读取的字段投影测试"""
+    
+    def test_get_graph_with_fields(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试节点只返回请求的字段，边总是包含端点"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}?fields=x,y,weight", headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        
+        nodes = {node["id"]: node for node in data["nodes"]}
+        assert nodes["a"] == {"id": "a", "x": 0.0, "y": 0.0}
+        assert all("properties" not in node for node in data["nodes"])
+        assert all({"id", "source", "target"} <= set(edge) for edge in data["edges"])
+        assert all("properties" not in edge and "type" not in edge for edge in data["edges"])
+        
+        # 投影结果不写入缓存，完整读取不受影响
+        full = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert all("properties" in node for node in full["nodes"])
+    
+    def test_stream_graph_with_fields(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试NDJSON流同样支持字段投影"""
+        headers = {**authenticated_user["headers"], "Accept": "application/x-ndjson"}
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}?fields=label", headers=headers)
+        records = [json.loads(line) for line in response.text.splitlines()]
+        nodes = [record["data"] for record in records if record["type"] == "node"]
+        assert all(set(node) == {"id", "label"} for node in nodes)
+    
+    def test_invalid_field(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试未知字段返回400"""
+        graph_id = sample_graph_with_positions["id"]
+        response = client.get(f"/api/graphs/{graph_id}?fields=password", headers=authenticated_user["headers"])
+        assert response.status_code == 400
+
+
+@pytest.mark.graphs
+class TestGraphETag:
+    """ETag / If-None-Match 条件请求测试"""
+    
+    def test_get_graph_not_modified(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试图谱未变更时返回304，变更后返回新的ETag"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}", headers=headers)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        
+        response = client.get(f"/api/graphs/{graph_id}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+        
+        client.put(f"/api/graphs/{graph_id}/nodes/a", json={"label": "新标签"}, headers=headers)
+        
+        response = client.get(f"/api/graphs/{graph_id}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+    
+    def test_etag_depends_on_representation(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试不同查询参数和Accept对应不同的ETag"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        all_nodes = client.get(f"/api/graphs/{graph_id}/nodes", headers=headers)
+        filtered = client.get(f"/api/graphs/{graph_id}/nodes?label=a", headers=headers)
+        assert all_nodes.headers["etag"] != filtered.headers["etag"]
+        
+        response = client.get(
+            f"/api/graphs/{graph_id}/nodes?label=a",
+            headers={**headers, "If-None-Match": f'"other", {filtered.headers["etag"]}'}
+        )
+        assert response.status_code == 304
+        
+        json_etag = client.get(f"/api/graphs/{graph_id}", headers=headers).headers["etag"]
+        ndjson_etag = client.get(
+            f"/api/graphs/{graph_id}", headers={**headers, "Accept": "application/x-ndjson"}
+        ).headers["etag"]
+        assert json_etag != ndjson_etag
+    
+    def test_edges_and_export_not_modified(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试边列表和导出接口的条件请求"""
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        for url in (f"/api/graphs/{graph_id}/edges", f"/api/graphs/{graph_id}/export?format=csv"):
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            
+            response = client.get(url, headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 304
+    
+    def test_export_non_ascii_filename(self, client: TestClient, authenticated_user):
+        """测试标题含非ASCII字符的图谱可以导出，文件名按RFC 6266/5987编码"""
+        from urllib.parse import quote
+        headers = authenticated_user["headers"]
+        graph_id = client.post("/api/graphs", json={"title": "知识图谱 \"v1\""}, headers=headers).json()["data"]["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}/export?format=json", headers=headers)
+        assert response.status_code == 200
+        filename = f"知识图谱 \"v1\"_{graph_id}.json"
+        assert response.headers["content-disposition"] == (
+            f"attachment; filename=\"____ _v1__{graph_id}.json\"; filename*=UTF-8''{quote(filename)}"
+        )
+
+
+@pytest.mark.graphs
+class TestGraphWireFormats:
+    """MessagePack / Arrow IPC 响应格式测试"""
+    
+    def test_get_graph_msgpack(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试以MessagePack获取图谱"""
+        msgpack = pytest.importorskip("msgpack")
+        headers = {**authenticated_user["headers"], "Accept": "application/msgpack"}
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/msgpack"
+        assert "etag" in response.headers
+        
+        payload = msgpack.unpackb(response.content)
+        assert payload["success"] is True
+        assert {node["id"] for node in payload["data"]["nodes"]} == {"a", "b", "c", "d"}
+        assert len(payload["data"]["edges"]) == 2
+    
+    def test_get_graph_arrow(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试以Arrow IPC获取图谱，节点和边以 kind 列区分"""
+        pa = pytest.importorskip("pyarrow")
+        headers = {**authenticated_user["headers"], "Accept": "application/vnd.apache.arrow.stream"}
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}", headers=headers)
+        assert response.status_code == 200
+        
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert pa.types.is_dictionary(table.schema.field("type").type)
+        assert table.schema.field("x").type == pa.float64()
+        rows = table.to_pylist()
+        assert sorted(row["id"] for row in rows if row["kind"] == "node") == ["a", "b", "c", "d"]
+        assert sorted(row["id"] for row in rows if row["kind"] == "edge") == ["ab", "bc"]
+        
+        graph_info = json.loads(table.schema.metadata[b"graph"])
+        assert graph_info["id"] == graph_id
+    
+    def test_get_nodes_arrow_paginated(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试分页节点列表的Arrow响应携带下一页游标"""
+        pa = pytest.importorskip("pyarrow")
+        headers = {**authenticated_user["headers"], "Accept": "application/vnd.apache.arrow.stream"}
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}/nodes?limit=2", headers=headers)
+        assert response.status_code == 200
+        
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.num_rows == 2
+        assert json.loads(table.schema.metadata[b"next_cursor"]) is not None
+    
+    def test_unavailable_format(self, client: TestClient, authenticated_user, sample_graph_with_positions, monkeypatch):
+        """测试依赖未安装时的协商结果"""
+        monkeypatch.setattr("app.utils.wire_formats.msgpack", None)
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph_with_positions["id"]
+        
+        response = client.get(f"/api/graphs/{graph_id}/edges", headers={**headers, "Accept": "application/msgpack"})
+        assert response.status_code == 406
+        
+        response = client.get(
+            f"/api/graphs/{graph_id}/edges",
+            headers={**headers, "Accept": "application/msgpack, application/json;q=0.5"}
+        )
+        assert response.status_code == 200
+        assert response.json()["success"] is True
 
 
 @pytest.mark.graphs
@@ -243,6 +1600,55 @@ class TestGraphUpdate:
         assert data["success"] is True
         assert data["data"]["title"] == update_data["title"]
     
+    def test_update_graph_diff(self, client: TestClient, authenticated_user):
+        """测试差异更新只写入变化的节点和边，并返回差异计数"""
+        headers = authenticated_user["headers"]
+        nodes = [{"id": n, "label": n.upper(), "type": "entity", "x": 1, "y": 2} for n in "abcd"]
+        edges = [
+            {"id": "ab", "source_node_id": "a", "target_node_id": "b", "type": "link"},
+            {"id": "bc", "source_node_id": "b", "target_node_id": "c", "type": "link"},
+            {"id": "cd", "source_node_id": "c", "target_node_id": "d", "type": "link"},
+        ]
+        graph_id = client.post(
+            "/api/graphs", json={"title": "差异更新", "nodes": nodes, "edges": edges}, headers=headers
+        ).json()["data"]["id"]
+        since = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]["metadata"]["version"]
+        
+        # 修改 b，删除 d，新增 e；边 ab 不变，删除 bc、cd，新增 ae
+        response = client.put(f"/api/graphs/{graph_id}", json={
+            "mode": "diff",
+            "nodes": [nodes[0], {**nodes[1], "label": "B2"}, nodes[2], {"id": "e", "label": "E", "type": "entity"}],
+            "edges": [edges[0], {"id": "ae", "source": "a", "target": "e", "type": "link"}]
+        }, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["diff"] == {
+            "nodes": {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 2},
+            "edges": {"inserted": 1, "updated": 0, "deleted": 2, "unchanged": 1},
+        }
+        assert data["metadata"]["node_count"] == 4
+        assert data["metadata"]["edge_count"] == 2
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert {node["id"]: node["label"] for node in graph["nodes"]} == {"a": "A", "b": "B2", "c": "C", "e": "E"}
+        assert sorted(edge["id"] for edge in graph["edges"]) == ["ab", "ae"]
+        
+        changes = client.get(f"/api/graphs/{graph_id}/changes?since={since}", headers=headers).json()["data"]["changes"]
+        assert [(c["entity"], c["op"], c["id"]) for c in changes] == [
+            ("node", "update", "b"),
+            ("node", "insert", "e"),
+            ("edge", "delete", "bc"),
+            ("edge", "delete", "cd"),
+            ("edge", "insert", "ae"),
+            ("node", "delete", "d"),
+        ]
+        
+        # 重复提交相同数据不产生写入
+        response = client.put(f"/api/graphs/{graph_id}", json={"mode": "diff", "nodes": graph["nodes"]}, headers=headers)
+        assert response.json()["data"]["diff"] == {
+            "nodes": {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 4}
+        }
+    
     def test_update_graph_not_found(self, client: TestClient, authenticated_user):
         """测试更新不存在的图谱"""
         fake_id = str(uuid.uuid4())
@@ -1,6 +1,10 @@
 """
 集成测试 - 测试完整的工作流程
 """
+import asyncio
+import threading
+import anyio
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 import time
@@ -471,3 +475,177 @@ class TestErrorHandlingAndRecovery:
         }
         create_response = client.post("/api/graphs", json=graph_data, headers=authenticated_user["headers"])
         assert create_response.status_code == 200
+
+
+@pytest.mark.integration
+class TestWriteQueueIntegration:
+    """写入队列集成测试：写接口在临时SQLite文件上通过真实的写入线程提交
+    
+    conftest 为其他测试关闭了写入队列，这里每个请求使用独立会话（与生产环境相同），
+    写入线程使用自己的连接。
+    """
+    
+    @pytest.fixture
+    def queued_app(self, tmp_path, monkeypatch):
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.orm import sessionmaker
+        from main import app
+        from app.core import write_queue as write_queue_module
+        from app.core.database import Base, GraphSession, get_db
+        from app.core.metrics import metrics
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'queued.db'}", connect_args={"check_same_thread": False})
+        
+        @event.listens_for(engine, "connect")
+        def enable_foreign_keys(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+        
+        Base.metadata.create_all(bind=engine)
+        RequestSession = sessionmaker(class_=GraphSession, autocommit=False, autoflush=False, bind=engine)
+        
+        def override_get_db():
+            db = RequestSession()
+            try:
+                yield db
+            finally:
+                db.close()
+        
+        queue = write_queue_module.WriteQueue(engine, max_batch=64)
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        app.dependency_overrides[get_db] = override_get_db
+        metrics.reset()
+        queue.start()
+        try:
+            yield app, engine, queue
+        finally:
+            anyio.run(queue.stop)
+            app.dependency_overrides.clear()
+            engine.dispose()
+    
+    @staticmethod
+    async def _prepare(http) -> tuple:
+        """注册用户并创建一个包含节点 existing 的图谱，返回 (请求头, 图谱ID)"""
+        response = await http.post("/api/auth/register", json={
+            "username": "queued", "email": "queued@example.com", "password": "testpassword123"
+        })
+        headers = {"Authorization": f"Bearer {response.json()['data']['token']}"}
+        response = await http.post("/api/graphs", json={
+            "title": "写入队列图谱",
+            "nodes": [{"id": "existing", "label": "已有节点", "type": "entity"}]
+        }, headers=headers)
+        assert response.status_code == 200
+        return headers, response.json()["data"]["id"]
+    
+    @staticmethod
+    async def _hold_writer(queue, release: threading.Event, depth: int):
+        """让写入线程阻塞在一个命令上，直到 depth 个写操作进入队列"""
+        from app.core.metrics import metrics
+        
+        blocker = asyncio.ensure_future(queue.submit(lambda session: release.wait(5)))
+        deadline = time.monotonic() + 5
+        while metrics.get("write_queue.depth") < depth:
+            assert time.monotonic() < deadline, "写操作未进入队列"
+            await asyncio.sleep(0.01)
+        return blocker
+    
+    def test_queued_writes_commit_in_one_batch(self, queued_app):
+        """测试并发的写请求合并为一批提交，失败的写操作只回滚自己的修改"""
+        from sqlalchemy import func, select
+        from app.core.metrics import metrics
+        from app.models.models import Graph, GraphChange, Node
+        
+        app, engine, queue = queued_app
+        release = threading.Event()
+        
+        def partial_write(graph_id):
+            def command(session):
+                session.add(Node(graph_id=graph_id, node_id="rolled-back", label="回滚", type="entity"))
+                session.flush()
+                raise RuntimeError("写入后失败")
+            return command
+        
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                headers, graph_id = await self._prepare(http)
+                url = f"/api/graphs/{graph_id}/nodes"
+                holding = asyncio.ensure_future(self._hold_writer(queue, release, 11))
+                await asyncio.sleep(0.05)
+                # 已写入数据后失败的命令在自己的保存点中回滚
+                failing = asyncio.ensure_future(queue.submit(partial_write(graph_id)))
+                # 第4个请求的节点ID与已有节点重复
+                requests = [
+                    asyncio.ensure_future(http.post(url, json={
+                        "id": "existing" if i == 3 else f"node-{i}", "label": f"节点{i}", "type": "entity"
+                    }, headers=headers))
+                    for i in range(10)
+                ]
+                blocker = await holding
+                release.set()
+                await blocker
+                with pytest.raises(RuntimeError):
+                    await failing
+                return graph_id, await asyncio.gather(*requests)
+        
+        graph_id, responses = anyio.run(scenario)
+        
+        assert responses[3].status_code == 400
+        assert [r.status_code for i, r in enumerate(responses) if i != 3] == [200] * 9
+        assert metrics.get("write_queue.batch_size") == 11
+        with engine.connect() as connection:
+            assert connection.execute(
+                select(func.count()).select_from(Node.__table__).where(Node.graph_id == graph_id)
+            ).scalar() == 10
+            assert connection.execute(select(Graph.node_count).where(Graph.id == graph_id)).scalar() == 10
+            assert connection.execute(
+                select(func.count()).select_from(GraphChange.__table__).where(
+                    GraphChange.graph_id == graph_id, GraphChange.entity_id.like("node-%")
+                )
+            ).scalar() == 9
+    
+    def test_failed_batch_commit_fails_every_request(self, queued_app):
+        """测试整批提交失败时同批的每个写请求都收到错误，修改全部回滚"""
+        from sqlalchemy import func, select, text
+        from sqlalchemy.exc import IntegrityError
+        from app.core.metrics import metrics
+        from app.models.models import Node
+        
+        app, engine, queue = queued_app
+        release = threading.Event()
+        
+        def orphan_node(session):
+            # 外键检查推迟到提交时，使整批提交失败
+            session.execute(text("PRAGMA defer_foreign_keys=ON"))
+            session.add(Node(graph_id="missing-graph", node_id="orphan", label="孤立节点", type="entity"))
+            session.commit()
+        
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                headers, graph_id = await self._prepare(http)
+                url = f"/api/graphs/{graph_id}/nodes"
+                holding = asyncio.ensure_future(self._hold_writer(queue, release, 4))
+                await asyncio.sleep(0.05)
+                orphan = asyncio.ensure_future(queue.submit(orphan_node))
+                requests = [
+                    asyncio.ensure_future(http.post(url, json={
+                        "id": f"node-{i}", "label": f"节点{i}", "type": "entity"
+                    }, headers=headers))
+                    for i in range(3)
+                ]
+                blocker = await holding
+                release.set()
+                await blocker
+                with pytest.raises(IntegrityError):
+                    await orphan
+                return graph_id, await asyncio.gather(*requests)
+        
+        graph_id, responses = anyio.run(scenario)
+        
+        assert [r.status_code for r in responses] == [500] * 3
+        assert metrics.get("write_queue.failed_batches") == 1
+        with engine.connect() as connection:
+            assert connection.execute(select(func.count()).select_from(Node.__table__)).scalar() == 1
+            assert connection.execute(
+                select(Node.node_id).where(Node.graph_id == graph_id)
+            ).scalars().all() == ["existing"]
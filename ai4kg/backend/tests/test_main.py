@@ -26,6 +26,15 @@ class TestMainApp:
         assert data["status"] == "healthy"
         assert data["service"] == "ai4kg-backend"
     
+    def test_metrics_endpoint(self, client: TestClient):
+        """测试运行指标端点"""
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert "counters" in data
+        assert "gauges" in data
+    
     def test_docs_endpoint(self, client: TestClient):
         """测试API文档端点"""
         response = client.get("/docs")
@@ -158,3 +167,268 @@ class TestAppConfiguration:
         
         for tag in expected_tags:
             assert tag in used_tags, f"标签 '{tag}' 未在API中找到。实际标签: {used_tags}"
+    
+    def test_sqlite_storage_profile(self, tmp_path):
+        """测试 tuned 存储配置在每个新连接上生效，default 保持SQLite默认值"""
+        from sqlalchemy import create_engine, text
+        from app.core.database import apply_sqlite_pragmas, sqlite_pragmas
+        
+        assert sqlite_pragmas("default") == []
+        with pytest.raises(ValueError):
+            sqlite_pragmas("fast")
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+        apply_sqlite_pragmas(engine, sqlite_pragmas("tuned"))
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert connection.execute(text("PRAGMA cache_size")).scalar() == -65536
+            assert connection.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        engine.dispose()
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'default.db'}")
+        apply_sqlite_pragmas(engine, sqlite_pragmas("default"))
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+        engine.dispose()
+    
+    def test_db_thread_pool(self):
+        """测试同步数据库调用在有界线程池中执行，不阻塞事件循环"""
+        import asyncio
+        import threading
+        import time
+        import anyio
+        from app.core.concurrency import db_limiter, iterate_db, run_db
+        from app.core.metrics import metrics
+        
+        async def scenario():
+            assert await run_db(threading.get_ident) != threading.get_ident()
+            assert [item async for item in iterate_db(iter([1, 2, 3]))] == [1, 2, 3]
+            
+            # 线程池占满时其余调用排队，事件循环仍可处理其他任务
+            size = db_limiter().total_tokens
+            metrics.reset()
+            slow_calls = [asyncio.create_task(run_db(time.sleep, 0.2)) for _ in range(size + 2)]
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            assert time.perf_counter() - started < 0.1
+            await asyncio.gather(*slow_calls)
+            assert metrics.get("db_threads.calls") == size + 2
+            assert metrics.get("db_threads.queued") >= 2
+        
+        anyio.run(scenario)
+    
+    def test_write_queue_group_commit(self, tmp_path, monkeypatch):
+        """测试写入队列把排队的写操作合并为一个事务，失败的命令只回滚自己"""
+        import asyncio
+        import threading
+        import anyio
+        from fastapi import HTTPException
+        from sqlalchemy import create_engine, func, select
+        from app.core import write_queue as write_queue_module
+        from app.core.database import Base
+        from app.core.metrics import metrics
+        from app.models.models import User
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        queue = write_queue_module.WriteQueue(engine, max_batch=64)
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        release = threading.Event()
+        
+        class UserWriter:
+            def __init__(self, db):
+                self.db = db
+            
+            def add(self, name: str, fail: bool = False) -> str:
+                self.db.add(User(username=name, email=f"{name}@example.com", password_hash="x"))
+                self.db.flush()
+                if fail:
+                    raise HTTPException(status_code=400, detail="失败")
+                self.db.commit()
+                return name
+        
+        def blocker(db):
+            release.wait(5)
+            return "blocker"
+        
+        async def scenario():
+            first = asyncio.create_task(queue.submit(blocker))
+            await asyncio.sleep(0.05)
+            writes = [
+                asyncio.create_task(write_queue_module.write_db(UserWriter(None).add, f"user{i}", fail=(i == 3)))
+                for i in range(10)
+            ]
+            await asyncio.sleep(0.05)
+            assert metrics.get("write_queue.depth") == 10
+            release.set()
+            assert await first == "blocker"
+            return await asyncio.gather(*writes, return_exceptions=True)
+        
+        metrics.reset()
+        queue.start()
+        try:
+            results = anyio.run(scenario)
+        finally:
+            anyio.run(queue.stop)
+        
+        assert isinstance(results[3], HTTPException)
+        assert [r for i, r in enumerate(results) if i != 3] == [f"user{i}" for i in range(10) if i != 3]
+        with engine.connect() as connection:
+            assert connection.execute(select(func.count()).select_from(User.__table__)).scalar() == 9
+        assert metrics.get("write_queue.batches") == 2
+        assert metrics.get("write_queue.commands") == 11
+        assert metrics.get("write_queue.batch_size") == 10
+        engine.dispose()
+    
+    def test_write_queue_reloads_orm_arguments(self, tmp_path, monkeypatch):
+        """测试写命令参数中的ORM对象按主键在写入会话中重新加载，不在写入线程中使用请求的会话"""
+        import anyio
+        from sqlalchemy import create_engine, inspect
+        from sqlalchemy.orm import sessionmaker
+        from app.core import write_queue as write_queue_module
+        from app.core.database import Base
+        from app.models.models import User
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        request_session = sessionmaker(bind=engine, expire_on_commit=False)()
+        user = User(username="before", email="before@example.com", password_hash="x")
+        request_session.add(user)
+        request_session.commit()
+        
+        queue = write_queue_module.WriteQueue(engine, max_batch=8)
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        
+        class UserWriter:
+            def __init__(self, db):
+                self.db = db
+            
+            def rename(self, target: User, name: str) -> bool:
+                owned = inspect(target).session is self.db
+                target.username = name
+                self.db.commit()
+                return owned
+        
+        queue.start()
+        try:
+            assert anyio.run(write_queue_module.write_db, UserWriter(request_session).rename, user, "after") is True
+        finally:
+            anyio.run(queue.stop)
+        
+        # 请求会话中的对象未被写入线程修改
+        assert user.username == "before"
+        assert not request_session.dirty
+        request_session.refresh(user)
+        assert user.username == "after"
+        request_session.close()
+        engine.dispose()
+    
+    def test_write_queue_refuses_sharded_graphs(self, tmp_path, monkeypatch):
+        """测试访问分片图谱的写操作回滚写入会话中的修改，改为在请求的会话中执行"""
+        from types import SimpleNamespace
+        import anyio
+        from fastapi import HTTPException
+        from sqlalchemy import create_engine, func, select
+        from sqlalchemy.orm import sessionmaker
+        from app.core import write_queue as write_queue_module
+        from app.core.database import Base, GraphSession
+        from app.core.metrics import metrics
+        from app.core.shards import route_graph, shard_manager
+        from app.models.models import User
+        
+        monkeypatch.setattr(shard_manager, "directory", str(tmp_path / "shards"))
+        engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        request_session = sessionmaker(class_=GraphSession, bind=engine)()
+        queue = write_queue_module.WriteQueue(engine, max_batch=8)
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        
+        class UserWriter:
+            def __init__(self, db):
+                self.db = db
+            
+            def add(self, name: str) -> bool:
+                self.db.add(User(username=name, email=f"{name}@example.com", password_hash="x"))
+                self.db.flush()
+                try:
+                    route_graph(self.db, SimpleNamespace(shard="sharded.db"))
+                except Exception as e:
+                    # 服务方法把异常转换为HTTP错误
+                    raise HTTPException(status_code=500, detail=str(e))
+                self.db.commit()
+                return bool(self.db.info.get("write_queue"))
+        
+        metrics.reset()
+        queue.start()
+        try:
+            in_writer = anyio.run(write_queue_module.write_db, UserWriter(request_session).add, "sharded")
+        finally:
+            anyio.run(queue.stop)
+        
+        assert in_writer is False
+        assert metrics.get("write_queue.sharded_fallbacks") == 1
+        assert metrics.get("write_queue.bypassed") == 1
+        with engine.connect() as connection:
+            assert connection.execute(select(func.count()).select_from(User.__table__)).scalar() == 1
+        request_session.close()
+        shard_manager.dispose()
+        engine.dispose()
+    
+    def test_write_queue_runs_import_and_property_index(self, tmp_path, monkeypatch):
+        """测试文件导入和属性索引的写操作通过写入队列提交，不在请求的会话中写入"""
+        import io
+        import json
+        import anyio
+        from sqlalchemy import create_engine, func, select, text
+        from sqlalchemy.orm import sessionmaker
+        from starlette.datastructures import UploadFile
+        from app.core import write_queue as write_queue_module
+        from app.core.database import Base, GraphSession
+        from app.core.metrics import metrics
+        from app.models.models import Graph, Node, PropertyIndex, User
+        from app.services.file_service import FileService
+        from app.services.property_index_service import PropertyIndexService
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        request_session = sessionmaker(class_=GraphSession, bind=engine, expire_on_commit=False)()
+        user = User(username="importer", email="importer@example.com", password_hash="x")
+        request_session.add(user)
+        request_session.commit()
+        queue = write_queue_module.WriteQueue(engine, max_batch=8)
+        monkeypatch.setattr(write_queue_module, "write_queue", queue)
+        
+        content = json.dumps({
+            "nodes": [{"id": "a", "label": "A", "properties": {"age": 3}}, {"id": "b", "label": "B"}],
+            "edges": [{"id": "e", "source": "a", "target": "b"}]
+        }).encode("utf-8")
+        
+        async def scenario():
+            upload = UploadFile(file=io.BytesIO(content), filename="people.json")
+            imported = await FileService(request_session).import_graph_file(upload, user)
+            graph = request_session.get(Graph, imported["id"])
+            index = await write_queue_module.write_db(
+                PropertyIndexService(request_session).create_index, graph, "node", "age", "number"
+            )
+            return imported, index
+        
+        metrics.reset()
+        queue.start()
+        try:
+            imported, index = anyio.run(scenario)
+        finally:
+            anyio.run(queue.stop)
+        
+        assert metrics.get("write_queue.commands") == 2
+        assert not request_session.new and not request_session.dirty
+        with engine.connect() as connection:
+            assert connection.execute(
+                select(func.count()).select_from(Node.__table__).where(Node.graph_id == imported["id"])
+            ).scalar() == 2
+            assert connection.execute(select(PropertyIndex.key).where(PropertyIndex.id == index["id"])).scalar() == "age"
+            assert connection.execute(
+                text("SELECT count(*) FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_nodes_prop_%'")
+            ).scalar() == 1
+        request_session.close()
+        engine.dispose()
@@ -73,6 +73,166 @@ class TestNodeRetrieval:
         graph_id = sample_graph["id"]
         response = client.get(f"/api/graphs/{graph_id}/nodes")
         assert response.status_code == 401
+    
+    def test_get_nodes_filters_applied(self, client: TestClient, authenticated_user, sample_graph_with_nodes):
+        """测试类型、搜索和属性过滤结果正确"""
+        graph_id = sample_graph_with_nodes["id"]
+        headers = authenticated_user["headers"]
+        
+        response = client.get(f"/api/graphs/{graph_id}/nodes?type=PERSON", headers=headers)
+        assert {n["id"] for n in response.json()["data"]} == {"node-1", "node-2"}
+        
+        response = client.get(f"/api/graphs/{graph_id}/nodes?search=公司", headers=headers)
+        assert [n["id"] for n in response.json()["data"]] == ["node-3"]
+        
+        response = client.get(f"/api/graphs/{graph_id}/nodes?prop=name=北京", headers=headers)
+        assert [n["id"] for n in response.json()["data"]] == ["node-4"]
+        
+        response = client.get(f"/api/graphs/{graph_id}/nodes?type=person&label=2", headers=headers)
+        assert [n["id"] for n in response.json()["data"]] == ["node-2"]
+    
+    def test_get_nodes_cursor_pagination(self, client: TestClient, authenticated_user, sample_graph_with_nodes):
+        """测试节点游标分页"""
+        graph_id = sample_graph_with_nodes["id"]
+        seen = []
+        cursor = None
+        
+        while True:
+            url = f"/api/graphs/{graph_id}/nodes?limit=3"
+            if cursor:
+                url += f"&cursor={cursor}"
+            response = client.get(url, headers=authenticated_user["headers"])
+            assert response.status_code == 200
+            
+            page = response.json()["data"]
+            assert len(page["items"]) <= 3
+            seen.extend(n["id"] for n in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        
+        assert sorted(seen) == ["node-1", "node-2", "node-3", "node-4"]
+    
+    def test_get_nodes_invalid_filters(self, client: TestClient, authenticated_user, sample_graph):
+        """测试无效的过滤条件和游标"""
+        graph_id = sample_graph["id"]
+        response = client.get(
+            f"/api/graphs/{graph_id}/nodes?prop=novalue",
+            headers=authenticated_user["headers"]
+        )
+        assert response.status_code == 400
+        
+        response = client.get(
+            f"/api/graphs/{graph_id}/nodes?limit=2&cursor=%%%",
+            headers=authenticated_user["headers"]
+        )
+        assert response.status_code == 400
+    
+    def test_property_index_filters(self, client: TestClient, authenticated_user, sample_graph, db_session):
+        """测试声明属性索引后过滤走表达式索引且结果不变"""
+        from sqlalchemy import text
+        from app.core.shards import route_graph
+        from app.models.models import Graph, Node
+        graph_id = sample_graph["id"]
+        headers = authenticated_user["headers"]
+        for i in range(6):
+            client.post(f"/api/graphs/{graph_id}/nodes", json={
+                "id": f"p-{i}", "label": f"人员{i}", "type": "person",
+                "properties": {"age": i, "city": "北京" if i % 2 else "上海"}
+            }, headers=headers)
+        
+        url = f"/api/graphs/{graph_id}/property-indexes"
+        response = client.post(url, json={"entity": "node", "key": "age", "type": "number"}, headers=headers)
+        assert response.status_code == 200
+        age_index = response.json()["data"]
+        assert client.post(url, json={"entity": "node", "key": "city", "type": "string"}, headers=headers).status_code == 200
+        assert client.post(url, json={"entity": "node", "key": "age", "type": "string"}, headers=headers).status_code == 400
+        assert client.post(url, json={"entity": "node", "key": "a'ge", "type": "string"}, headers=headers).status_code == 422
+        
+        response = client.get(url, headers=headers)
+        assert [(i["key"], i["type"]) for i in response.json()["data"]] == [("age", "number"), ("city", "string")]
+        route_graph(db_session, db_session.get(Graph, graph_id))
+        indexes = db_session.connection(bind_arguments={"mapper": Node}).execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_nodes_prop_%'"
+        )).scalars().all()
+        assert len(indexes) == 2
+        
+        response = client.get(f"/api/graphs/{graph_id}/nodes?prop=age>=3", headers=headers)
+        assert sorted(n["id"] for n in response.json()["data"]) == ["p-3", "p-4", "p-5"]
+        response = client.get(f"/api/graphs/{graph_id}/nodes?prop=city=北京&prop=age<5", headers=headers)
+        assert sorted(n["id"] for n in response.json()["data"]) == ["p-1", "p-3"]
+        
+        response = client.delete(f"{url}/{age_index['id']}", headers=headers)
+        assert response.status_code == 200
+        assert client.delete(f"{url}/{age_index['id']}", headers=headers).status_code == 404
+        response = client.get(f"/api/graphs/{graph_id}/nodes?prop=age>=3", headers=headers)
+        assert sorted(n["id"] for n in response.json()["data"]) == ["p-3", "p-4", "p-5"]
+    
+    def test_property_index_scoped_to_graph(self, client: TestClient, authenticated_user, sample_graph, db_session):
+        """测试属性索引只包含声明它的图谱，其他图谱中同一键的字符串值不影响写入和查询"""
+        from sqlalchemy import literal_column, text
+        from sqlalchemy.dialects import postgresql
+        from app.services.query_filters import property_value_expression
+        headers = authenticated_user["headers"]
+        graph_id = sample_graph["id"]
+        other = client.post("/api/graphs", json={"title": "其他图谱"}, headers=headers).json()["data"]["id"]
+        client.post(f"/api/graphs/{other}/nodes", json={"id": "o-1", "label": "O1", "type": "person", "properties": {"age": "未知"}}, headers=headers)
+        for i in range(4):
+            client.post(f"/api/graphs/{graph_id}/nodes", json={
+                "id": f"p-{i}", "label": f"人员{i}", "type": "person", "properties": {"age": i}
+            }, headers=headers)
+        
+        response = client.post(f"/api/graphs/{graph_id}/property-indexes", json={"entity": "node", "key": "age", "type": "number"}, headers=headers)
+        assert response.status_code == 200
+        sql = db_session.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_nodes_prop_%'"
+        )).scalar()
+        assert f"WHERE graph_id = '{graph_id}'" in sql
+        
+        response = client.post(f"/api/graphs/{other}/nodes", json={"id": "o-2", "label": "O2", "type": "person", "properties": {"age": "很老"}}, headers=headers)
+        assert response.status_code == 200
+        response = client.get(f"/api/graphs/{graph_id}/nodes?prop=age>=2", headers=headers)
+        assert sorted(n["id"] for n in response.json()["data"]) == ["p-2", "p-3"]
+        response = client.get(f"/api/graphs/{other}/nodes?prop=age=很老", headers=headers)
+        assert [n["id"] for n in response.json()["data"]] == ["o-2"]
+        
+        # PostgreSQL 下只转换JSON类型为 number 的值，字符串不会使 CAST 失败
+        expression = str(property_value_expression(
+            literal_column("properties"), "age", "number", "postgresql"
+        ).compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        assert "jsonb_typeof(properties -> 'age') = 'number'" in expression
+    
+    def test_get_nodes_field_projection(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试只返回指定字段，分页游标不受影响"""
+        graph_id = sample_graph_with_positions["id"]
+        response = client.get(
+            f"/api/graphs/{graph_id}/nodes?fields=x,y,color",
+            headers=authenticated_user["headers"]
+        )
+        assert response.status_code == 200
+        nodes = {node["id"]: node for node in response.json()["data"]}
+        assert nodes["b"] == {"id": "b", "x": 10.0, "y": 10.0}
+        assert nodes["d"] == {"id": "d"}
+        
+        seen = []
+        cursor = None
+        while True:
+            url = f"/api/graphs/{graph_id}/nodes?fields=label&limit=3"
+            if cursor:
+                url += f"&cursor={cursor}"
+            data = client.get(url, headers=authenticated_user["headers"]).json()["data"]
+            seen.extend(node["id"] for node in data["items"])
+            assert all(set(node) == {"id", "label"} for node in data["items"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        assert sorted(seen) == ["a", "b", "c", "d"]
+        
+        response = client.get(
+            f"/api/graphs/{graph_id}/nodes?fields=id,source",
+            headers=authenticated_user["headers"]
+        )
+        assert response.status_code == 400
 
 
 @pytest.mark.nodes
@@ -148,6 +308,20 @@ class TestNodeCreation:
         # 目前返回成功，但实现后应该返回404
         assert response.status_code in [200, 404]
     
+    def test_create_node_duplicate_id(self, client: TestClient, authenticated_user, sample_graph_with_nodes):
+        """测试节点ID已存在时返回400，不泄露数据库错误"""
+        graph_id = sample_graph_with_nodes["id"]
+        response = client.post(
+            f"/api/graphs/{graph_id}/nodes",
+            json={"id": "node-1", "label": "重复节点", "type": "person"},
+            headers=authenticated_user["headers"]
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "节点ID已存在: node-1"
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=authenticated_user["headers"]).json()["data"]
+        assert graph["metadata"]["node_count"] == 4
+    
     def test_create_node_unauthorized(self, client: TestClient, sample_graph, sample_node_data):
         """测试未授权创建节点"""
         graph_id = sample_graph["id"]
@@ -339,6 +513,137 @@ class TestNodeBatchOperations:
         
         assert len(created_nodes) == 3
     
+    def test_create_nodes_batch_endpoint(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试批量创建节点接口"""
+        graph_id = sample_graph_with_positions["id"]
+        headers = authenticated_user["headers"]
+        
+        response = client.post(
+            f"/api/graphs/{graph_id}/nodes/batch",
+            json={"nodes": [
+                {"id": "e", "label": "E", "type": "person", "x": 5, "y": 5},
+                {"label": "F", "type": "person", "properties": {"age": 30}}
+            ]},
+            headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["count"] == 2
+        assert data["ids"][0] == "e"
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert graph["metadata"]["node_count"] == 6
+        nodes = {node["id"]: node for node in graph["nodes"]}
+        assert nodes[data["ids"][1]]["properties"] == {"age": 30}
+        
+        # 新节点进入空间索引
+        viewport = client.get(
+            f"/api/graphs/{graph_id}/viewport?min_x=4&min_y=4&max_x=6&max_y=6",
+            headers=headers
+        ).json()["data"]
+        assert [node["id"] for node in viewport["nodes"]] == ["e"]
+        
+        # 与已有节点或批内节点ID重复时整批拒绝
+        for nodes_payload in (
+            [{"id": "a", "label": "A2", "type": "entity"}],
+            [{"id": "g", "label": "G", "type": "entity"}, {"id": "g", "label": "G2", "type": "entity"}]
+        ):
+            response = client.post(
+                f"/api/graphs/{graph_id}/nodes/batch",
+                json={"nodes": nodes_payload},
+                headers=headers
+            )
+            assert response.status_code == 400
+        
+        response = client.post(f"/api/graphs/{graph_id}/nodes/batch", json={"nodes": []}, headers=headers)
+        assert response.status_code == 422
+    
+    def test_update_node_positions(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试批量保存节点位置"""
+        graph_id = sample_graph_with_positions["id"]
+        headers = authenticated_user["headers"]
+        version = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]["metadata"]["version"]
+        
+        response = client.put(
+            f"/api/graphs/{graph_id}/nodes/positions",
+            json={"positions": [
+                ["a", 50, 50],
+                ["d", 51, 49, 3.5, "#ff0000"],
+                ["missing", 1, 1]
+            ]},
+            headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()["data"] == {"updated": 2, "requested": 3}
+        
+        nodes = {
+            node["id"]: node
+            for node in client.get(f"/api/graphs/{graph_id}/nodes", headers=headers).json()["data"]
+        }
+        assert (nodes["a"]["x"], nodes["a"]["y"]) == (50, 50)
+        assert nodes["d"]["size"] == 3.5 and nodes["d"]["color"] == "#ff0000"
+        assert nodes["b"]["x"] == 10
+        
+        # 空间索引随之更新
+        viewport = client.get(
+            f"/api/graphs/{graph_id}/viewport?min_x=45&min_y=45&max_x=55&max_y=55",
+            headers=headers
+        ).json()["data"]
+        assert sorted(node["id"] for node in viewport["nodes"]) == ["a", "d"]
+        
+        changes = client.get(f"/api/graphs/{graph_id}/changes?since={version}", headers=headers).json()["data"]
+        # 整批只记录一条 move 变更，不包含不存在的节点
+        assert [(c["op"], c["id"]) for c in changes["changes"]] == [("move", None)]
+        assert changes["changes"][0]["data"] == {
+            "node_ids": ["a", "d"],
+            "positions": [["a", 50, 50], ["d", 51, 49, 3.5, "#ff0000"]]
+        }
+        
+        response = client.put(
+            f"/api/graphs/{graph_id}/nodes/positions",
+            json={"positions": [["a", "left", 1]]},
+            headers=headers
+        )
+        assert response.status_code == 422
+    
+    def test_delete_nodes_batch(self, client: TestClient, authenticated_user, sample_graph_with_positions):
+        """测试批量删除节点：相关边级联删除，计数同步调整"""
+        graph_id = sample_graph_with_positions["id"]
+        headers = authenticated_user["headers"]
+        version = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]["metadata"]["version"]
+        
+        response = client.post(
+            f"/api/graphs/{graph_id}/nodes/batch-delete",
+            json={"ids": ["a", "b", "b", "missing"]},
+            headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert sorted(data["deleted_node_ids"]) == ["a", "b"]
+        assert sorted(data["deleted_edge_ids"]) == ["ab", "bc"]
+        assert data["deleted_edges_count"] == 2
+        assert data["not_found_count"] == 1
+        
+        graph = client.get(f"/api/graphs/{graph_id}", headers=headers).json()["data"]
+        assert graph["metadata"]["node_count"] == 2
+        assert graph["metadata"]["edge_count"] == 0
+        assert sorted(node["id"] for node in graph["nodes"]) == ["c", "d"]
+        
+        # 空间索引中的节点同时移除
+        viewport = client.get(
+            f"/api/graphs/{graph_id}/viewport?min_x=-1&min_y=-1&max_x=11&max_y=11",
+            headers=headers
+        ).json()["data"]
+        assert viewport["nodes"] == []
+        
+        changes = client.get(f"/api/graphs/{graph_id}/changes?since={version}", headers=headers).json()["data"]
+        assert sorted((c["entity"], c["id"]) for c in changes["changes"]) == [
+            ("edge", "ab"), ("edge", "bc"), ("node", "a"), ("node", "b")
+        ]
+        
+        response = client.post(f"/api/graphs/{graph_id}/nodes/batch-delete", json={"ids": []}, headers=headers)
+        assert response.status_code == 422
+    
     def test_get_nodes_by_type(self, client: TestClient, authenticated_user, sample_graph):
         """测试按类型获取节点"""
         graph_id = sample_graph["id"]